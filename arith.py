@@ -0,0 +1,78 @@
+"""Integer semantics of the language, shared by the optimiser and the runtimes."""
+
+import unicodedata
+from typing import Callable, Dict
+
+INT_BITS = 32
+INT_MIN = -(1 << (INT_BITS - 1))
+INT_MAX = (1 << (INT_BITS - 1)) - 1
+
+
+def wrap(value: int) -> int:
+    """Reduce a value to a signed 32-bit int, wrapping around on overflow."""
+    return ((value - INT_MIN) & ((1 << INT_BITS) - 1)) + INT_MIN
+
+
+def divide(left: int, right: int) -> int:
+    """
+    Divide like C: the quotient is truncated toward zero.
+
+    Raises:
+        ZeroDivisionError: If right is 0
+    """
+    quotient = abs(left) // abs(right)
+    return wrap(-quotient if (left < 0) != (right < 0) else quotient)
+
+
+def remainder(left: int, right: int) -> int:
+    """
+    Take the remainder like C: it has the sign of left.
+
+    Raises:
+        ZeroDivisionError: If right is 0
+    """
+    return wrap(left - right * divide(left, right))
+
+
+# Every operator yields an int, wrapped to 32 bits; comparisons and ! yield 0
+# or 1. && and || are not here because their right operand is only evaluated
+# when needed.
+BINARY: Dict[str, Callable[[int, int], int]] = {
+    "+": lambda left, right: wrap(left + right),
+    "-": lambda left, right: wrap(left - right),
+    "*": lambda left, right: wrap(left * right),
+    "/": divide,
+    "%": remainder,
+    "<": lambda left, right: int(left < right),
+    "<=": lambda left, right: int(left <= right),
+    ">": lambda left, right: int(left > right),
+    ">=": lambda left, right: int(left >= right),
+    "==": lambda left, right: int(left == right),
+    "!=": lambda left, right: int(left != right),
+}
+UNARY: Dict[str, Callable[[int], int]] = {
+    "-": lambda operand: wrap(-operand),
+    "!": lambda operand: int(operand == 0),
+}
+# Operators that fail when their right operand is zero.
+DIVISION = frozenset(("/", "%"))
+
+
+def number_value(text: str) -> int:
+    """
+    Return the value of a numeric literal, wrapped to 32 bits.
+
+    The scanner accepts any Unicode digit, so each character's digit value
+    is used rather than int(), which rejects superscripts such as '²'.
+
+    Raises:
+        ValueError: If a character is numeric but not a digit, such as '½'
+    """
+    try:
+        return wrap(int(text))
+    except ValueError:
+        pass
+    value = 0
+    for character in text:
+        value = value * 10 + unicodedata.digit(character)
+    return wrap(value)
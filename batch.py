@@ -0,0 +1,248 @@
+"""Batch compile driver: checks many source files in parallel."""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from lexer import Lexer
+from parser import Parser
+from ll1 import LL1Parser
+from cache import CompileCache
+from errors import CompilerError, FileError, LexicalError, SyntaxError
+
+
+GLOB_CHARACTERS = "*?["
+
+# One cache object per process and directory, so its counters and size
+# estimate survive from file to file.
+_caches: Dict[str, CompileCache] = {}
+
+
+def get_cache(directory: str, max_bytes: int) -> CompileCache:
+    """Return this process's CompileCache for a directory."""
+    cache = _caches.get(directory)
+    if cache is None:
+        cache = _caches[directory] = CompileCache(directory, max_bytes)
+    return cache
+
+
+def compile_file(path: str, cache_dir: Optional[str] = None,
+                 cache_bytes: int = 256 * 1024 * 1024,
+                 max_errors: int = 1) -> Dict[str, Any]:
+    """
+    Scan and parse one file and describe the outcome.
+
+    Args:
+        path: Path of the source file
+        cache_dir: Optional CompileCache directory to reuse results from
+        cache_bytes: Size limit of that cache
+        max_errors: Syntax errors to report; above 1 the parser recovers
+            from each error and keeps going
+
+    Returns:
+        A JSON-serialisable dict with the path, status ("ok" or "error"),
+        the error (class, message, line, column) or None, timings in
+        seconds for reading, scanning and parsing, and "cache" ("hit",
+        "miss" or None when no cache is used). With max_errors above 1,
+        "errors" lists every error found; the first is also "error".
+    """
+    timings = {"read": 0.0, "scan": 0.0, "parse": 0.0, "total": 0.0}
+    error = None
+    errors = []
+    cache_status = None
+    started = time.perf_counter()
+    try:
+        try:
+            with open(path, 'r', encoding='utf-8') as file_reader:
+                source_code = file_reader.read()
+        except (IOError, UnicodeDecodeError) as e:
+            raise FileError(f"Cannot open file: {path}", 0, 0) from e
+        read_done = time.perf_counter()
+        timings["read"] = read_done - started
+
+        cache = get_cache(cache_dir, cache_bytes) if cache_dir else None
+        cached = cache.get(source_code) if cache is not None else None
+        if cached is not None:
+            cache_status = "hit"
+            if isinstance(cached.error, SyntaxError) and max_errors > 1:
+                # Only the first error is cached; the others come from
+                # parsing the cached tokens again.
+                parser = Parser(cached.tokens, recover=True, max_errors=max_errors)
+                try:
+                    parser.parse()
+                except RecursionError:
+                    # As on a miss, keep the errors recovered before the
+                    # overflow.
+                    if not parser.errors:
+                        LL1Parser(cached.tokens).parse()
+                errors = parser.errors
+            if cached.error is not None:
+                raise cached.error
+        else:
+            tokens = None
+            try:
+                tokens = Lexer(source_code).scan_stream()
+                scan_done = time.perf_counter()
+                timings["scan"] = scan_done - read_done
+
+                parser = Parser(tokens, recover=max_errors > 1, max_errors=max_errors)
+                try:
+                    parser.parse()
+                except RecursionError:
+                    # Too deep for the recursive parser. Keep the errors
+                    # recovered before the overflow; with none, the
+                    # table-driven parser gives the verdict without recursing.
+                    if not parser.errors:
+                        LL1Parser(tokens).parse()
+                errors = parser.errors
+                timings["parse"] = time.perf_counter() - scan_done
+                if errors:
+                    raise errors[0]
+            except (LexicalError, SyntaxError) as e:
+                if cache is not None:
+                    cache.put(source_code, tokens, e)
+                    cache_status = "miss"
+                raise
+            if cache is not None:
+                cache.put(source_code, tokens, None)
+                cache_status = "miss"
+    except CompilerError as e:
+        error = describe_error(e)
+    except Exception as e:
+        error = {"class": type(e).__name__, "message": str(e),
+                 "line": None, "column": None}
+    timings["total"] = time.perf_counter() - started
+
+    result = {
+        "path": path,
+        "status": "ok" if error is None else "error",
+        "error": error,
+        "timings": timings,
+        "cache": cache_status,
+    }
+    if max_errors > 1:
+        result["errors"] = ([describe_error(e) for e in errors] if errors
+                            else [error] if error is not None else [])
+    return result
+
+
+def describe_error(error: CompilerError) -> Dict[str, Any]:
+    """Return the JSON form of a compiler error."""
+    return {
+        "class": type(error).__name__,
+        "message": error.message,
+        "line": error.line,
+        "column": error.column,
+    }
+
+
+def expand_paths(arguments: Iterable[str], include: str) -> List[str]:
+    """
+    Turn command-line arguments into a sorted list of source files.
+
+    Args:
+        arguments: Files, directories (searched recursively) or glob patterns
+        include: Glob that files found in directories must match
+
+    Returns:
+        Unique file paths. Arguments that match nothing are kept as they are,
+        so they are reported as FileErrors rather than silently dropped.
+    """
+    paths = set()
+    for argument in arguments:
+        if os.path.isdir(argument):
+            pattern = os.path.join(argument, "**", include)
+            paths.update(p for p in glob.glob(pattern, recursive=True)
+                         if os.path.isfile(p))
+        elif any(c in argument for c in GLOB_CHARACTERS):
+            paths.update(p for p in glob.glob(argument, recursive=True)
+                         if os.path.isfile(p))
+        else:
+            paths.add(argument)
+    return sorted(paths)
+
+
+def run(paths: List[str], jobs: int, cache_dir: Optional[str] = None,
+        cache_bytes: int = 256 * 1024 * 1024,
+        max_errors: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Compile every path, spreading the work over jobs worker processes.
+
+    Yields:
+        One result dict per path, in the order of paths
+    """
+    work = partial(compile_file, cache_dir=cache_dir, cache_bytes=cache_bytes,
+                   max_errors=max_errors)
+    if jobs <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield work(path)
+        return
+
+    # Hand out work in batches so each file does not cost a round trip.
+    chunksize = max(1, min(64, len(paths) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(work, paths, chunksize=chunksize)
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Run the batch driver.
+
+    Returns:
+        0 if every file compiled, 1 if any failed, 2 if no files were given
+    """
+    arg_parser = argparse.ArgumentParser(
+        description="Scan and parse many source files, one JSON result per line.")
+    arg_parser.add_argument("paths", nargs="+",
+                            help="files, directories or glob patterns")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                            help="worker processes (default: number of CPUs)")
+    arg_parser.add_argument("--include", default="*.txt",
+                            help="file pattern used inside directories (default: *.txt)")
+    arg_parser.add_argument("-o", "--output",
+                            help="write results to this file instead of stdout")
+    arg_parser.add_argument("--cache-dir",
+                            help="reuse results of unchanged files from this directory")
+    arg_parser.add_argument("--cache-size", type=int, default=256,
+                            help="cache size limit in MB (default: 256)")
+    arg_parser.add_argument("--max-errors", type=int, default=1,
+                            help="syntax errors to report per file (default: 1)")
+    args = arg_parser.parse_args(argv)
+
+    paths = expand_paths(args.paths, args.include)
+    if not paths:
+        print("No source files found.", file=sys.stderr)
+        return 2
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    failed = 0
+    hits = 0
+    started = time.perf_counter()
+    try:
+        for result in run(paths, args.jobs, args.cache_dir,
+                          args.cache_size * 1024 * 1024, args.max_errors):
+            if result["status"] != "ok":
+                failed += 1
+            if result["cache"] == "hit":
+                hits += 1
+            output.write(json.dumps(result) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    summary = f"{len(paths)} files, {failed} failed, {elapsed:.2f}s with {args.jobs} jobs"
+    if args.cache_dir:
+        summary += f", {hits} cache hits"
+    print(summary, file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
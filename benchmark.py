@@ -0,0 +1,204 @@
+"""Throughput and memory benchmark of the scanner and parser on generated workloads."""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from lexer import Lexer
+from parser import Parser
+from workload import SHAPES, generate_program
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+# Metrics compared against a baseline, and whether larger values are better.
+METRICS = {
+    "scan_tokens_per_sec": True,
+    "parse_tokens_per_sec": True,
+    "end_to_end_mb_per_sec": True,
+    "peak_rss_kb": False,
+}
+# How compare() prints each metric.
+METRIC_FORMATS = {
+    "scan_tokens_per_sec": ",.0f",
+    "parse_tokens_per_sec": ",.0f",
+    "end_to_end_mb_per_sec": ".2f",
+    "peak_rss_kb": ",.0f",
+}
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Return the peak resident set size of this process in KB, if known."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure_case(shape: str, size: int, seed: int, runs: int) -> Dict[str, Any]:
+    """
+    Benchmark one generated workload.
+
+    Each phase is timed separately and the best of runs is kept. Scanning
+    builds a TokenStream; parsing consumes that stream; end to end streams
+    tokens from the Lexer straight into the Parser, as main.py does.
+
+    Returns:
+        A dict of the metrics in METRICS plus the workload description
+    """
+    source = generate_program(shape, size, seed)
+    scan_time = parse_time = total_time = float("inf")
+    token_count = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        tokens = Lexer(source).scan_stream()
+        scanned = time.perf_counter()
+        Parser(tokens).parse()
+        parsed = time.perf_counter()
+        Parser(Lexer(source)).parse()
+        finished = time.perf_counter()
+
+        token_count = len(tokens)
+        scan_time = min(scan_time, scanned - started)
+        parse_time = min(parse_time, parsed - scanned)
+        total_time = min(total_time, finished - parsed)
+
+    return {
+        "shape": shape,
+        "bytes": len(source.encode("utf-8")),
+        "tokens": token_count,
+        "scan_tokens_per_sec": token_count / scan_time,
+        "parse_tokens_per_sec": token_count / parse_time,
+        "end_to_end_mb_per_sec": len(source.encode("utf-8")) / total_time / 1e6,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def run_cases(shapes: List[str], size: int, seed: int, runs: int,
+              isolate: bool = True) -> List[Dict[str, Any]]:
+    """
+    Benchmark every shape.
+
+    Args:
+        isolate: Run each case in a fresh interpreter, so its peak RSS is
+            not inflated by the cases before it
+
+    Returns:
+        One result dict per shape
+    """
+    if not isolate:
+        return [measure_case(shape, size, seed, runs) for shape in shapes]
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for shape in shapes:
+        with context.Pool(1) as pool:
+            results.append(pool.apply(measure_case, (shape, size, seed, runs)))
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+            tolerance: float) -> List[str]:
+    """
+    Compare results against a baseline.
+
+    Args:
+        results: Results of this run
+        baseline: Results loaded from a baseline file
+        tolerance: Allowed relative slowdown or growth, e.g. 0.1 for 10%
+
+    Returns:
+        One message per metric that regressed beyond the tolerance
+    """
+    previous = {case["shape"]: case for case in baseline}
+    regressions = []
+    for case in results:
+        old = previous.get(case["shape"])
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            new_value = case.get(metric)
+            old_value = old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = new_value / old_value - 1
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                spec = METRIC_FORMATS[metric]
+                regressions.append(f"{case['shape']}: {metric} {old_value:{spec}} -> "
+                                   f"{new_value:{spec}} ({change:+.1%})")
+    return regressions
+
+
+def format_table(results: List[Dict[str, Any]]) -> str:
+    """Return the results as an aligned text table."""
+    lines = [f"{'shape':<12} {'KB':>8} {'tokens':>9} {'scan tok/s':>12} "
+             f"{'parse tok/s':>12} {'MB/s':>7} {'peak RSS KB':>12}"]
+    for case in results:
+        rss = case["peak_rss_kb"]
+        lines.append(f"{case['shape']:<12} {case['bytes'] / 1024:>8.0f} "
+                     f"{case['tokens']:>9,} {case['scan_tokens_per_sec']:>12,.0f} "
+                     f"{case['parse_tokens_per_sec']:>12,.0f} "
+                     f"{case['end_to_end_mb_per_sec']:>7.2f} "
+                     f"{rss if rss is not None else '-':>12}")
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Run the benchmark suite.
+
+    Returns:
+        0, or 1 if a metric regressed beyond the tolerance of --baseline
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES),
+                            help="workload shapes to run (default: all)")
+    arg_parser.add_argument("--size", type=int, default=1_000_000,
+                            help="approximate workload size in characters")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--runs", type=int, default=3,
+                            help="timed runs per case; the best is kept")
+    arg_parser.add_argument("--no-isolate", action="store_true",
+                            help="run all cases in this process")
+    arg_parser.add_argument("--save-baseline", metavar="FILE",
+                            help="store the results as a baseline")
+    arg_parser.add_argument("--baseline", metavar="FILE",
+                            help="compare the results against a stored baseline")
+    arg_parser.add_argument("--tolerance", type=float, default=10.0,
+                            help="allowed regression in percent (default: 10)")
+    args = arg_parser.parse_args(argv)
+
+    results = run_cases(args.shapes, args.size, args.seed, args.runs,
+                        not args.no_isolate)
+    print(format_table(results))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file_writer:
+            json.dump({"size": args.size, "seed": args.seed, "results": results},
+                      file_writer, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file_reader:
+            stored = json.load(file_reader)
+        if stored.get("size") != args.size or stored.get("seed") != args.seed:
+            print("Warning: baseline was recorded with a different size or seed",
+                  file=sys.stderr)
+        regressions = compare(results, stored["results"], args.tolerance / 100)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Compare the throughput of Scanner and Lexer on a large generated source."""
+
+import argparse
+import time
+
+from scanner import Scanner
+from lexer import Lexer
+
+
+SAMPLE_FUNCTION = """
+/* function {index}
+   generated for benchmarking */
+int func{index}() {{
+    int x=10; // initial value
+    int total = x + 42 * x - 7 / x;
+    if(x==3)
+    {{
+        x=1;
+    }}
+    else
+    {{
+        x-=total;
+    }}
+
+    for(int i=0;i<10;i++){{
+        x++;
+        total += i;
+    }}
+
+    return {index};
+}}
+"""
+
+
+def build_source(functions: int) -> str:
+    """Build a source file containing the given number of functions."""
+    return "".join(SAMPLE_FUNCTION.format(index=i) for i in range(functions))
+
+
+def measure(scanner_class, source: str, runs: int):
+    """
+    Time scanner_class over the source and keep the best run.
+
+    Returns:
+        Tuple of (tokens, best_seconds)
+    """
+    best = None
+    tokens = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        tokens = scanner_class(source).scan()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return tokens, best
+
+
+def main():
+    """Run the comparison and print tokens per second for each scanner."""
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--functions", type=int, default=5000,
+                            help="number of generated functions")
+    arg_parser.add_argument("--runs", type=int, default=3,
+                            help="timed runs per scanner, best is reported")
+    args = arg_parser.parse_args()
+
+    source = build_source(args.functions)
+    print(f"Source: {len(source) / 1e6:.2f} MB")
+
+    reference, scanner_time = measure(Scanner, source, args.runs)
+    tokens, lexer_time = measure(Lexer, source, args.runs)
+    if tokens != reference:
+        raise SystemExit("Lexer output differs from Scanner output")
+
+    for name, elapsed in (("Scanner", scanner_time), ("Lexer", lexer_time)):
+        print(f"{name:8} {len(tokens) / elapsed:14,.0f} tokens/sec "
+              f"({elapsed:.3f}s for {len(tokens):,} tokens)")
+    print(f"Speedup: {scanner_time / lexer_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
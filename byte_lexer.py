@@ -0,0 +1,218 @@
+"""Memory-mapped input and a lexer that scans ASCII bytes in place."""
+
+import mmap
+import re
+import sys
+from typing import Iterator, Optional, Tuple
+
+from tokens import TokenCode, KEYWORDS
+from lexer import Lexer, PUNCTUATION_CODES, CHECKPOINT_INTERVAL
+from positions import LineIndex
+from errors import FileError, LexicalError
+
+
+class ByteClass:
+    """Classes of a source byte."""
+    INVALID = 0
+    SPACE = 1
+    LETTER = 2
+    DIGIT = 3
+    NON_ASCII = 4
+
+
+def _classify(byte: int) -> int:
+    if byte >= 0x80:
+        return ByteClass.NON_ASCII
+    c = chr(byte)
+    # The same tests Scanner applies, restricted to ASCII.
+    if c.isspace():
+        return ByteClass.SPACE
+    if c.isalpha():
+        return ByteClass.LETTER
+    if c.isnumeric():
+        return ByteClass.DIGIT
+    return ByteClass.INVALID
+
+
+# ByteClass of every byte value. Punctuation is INVALID here; the master
+# pattern matches it before a byte is ever classified.
+BYTE_CLASSES = bytes(_classify(byte) for byte in range(256))
+
+
+def _byte_set(*classes: int) -> bytes:
+    """Return a regex character set of every byte in the given classes."""
+    members = bytes(byte for byte in range(256) if BYTE_CLASSES[byte] in classes)
+    return b"[" + b"".join(re.escape(bytes((byte,))) for byte in members) + b"]"
+
+
+def _build_byte_pattern():
+    """
+    Build the bytes counterpart of the Lexer's master pattern.
+
+    Character classes come from BYTE_CLASSES rather than the regex
+    shorthands, whose ASCII meaning of \\s differs from str.isspace().
+    """
+    double = sorted(op.encode("ascii") for op in PUNCTUATION_CODES if len(op) == 2)
+    single = sorted(op.encode("ascii") for op in PUNCTUATION_CODES if len(op) == 1)
+    punctuation = b"|".join(re.escape(op) for op in double)
+    punctuation += b"|[" + b"".join(re.escape(op) for op in single) + b"]"
+    space = _byte_set(ByteClass.SPACE)
+    letter = _byte_set(ByteClass.LETTER)
+    word = b"(?:" + _byte_set(ByteClass.LETTER, ByteClass.DIGIT) + b"|_)"
+    return re.compile(
+        space + b"*(?:"
+        b"(?P<id>" + letter + word + b"*)"
+        b"|(?P<num>[0-9]+)"
+        b"|(?P<lc>//[^\\n]*\\n?)"
+        b"|(?P<bc>/\\*.*?\\*/)"
+        b"|(?P<uc>/\\*)"
+        b"|(?P<punct>" + punctuation + b")"
+        b"|(?P<other>.)"
+        b"|(?P<eof>\\Z))",
+        re.DOTALL
+    )
+
+
+_BYTE_MASTER = _build_byte_pattern()
+_BYTE_PUNCTUATION = {text.encode("ascii"): (code, text)
+                     for text, code in PUNCTUATION_CODES.items()}
+
+
+class MappedSource:
+    """
+    A source file mapped read-only into memory.
+
+    The bytes are paged in by the operating system as the lexer reaches
+    them, so scanning a file of any size needs no buffer of that size.
+    Use as a context manager, or call close() when done.
+
+    Attributes:
+        path: The file name
+        data: The mapped bytes (an empty bytes object for an empty file)
+    """
+
+    def __init__(self, path: str):
+        """
+        Map a file.
+
+        Args:
+            path: File to map
+
+        Raises:
+            FileError: If the file cannot be opened or mapped
+        """
+        self.path: str = path
+        self._map: Optional[mmap.mmap] = None
+        try:
+            with open(path, 'rb') as file_reader:
+                # Mapping an empty file is an error; there is nothing to map.
+                if file_reader.seek(0, 2):
+                    self._map = mmap.mmap(file_reader.fileno(), 0,
+                                          access=mmap.ACCESS_READ)
+        except (IOError, ValueError) as e:
+            raise FileError(f"Cannot open file: {path}", 0, 0) from e
+        self.data = self._map if self._map is not None else b""
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def close(self) -> None:
+        """Unmap the file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self.data = b""
+
+    def __enter__(self) -> "MappedSource":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ByteLexer(Lexer):
+    """
+    Scans an ASCII source held as bytes, such as a MappedSource.
+
+    Gives the same tokens and errors as Lexer for ASCII input, with token
+    offsets and error columns counted in bytes. Token text is decoded one
+    token at a time; the source itself is never decoded or copied. Any byte
+    outside ASCII is a LexicalError at its exact position.
+    """
+
+    def __init__(self, data):
+        """
+        Initialize the lexer over bytes.
+
+        Args:
+            data: bytes, bytearray, mmap or anything else re can search
+        """
+        super().__init__(data)
+
+    def iter_coded(self, start: int = 0) -> Iterator[Tuple[int, str, int, int]]:
+        """
+        Yield (code, value, start, end) for each token as it is scanned.
+
+        Args:
+            start: Byte offset to start scanning from. It must not lie inside
+                a token or a comment.
+
+        Raises:
+            LexicalError: For a non-ASCII byte, an invalid character or an
+                unclosed comment
+        """
+        src = self.src
+        keywords = KEYWORDS
+        punctuation = _BYTE_PUNCTUATION
+        keyword_code = TokenCode.KEYWORD
+        id_code = TokenCode.ID
+        number_code = TokenCode.NUMBER
+        intern = sys.intern
+        # Decoded (code, value) of every distinct word seen, so a repeated
+        # name costs one dict lookup instead of a decode and an intern.
+        words = {}
+        checkpoint = self.checkpoint
+        matches = 0
+
+        for m in _BYTE_MASTER.finditer(src, start):
+            if checkpoint is not None:
+                matches += 1
+                if matches == CHECKPOINT_INTERVAL:
+                    matches = 0
+                    checkpoint(m.start())
+            kind = m.lastgroup
+            if kind == "id":
+                raw = m.group("id")
+                end = m.end()
+                word = words.get(raw)
+                if word is None:
+                    value = raw.decode("ascii")
+                    word = words[raw] = ((keyword_code, value) if value in keywords
+                                         else (id_code, intern(value)))
+                yield (word[0], word[1], end - len(raw), end)
+            elif kind == "punct":
+                raw = m.group("punct")
+                end = m.end()
+                code, value = punctuation[raw]
+                yield (code, value, end - len(raw), end)
+            elif kind == "num":
+                value = m.group("num").decode("ascii")
+                end = m.end()
+                yield (number_code, value, end - len(value), end)
+            elif kind == "lc" or kind == "bc":
+                pass
+            elif kind == "eof":
+                return
+            elif kind == "uc":
+                raise self._error("Unclosed multi-line comment", len(src))
+            else:
+                offset = m.start(kind)
+                byte = src[offset]
+                if BYTE_CLASSES[byte] == ByteClass.NON_ASCII:
+                    raise self._error(f"Non-ASCII byte 0x{byte:02X}", offset)
+                raise self._error(f"Invalid character '{chr(byte)}'", offset)
+
+    def _error(self, message: str, offset: int) -> LexicalError:
+        """Build a LexicalError, positioned now since the map may be closed."""
+        line, column = LineIndex(self.src).position(offset)
+        return LexicalError(message, line, column, offset)
@@ -0,0 +1,215 @@
+"""Register bytecode for the virtual machine, assembled from the IR."""
+
+from array import array
+from typing import Dict, List
+
+import ir
+from ir import Opcode, IRFunction
+from syntax_tree import Program
+
+# Bytecode instructions are four ints: opcode and three operands. Every
+# operand that names a value is a register index; constants are preloaded
+# into registers after the variables, so the VM never asks whether an
+# operand is a constant. Jump targets are offsets into the code array.
+WIDTH = 4
+
+
+class Bytecode:
+    """Bytecode opcodes."""
+    MOVE = 0              # r[d] = r[a]
+    ADD = 1               # r[d] = r[a] + r[b]
+    SUB = 2
+    MUL = 3
+    DIV = 4
+    MOD = 5
+    LT = 6
+    LE = 7
+    GT = 8
+    GE = 9
+    EQ = 10
+    NE = 11
+    NEG = 12              # r[d] = -r[a]
+    NOT = 13              # r[d] = !r[a]
+    JUMP = 14             # goto d
+    JUMP_IF_ZERO = 15     # if r[a] == 0 goto d
+    JUMP_IF_NONZERO = 16  # if r[a] != 0 goto d
+    # A comparison whose only use is the branch after it, fused into one
+    # instruction: if r[a] < r[b] goto d, and so on.
+    JUMP_LT = 17
+    JUMP_LE = 18
+    JUMP_GT = 19
+    JUMP_GE = 20
+    JUMP_EQ = 21
+    JUMP_NE = 22
+    RETURN = 23           # return r[a]
+
+
+BYTECODE_NAMES: List[str] = [name for name, _ in sorted(
+    ((name, code) for name, code in vars(Bytecode).items() if not name.startswith("_")),
+    key=lambda item: item[1])]
+
+_TRANSLATION = {
+    Opcode.MOVE: Bytecode.MOVE, Opcode.ADD: Bytecode.ADD, Opcode.SUB: Bytecode.SUB,
+    Opcode.MUL: Bytecode.MUL, Opcode.DIV: Bytecode.DIV, Opcode.MOD: Bytecode.MOD,
+    Opcode.LT: Bytecode.LT, Opcode.LE: Bytecode.LE, Opcode.GT: Bytecode.GT,
+    Opcode.GE: Bytecode.GE, Opcode.EQ: Bytecode.EQ, Opcode.NE: Bytecode.NE,
+    Opcode.NEG: Bytecode.NEG, Opcode.NOT: Bytecode.NOT,
+}
+# Fused branch taken when the comparison is true, and when it is false.
+_JUMP_IF_TRUE = {
+    Opcode.LT: Bytecode.JUMP_LT, Opcode.LE: Bytecode.JUMP_LE,
+    Opcode.GT: Bytecode.JUMP_GT, Opcode.GE: Bytecode.JUMP_GE,
+    Opcode.EQ: Bytecode.JUMP_EQ, Opcode.NE: Bytecode.JUMP_NE,
+}
+_JUMP_IF_FALSE = {
+    Opcode.LT: Bytecode.JUMP_GE, Opcode.LE: Bytecode.JUMP_GT,
+    Opcode.GT: Bytecode.JUMP_LE, Opcode.GE: Bytecode.JUMP_LT,
+    Opcode.EQ: Bytecode.JUMP_NE, Opcode.NE: Bytecode.JUMP_EQ,
+}
+_OPERATORS = {
+    Bytecode.ADD: "+", Bytecode.SUB: "-", Bytecode.MUL: "*", Bytecode.DIV: "/",
+    Bytecode.MOD: "%", Bytecode.LT: "<", Bytecode.LE: "<=", Bytecode.GT: ">",
+    Bytecode.GE: ">=", Bytecode.EQ: "==", Bytecode.NE: "!=",
+}
+
+
+class CodeObject:
+    """
+    The bytecode of one function.
+
+    Attributes:
+        name: Function name
+        code: Instructions, WIDTH ints each
+        constants: Values of the registers after the variables
+        register_names: Names of the variable and temporary registers
+    """
+
+    def __init__(self, name: str, code: array, constants: List[int],
+                 register_names: List[str]):
+        self.name: str = name
+        self.code: array = code
+        self.constants: List[int] = constants
+        self.register_names: List[str] = register_names
+
+    def __len__(self) -> int:
+        return len(self.code) // WIDTH
+
+    def registers(self) -> List[int]:
+        """Return a fresh register file: variables at 0, then the constants."""
+        return [0] * len(self.register_names) + self.constants
+
+    def _register_text(self, register: int) -> str:
+        if register < len(self.register_names):
+            return self.register_names[register]
+        return str(self.constants[register - len(self.register_names)])
+
+    def disassemble(self) -> str:
+        """Return the code as text, one instruction per line."""
+        lines = [f"code {self.name}:"]
+        code = self.code
+        text = self._register_text
+        for pc in range(0, len(code), WIDTH):
+            op, d, a, b = code[pc:pc + WIDTH]
+            name = BYTECODE_NAMES[op]
+            if op in _OPERATORS:
+                detail = f"{text(d)} = {text(a)} {_OPERATORS[op]} {text(b)}"
+            elif op == Bytecode.MOVE:
+                detail = f"{text(d)} = {text(a)}"
+            elif op in (Bytecode.NEG, Bytecode.NOT):
+                detail = f"{text(d)} = {'-' if op == Bytecode.NEG else '!'}{text(a)}"
+            elif op == Bytecode.JUMP:
+                detail = f"-> {d}"
+            elif op in (Bytecode.JUMP_IF_ZERO, Bytecode.JUMP_IF_NONZERO):
+                detail = f"{text(a)} -> {d}"
+            elif op == Bytecode.RETURN:
+                detail = text(a)
+            else:
+                detail = f"{text(a)}, {text(b)} -> {d}"
+            lines.append(f"{pc:>6}  {name:<16} {detail}")
+        return "\n".join(lines)
+
+
+def assemble(function: IRFunction) -> CodeObject:
+    """
+    Translate an IR function into bytecode.
+
+    Labels disappear: jumps get the offset of the instruction after their
+    label. A comparison into a register that only the following branch
+    reads becomes one fused compare-and-branch instruction.
+    """
+    ops, dst, a, b = function.ops, function.dst, function.a, function.b
+    count = len(ops)
+    base = len(function.slot_names)
+
+    def register(operand: int) -> int:
+        return base + ~operand if operand < 0 else operand
+
+    reads = [0] * base
+    for index in range(count):
+        op = ops[index]
+        if op in ir.READS_A and a[index] >= 0:
+            reads[a[index]] += 1
+        if op in ir.READS_B and b[index] >= 0:
+            reads[b[index]] += 1
+
+    # Decide which instructions are fused away, then where labels land.
+    fused = bytearray(count)
+    for index in range(count - 1):
+        op = ops[index]
+        if (op in _JUMP_IF_TRUE and ops[index + 1] in ir.BRANCHES and
+                a[index + 1] == dst[index] and reads[dst[index]] == 1):
+            fused[index] = 1
+    labels: Dict[int, int] = {}
+    offset = 0
+    for index in range(count):
+        if ops[index] == Opcode.LABEL:
+            labels[a[index]] = offset
+        elif not fused[index]:
+            offset += WIDTH
+
+    code = array('i')
+    for index in range(count):
+        op = ops[index]
+        if op == Opcode.LABEL or fused[index]:
+            continue
+        if op in _TRANSLATION:
+            code.extend((_TRANSLATION[op], dst[index], register(a[index]),
+                         register(b[index]) if op in ir.READS_B else 0))
+        elif op == Opcode.JUMP:
+            code.extend((Bytecode.JUMP, labels[a[index]], 0, 0))
+        elif op in ir.BRANCHES:
+            target = labels[b[index]]
+            if index and fused[index - 1]:
+                compare = ops[index - 1]
+                table = _JUMP_IF_FALSE if op == Opcode.JUMP_IF_ZERO else _JUMP_IF_TRUE
+                code.extend((table[compare], target, register(a[index - 1]),
+                             register(b[index - 1])))
+            else:
+                branch = (Bytecode.JUMP_IF_ZERO if op == Opcode.JUMP_IF_ZERO
+                          else Bytecode.JUMP_IF_NONZERO)
+                code.extend((branch, target, register(a[index]), 0))
+        elif op == Opcode.RETURN:
+            code.extend((Bytecode.RETURN, 0, register(a[index]), 0))
+    return CodeObject(function.name, code, list(function.constants),
+                      list(function.slot_names))
+
+
+def compile_program(program: Program, optimize: bool = True) -> Dict[str, CodeObject]:
+    """
+    Compile a parsed program to bytecode.
+
+    Args:
+        program: Syntax tree from Parser
+        optimize: Run the IR optimisation passes first
+
+    Returns:
+        Code objects by function name; a later function replaces an earlier
+        one of the same name
+
+    Raises:
+        LexicalError: For a numeric literal that is not made of digits
+    """
+    functions = ir.lower_program(program)
+    if optimize:
+        ir.optimize_program(functions)
+    return {function.name: assemble(function) for function in functions}
@@ -0,0 +1,286 @@
+"""Content-addressed on-disk cache for scan and parse results."""
+
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Dict, Optional, Tuple
+
+import tokens as token_tables
+from lexer import Lexer
+from parser import Parser, GRAMMAR_VERSION
+from ll1 import LL1Parser
+from token_stream import TokenStream
+from errors import CompilerError, LexicalError, SyntaxError
+
+
+# Entry layout: header, UTF-8 error message, then the raw token arrays.
+MAGIC = b"CPC1"
+HEADER = struct.Struct("<4sBIiiI")
+OUTCOME_OK = 0
+OUTCOME_LEXICAL = 1
+OUTCOME_SYNTAX = 2
+OUTCOME_ERRORS = {OUTCOME_LEXICAL: LexicalError, OUTCOME_SYNTAX: SyntaxError}
+OUTCOME_CODES = {cls: code for code, cls in OUTCOME_ERRORS.items()}
+
+
+def table_fingerprint() -> bytes:
+    """
+    Fingerprint everything besides the source that decides a cached result.
+
+    This covers the token tables, the grammar version, and the byte order
+    and item sizes of the stored arrays.
+    """
+    parts = (
+        sorted(token_tables.KEYWORDS.items()),
+        sorted(token_tables.OPERATORS.items()),
+        sorted(token_tables.SPECIAL_CHARACTERS.items()),
+        sorted(token_tables.TOKEN_CODES.items()),
+        GRAMMAR_VERSION,
+        sys.byteorder,
+        array('I').itemsize,
+    )
+    return hashlib.sha256(repr(parts).encode("utf-8")).digest()
+
+
+class CachedResult:
+    """The stored outcome of compiling one source."""
+
+    def __init__(self, tokens: Optional[TokenStream],
+                 error: Optional[CompilerError], hit: bool):
+        """
+        Args:
+            tokens: The token stream, or None if scanning failed
+            error: The error that stopped the compile, or None
+            hit: Whether this came from the cache
+        """
+        self.tokens: Optional[TokenStream] = tokens
+        self.error: Optional[CompilerError] = error
+        self.hit: bool = hit
+
+
+class CompileCache:
+    """
+    Caches token streams and parse outcomes on disk, keyed by source hash.
+
+    Entries are written to a temporary file and renamed into place, so
+    several processes can share one directory: a reader sees either a
+    complete entry or none. Reading an entry refreshes its modification
+    time, and once the directory grows past max_bytes the least recently
+    used entries are deleted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            directory: Where entries are stored; created if missing
+            max_bytes: Size the entries may occupy before eviction starts
+        """
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self.stores: int = 0
+        self.evictions: int = 0
+        self._fingerprint: bytes = table_fingerprint()
+        self._size_estimate: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source: str) -> str:
+        """Return the cache key for a source."""
+        digest = hashlib.sha256(self._fingerprint)
+        digest.update(source.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def compile(self, source: str) -> CachedResult:
+        """
+        Return the compile outcome for source, from the cache if possible.
+
+        Errors are returned in the result rather than raised.
+        """
+        result = self.get(source)
+        if result is not None:
+            return result
+
+        tokens = None
+        error = None
+        try:
+            tokens = Lexer(source).scan_stream()
+            try:
+                Parser(tokens).parse()
+            except RecursionError:
+                # Too deep for the recursive parser; the table-driven one
+                # gives the same verdict without recursing.
+                LL1Parser(tokens).parse()
+        except (LexicalError, SyntaxError) as e:
+            error = e
+        self.put(source, tokens, error)
+        return CachedResult(tokens, error, False)
+
+    def get(self, source: str) -> Optional[CachedResult]:
+        """Return the cached outcome for source, or None on a miss."""
+        result = self._load(self.key(source), source)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, source: str, tokens: Optional[TokenStream],
+            error: Optional[CompilerError]) -> None:
+        """
+        Store the outcome of compiling source.
+
+        Args:
+            source: The source code
+            tokens: Its token stream, or None if scanning failed
+            error: The LexicalError or SyntaxError raised, or None
+        """
+        self._store(self.key(source), tokens, error)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters for this cache object."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def _load(self, key: str, source: str) -> Optional[CachedResult]:
+        """Read an entry, or return None if it is missing or damaged."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as entry:
+                data = entry.read()
+            os.utime(path)
+        except OSError:
+            return None
+
+        try:
+            return _decode(data, source)
+        except (ValueError, struct.error):
+            # A damaged entry is dropped and rebuilt.
+            _remove(path)
+            return None
+
+    def _store(self, key: str, tokens: Optional[TokenStream],
+               error: Optional[CompilerError]) -> None:
+        """Write an entry atomically and evict old entries if needed."""
+        path = self._path(key)
+        data = _encode(tokens, error)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(handle, 'wb') as entry:
+                entry.write(data)
+            os.replace(temporary, path)
+        except OSError:
+            _remove(temporary)
+            return
+        self.stores += 1
+
+        if self._size_estimate is None:
+            self._size_estimate = self._disk_usage()[0]
+        else:
+            self._size_estimate += len(data)
+        if self._size_estimate > self.max_bytes:
+            self._evict()
+
+    def _disk_usage(self) -> Tuple[int, list]:
+        """Return the total size and (mtime, size, path) of every entry."""
+        total = 0
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    info = entry.stat()
+                except OSError:
+                    continue
+                total += info.st_size
+                entries.append((info.st_mtime, info.st_size, entry.path))
+        return total, entries
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until well under the limit."""
+        total, entries = self._disk_usage()
+        target = self.max_bytes * 0.9
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if _remove(path):
+                self.evictions += 1
+            total -= size
+        self._size_estimate = total
+
+
+def _encode(tokens: Optional[TokenStream], error: Optional[CompilerError]) -> bytes:
+    """Serialise a compile outcome."""
+    message = b""
+    outcome = OUTCOME_OK
+    line = column = -1
+    if error is not None:
+        outcome = OUTCOME_CODES[type(error)]
+        message = error.message.encode("utf-8")
+        line = -1 if error.line is None else error.line
+        column = -1 if error.column is None else error.column
+    count = len(tokens) if tokens is not None else 0
+    parts = [HEADER.pack(MAGIC, outcome, count, line, column, len(message)), message]
+    if tokens is not None:
+        parts += [tokens.codes.tobytes(), tokens.starts.tobytes(), tokens.ends.tobytes()]
+    return b"".join(parts)
+
+
+def _decode(data: bytes, source: str) -> CachedResult:
+    """Rebuild a compile outcome from its serialised form."""
+    magic, outcome, count, line, column, message_length = HEADER.unpack_from(data)
+    if magic != MAGIC or (outcome != OUTCOME_OK and outcome not in OUTCOME_ERRORS):
+        raise ValueError("Not a cache entry")
+    position = HEADER.size
+    message = data[position:position + message_length].decode("utf-8")
+    position += message_length
+
+    tokens = None
+    if outcome == OUTCOME_LEXICAL:
+        if len(data) != position:
+            raise ValueError("Truncated cache entry")
+    else:
+        tokens = TokenStream(source)
+        offsets_size = count * tokens.starts.itemsize
+        if len(data) != position + count + 2 * offsets_size:
+            raise ValueError("Truncated cache entry")
+        tokens.codes.frombytes(data[position:position + count])
+        position += count
+        tokens.starts.frombytes(data[position:position + offsets_size])
+        position += offsets_size
+        tokens.ends.frombytes(data[position:position + offsets_size])
+
+    error = None
+    if outcome != OUTCOME_OK:
+        error = OUTCOME_ERRORS[outcome](message,
+                                        None if line < 0 else line,
+                                        None if column < 0 else column)
+    return CachedResult(tokens, error, True)
+
+
+def _remove(path: str) -> bool:
+    """Delete a file, tolerating another process having removed it first."""
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,402 @@
+"""Control-flow graphs of parsed functions."""
+
+import argparse
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import arith
+from lexer import Lexer
+from parser import Parser
+from semantic import ScopeKind, Symbol, SymbolTable
+from syntax_tree import (Program, Function, Block, If, For, Declaration,
+                         Assignment, UnaryOp, BinaryOp, Compare, Identifier,
+                         Number)
+from errors import CompilerError, FileError
+
+
+class Step:
+    """
+    One statement, or one condition, as the dataflow analyses see it.
+
+    Attributes:
+        node: The Declaration, Assignment, Return or condition expression
+        defined: Number of the variable written, or -1
+        uses: (variable number, source offset) of every variable read, in
+            evaluation order; a compound assignment reads its target first
+        undefines: Whether this is a declaration without an initializer,
+            which writes its variable without giving it a value
+    """
+
+    __slots__ = ("node", "defined", "uses", "undefines")
+
+    def __init__(self, node, defined: int = -1):
+        self.node = node
+        self.defined: int = defined
+        self.uses: List[Tuple[int, int]] = []
+        self.undefines: bool = False
+
+
+class BasicBlock:
+    """
+    A run of steps with one entry and one exit.
+
+    Attributes:
+        index: Position of the block in ControlFlowGraph.blocks
+        steps: The steps, in order
+        successors: Indices of the blocks control can go to next
+        predecessors: Indices of the blocks control can come from
+    """
+
+    __slots__ = ("index", "steps", "successors", "predecessors")
+
+    def __init__(self, index: int):
+        self.index: int = index
+        self.steps: List[Step] = []
+        self.successors: List[int] = []
+        self.predecessors: List[int] = []
+
+    def __repr__(self) -> str:
+        return (f"BasicBlock({self.index}, steps={len(self.steps)}, "
+                f"successors={self.successors})")
+
+
+class ControlFlowGraph:
+    """
+    The control-flow graph of one function.
+
+    Block 0 is the entry and block 1 the exit, which every return and the
+    end of the body lead to. Variables are numbered in declaration order;
+    a name used without a declaration gets one function-wide variable, as
+    the backends treat it, marked as implicit.
+
+    Attributes:
+        name: Function name
+        blocks: All blocks, indexed by BasicBlock.index
+        variables: The Symbol of each variable number
+        implicit: Numbers of the variables that were never declared
+        loop_depth: Deepest nesting of for loops
+    """
+
+    ENTRY = 0
+    EXIT = 1
+
+    def __init__(self, name: str):
+        self.name: str = name
+        self.blocks: List[BasicBlock] = [BasicBlock(0), BasicBlock(1)]
+        self.variables: List[Symbol] = []
+        self.implicit: set = set()
+        self.loop_depth: int = 0
+
+    def new_block(self) -> BasicBlock:
+        """Add an empty block."""
+        block = BasicBlock(len(self.blocks))
+        self.blocks.append(block)
+        return block
+
+    def add_edge(self, source: int, target: int) -> None:
+        """Let control flow from block source to block target."""
+        self.blocks[source].successors.append(target)
+        self.blocks[target].predecessors.append(source)
+
+    def reachable(self) -> List[bool]:
+        """Return, for every block, whether control can reach it from the entry."""
+        seen = [False] * len(self.blocks)
+        seen[self.ENTRY] = True
+        pending = [self.ENTRY]
+        while pending:
+            for successor in self.blocks[pending.pop()].successors:
+                if not seen[successor]:
+                    seen[successor] = True
+                    pending.append(successor)
+        return seen
+
+    def postorder(self) -> List[int]:
+        """
+        Return the blocks reachable from the entry in depth-first postorder.
+
+        Successors are followed last first. A loop header's successors are
+        its body and then its exit, so the body comes before the code after
+        the loop in reverse postorder, which is what lets a dataflow solver
+        settle each loop before moving past it.
+        """
+        order = []
+        seen = [False] * len(self.blocks)
+        seen[self.ENTRY] = True
+        # (block, index of the next successor to visit)
+        stack = [(self.ENTRY, 0)]
+        while stack:
+            index, position = stack[-1]
+            successors = self.blocks[index].successors
+            if position < len(successors):
+                stack[-1] = (index, position + 1)
+                successor = successors[-1 - position]
+                if not seen[successor]:
+                    seen[successor] = True
+                    stack.append((successor, 0))
+            else:
+                stack.pop()
+                order.append(index)
+        return order
+
+    def dump(self) -> str:
+        """Return the graph as text, a line per block followed by its steps."""
+        lines = [f"function {self.name}:"]
+        for block in self.blocks:
+            lines.append(f"  block {block.index} -> {block.successors}")
+            for step in block.steps:
+                defined = (self.variables[step.defined].name
+                           if step.defined >= 0 else "-")
+                uses = ", ".join(self.variables[var].name for var, _ in step.uses)
+                lines.append(f"    {type(step.node).__name__:<11} def {defined:<8} use {uses}")
+        return "\n".join(lines)
+
+
+def constant_value(node) -> Optional[int]:
+    """
+    Evaluate an expression made only of numbers, as the backends would.
+
+    Both operands of && and || are evaluated, so one that would fail
+    makes the whole expression non-constant.
+
+    Returns:
+        The value, or None if the expression reads a variable, divides by
+        zero or holds a literal that is not a number
+    """
+    values: List[int] = []
+    # Post-order walk with an explicit stack; (node, True) means the
+    # operands have been evaluated and are on top of values.
+    pending = [(node, False)]
+    while pending:
+        node, ready = pending.pop()
+        if isinstance(node, Number):
+            try:
+                values.append(arith.number_value(node.value))
+            except ValueError:
+                return None
+        elif isinstance(node, Identifier):
+            return None
+        elif isinstance(node, UnaryOp):
+            if ready:
+                values.append(arith.UNARY[node.operator](values.pop()))
+            else:
+                pending.append((node, True))
+                pending.append((node.operand, False))
+        elif isinstance(node, (BinaryOp, Compare)):
+            if ready:
+                right = values.pop()
+                left = values.pop()
+                operator = node.operator
+                if operator == "&&":
+                    values.append(int(bool(left) and bool(right)))
+                elif operator == "||":
+                    values.append(int(bool(left) or bool(right)))
+                else:
+                    try:
+                        values.append(arith.BINARY[operator](left, right))
+                    except ZeroDivisionError:
+                        return None
+            else:
+                pending.append((node, True))
+                pending.append((node.right, False))
+                pending.append((node.left, False))
+        else:
+            return None
+    return values[0]
+
+
+class CFGBuilder:
+    """
+    Builds the ControlFlowGraph of a function.
+
+    Names are resolved with the scoping rules of SemanticAnalyzer. A
+    condition that is a constant expression only gets the edge it can
+    take, so code behind `if (0)` or after `for (...; 1; ...)` is
+    unreachable.
+    """
+
+    def build(self, function: Function) -> ControlFlowGraph:
+        """Build the graph of one function."""
+        self._graph = graph = ControlFlowGraph(function.name)
+        self._table = SymbolTable()
+        self._numbers: Dict[int, int] = {}
+        self._implicit: Dict[str, int] = {}
+        self._loops = 0
+        self._table.enter(ScopeKind.FUNCTION)
+        body = graph.new_block()
+        graph.add_edge(graph.ENTRY, body.index)
+        end = self._block(function.body, body)
+        if end is not None:
+            graph.add_edge(end.index, graph.EXIT)
+        self._table.exit()
+        return graph
+
+    def _variable(self, symbol: Symbol) -> int:
+        number = self._numbers.get(id(symbol))
+        if number is None:
+            number = self._numbers[id(symbol)] = len(self._graph.variables)
+            self._graph.variables.append(symbol)
+        return number
+
+    def _lookup(self, name: str, start: int) -> int:
+        symbol = self._table.lookup(name)
+        if symbol is not None:
+            return self._variable(symbol)
+        number = self._implicit.get(name)
+        if number is None:
+            number = self._variable(Symbol(name, "variable", start, 0))
+            self._implicit[name] = number
+            self._graph.implicit.add(number)
+        return number
+
+    def _uses(self, step: Step, node) -> None:
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if isinstance(node, Identifier):
+                step.uses.append((self._lookup(node.name, node.start), node.start))
+            elif isinstance(node, UnaryOp):
+                pending.append(node.operand)
+            elif isinstance(node, (BinaryOp, Compare)):
+                pending.append(node.right)
+                pending.append(node.left)
+
+    def _block(self, node: Block, current: BasicBlock) -> Optional[BasicBlock]:
+        """
+        Add a block's statements, starting in current.
+
+        Returns:
+            The block control leaves the statements from, or None if every
+            path ends in a return
+        """
+        self._table.enter(ScopeKind.BLOCK)
+        for statement in node.statements:
+            if current is None:
+                # Unreachable: give the rest a block with no predecessors.
+                current = self._graph.new_block()
+            current = self._statement(statement, current)
+        if node.ret is not None:
+            if current is None:
+                current = self._graph.new_block()
+            current.steps.append(Step(node.ret))
+            self._graph.add_edge(current.index, self._graph.EXIT)
+            current = None
+        self._table.exit()
+        return current
+
+    def _simple(self, node, current: BasicBlock) -> None:
+        """Add a Declaration or Assignment step."""
+        if isinstance(node, Declaration):
+            step = Step(node)
+            if node.value is not None:
+                self._uses(step, node.value)
+            symbol = Symbol(node.name, "variable", node.start, self._table.level)
+            previous = self._table.declare(symbol)
+            number = self._variable(previous if previous is not None else symbol)
+            # A compound declaration works on the start value 0, so it
+            # reads nothing of the variable's own.
+            step.defined = number
+            step.undefines = node.operator is None
+        else:
+            step = Step(node)
+            number = self._lookup(node.name, node.start)
+            if node.operator is None:
+                step.uses.append((number, node.start))
+            else:
+                if node.operator != "=":
+                    step.uses.append((number, node.start))
+                if node.value is not None:
+                    self._uses(step, node.value)
+                step.defined = number
+        current.steps.append(step)
+
+    def _statement(self, node, current: BasicBlock) -> Optional[BasicBlock]:
+        graph = self._graph
+        if isinstance(node, (Declaration, Assignment)):
+            self._simple(node, current)
+            return current
+
+        if isinstance(node, If):
+            step = Step(node.condition)
+            self._uses(step, node.condition)
+            current.steps.append(step)
+            value = constant_value(node.condition)
+            join = graph.new_block()
+            then_block = graph.new_block()
+            if value != 0:
+                graph.add_edge(current.index, then_block.index)
+            then_end = self._block(node.then_block, then_block)
+            if then_end is not None:
+                graph.add_edge(then_end.index, join.index)
+            if node.else_block is not None:
+                else_block = graph.new_block()
+                if value is None or value == 0:
+                    graph.add_edge(current.index, else_block.index)
+                else_end = self._block(node.else_block, else_block)
+                if else_end is not None:
+                    graph.add_edge(else_end.index, join.index)
+            elif value is None or value == 0:
+                graph.add_edge(current.index, join.index)
+            return join if join.predecessors else None
+
+        if isinstance(node, For):
+            self._table.enter(ScopeKind.FOR)
+            self._loops += 1
+            graph.loop_depth = max(graph.loop_depth, self._loops)
+            self._simple(node.init, current)
+            header = graph.new_block()
+            graph.add_edge(current.index, header.index)
+            step = Step(node.condition)
+            self._uses(step, node.condition)
+            header.steps.append(step)
+            value = constant_value(node.condition)
+            body = graph.new_block()
+            exit_block = graph.new_block()
+            if value != 0:
+                graph.add_edge(header.index, body.index)
+            if value is None or value == 0:
+                graph.add_edge(header.index, exit_block.index)
+            body_end = self._block(node.body, body)
+            if body_end is not None:
+                self._simple(node.update, body_end)
+                graph.add_edge(body_end.index, header.index)
+            self._loops -= 1
+            self._table.exit()
+            return exit_block if exit_block.predecessors else None
+
+        raise TypeError(f"Cannot build a graph for {type(node).__name__}")
+
+
+def build_program(program: Program) -> List[ControlFlowGraph]:
+    """Build the graph of every function of a program, in source order."""
+    builder = CFGBuilder()
+    return [builder.build(function) for function in program.functions]
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Print the control-flow graphs of a source file.
+
+    Returns:
+        0 on success, 1 if the file does not compile
+    """
+    arg_parser = argparse.ArgumentParser(description="Print control-flow graphs.")
+    arg_parser.add_argument("path", nargs="?", default="input.txt")
+    args = arg_parser.parse_args(argv)
+
+    try:
+        try:
+            with open(args.path, 'r', encoding='utf-8') as file_reader:
+                source_code = file_reader.read()
+        except IOError as e:
+            raise FileError(f"Cannot open file: {args.path}", 0, 0) from e
+        graphs = build_program(Parser(Lexer(source_code)).parse())
+    except CompilerError as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    for graph in graphs:
+        print(graph.dump())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
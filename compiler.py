@@ -0,0 +1,462 @@
+"""Library entry points: limited compiles and reusable sessions for snippets."""
+
+import argparse
+import re
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from lexer import Lexer, PUNCTUATION_CODES
+from byte_lexer import ByteLexer
+from parser import Parser, CodedToken
+from ll1 import GRAMMAR, KEYWORD_TERMINALS, LL1Parser, LL1Table, Rule
+from positions import LineIndex
+from syntax_tree import Node, Program
+from tokens import TokenCode, OPERATORS
+from errors import CompilerError, FileError, LimitExceededError
+
+# What a CompilerSession can take a snippet to be: the Parser method that
+# parses it and the nonterminal of ll1.GRAMMAR that accepts the same text.
+START_RULES = {
+    "program": ("parse", "Program"),
+    "function": ("parse_function", "Function"),
+    "block": ("parse_block", "Block"),
+    "statement": ("parse_statement", "Statement"),
+    "declaration": ("parse_declaration", "ForInit"),
+    "assignment": ("parse_assignment", "Assignment"),
+    "expression": ("parse_expression", "Expression"),
+}
+
+
+class CompileLimits:
+    """
+    Bounds on the work one compile may do; None leaves a bound off.
+
+    Attributes:
+        max_bytes: Largest source accepted, in UTF-8 bytes
+        max_tokens: Most tokens scanned
+        max_depth: Deepest nesting of '{' and '(' together
+        timeout: Seconds of wall-clock time for scanning and parsing
+    """
+
+    __slots__ = ("max_bytes", "max_tokens", "max_depth", "timeout")
+
+    def __init__(self, max_bytes: Optional[int] = None, max_tokens: Optional[int] = None,
+                 max_depth: Optional[int] = None, timeout: Optional[float] = None):
+        self.max_bytes: Optional[int] = max_bytes
+        self.max_tokens: Optional[int] = max_tokens
+        self.max_depth: Optional[int] = max_depth
+        self.timeout: Optional[float] = timeout
+
+    def __repr__(self) -> str:
+        return (f"CompileLimits(max_bytes={self.max_bytes}, max_tokens={self.max_tokens}, "
+                f"max_depth={self.max_depth}, timeout={self.timeout})")
+
+
+class CancellationToken:
+    """
+    Lets another thread stop a compile.
+
+    The scanner looks at the token every lexer.CHECKPOINT_INTERVAL regex
+    matches, and the compile raises LimitExceededError once cancel() has
+    been called.
+    """
+
+    __slots__ = ("cancelled",)
+
+    def __init__(self):
+        self.cancelled: bool = False
+
+    def cancel(self) -> None:
+        """Ask every compile using this token to stop."""
+        self.cancelled = True
+
+
+def _exceeded(message: str, limit: str, source, offset: int) -> LimitExceededError:
+    return LimitExceededError(message, offset=offset, lines=LineIndex(source), limit=limit)
+
+
+class _GuardedTokens:
+    """
+    The tokens of a scanner, counted and checked for nesting as the parser
+    pulls them.
+    """
+
+    def __init__(self, lexer, limits: CompileLimits):
+        self.source = lexer.source
+        self._lexer = lexer
+        self._limits = limits
+
+    def iter_coded(self) -> Iterator[CodedToken]:
+        max_tokens = self._limits.max_tokens
+        max_depth = self._limits.max_depth
+        opening = (TokenCode.LBRACE, TokenCode.LPAREN)
+        closing = (TokenCode.RBRACE, TokenCode.RPAREN)
+        count = 0
+        depth = 0
+        for token in self._lexer.iter_coded():
+            count += 1
+            if max_tokens is not None and count > max_tokens:
+                raise _exceeded(f"More than {max_tokens} tokens", "tokens",
+                                self.source, token[2])
+            if max_depth is not None:
+                code = token[0]
+                if code in opening:
+                    depth += 1
+                    if depth > max_depth:
+                        raise _exceeded(f"Nesting deeper than {max_depth}", "depth",
+                                        self.source, token[2])
+                elif code in closing and depth:
+                    depth -= 1
+            yield token
+
+
+def _time_check(source, timeout: Optional[float], cancel: Optional[CancellationToken]):
+    """
+    Return the Lexer.checkpoint that enforces a timeout and a cancellation
+    token, counting the timeout from now.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    clock = time.monotonic
+
+    def check(offset: int) -> None:
+        if cancel is not None and cancel.cancelled:
+            raise _exceeded("Compile cancelled", "cancelled", source, offset)
+        if deadline is not None and clock() > deadline:
+            raise _exceeded(f"Compile took longer than {timeout}s", "time", source, offset)
+
+    return check
+
+
+def source_size(source: Union[str, bytes]) -> int:
+    """Return the size of a source in UTF-8 bytes."""
+    if not isinstance(source, str) or source.isascii():
+        return len(source)
+    return len(source.encode("utf-8", "surrogatepass"))
+
+
+def compile_source(source: Union[str, bytes], limits: Optional[CompileLimits] = None,
+                   cancel: Optional[CancellationToken] = None) -> Program:
+    """
+    Scan and parse a source within limits.
+
+    Without limits and a cancellation token this is exactly
+    Parser(Lexer(source)).parse(); the checks only exist when asked for.
+    A source given as bytes is scanned in place by ByteLexer.
+
+    Args:
+        source: The source code, as str or ASCII bytes
+        limits: Bounds on size, tokens, nesting and time
+        cancel: Token another thread can use to stop the compile
+
+    Returns:
+        The syntax tree
+
+    Raises:
+        LimitExceededError: If a limit is exceeded or the compile is
+            cancelled. Nesting too deep for the recursive parser is
+            reported as a "depth" limit even without max_depth
+        LexicalError, SyntaxError: If the source does not parse
+    """
+    lexer = Lexer(source) if isinstance(source, str) else ByteLexer(source)
+    if limits is None and cancel is None:
+        return _parse(lexer)
+
+    if limits is None:
+        limits = CompileLimits()
+    if cancel is not None and cancel.cancelled:
+        raise LimitExceededError("Compile cancelled", limit="cancelled")
+    # Characters never outnumber bytes, so the exact size is only worked
+    # out for sources that could still fit.
+    if limits.max_bytes is not None and (len(source) > limits.max_bytes or
+                                         source_size(source) > limits.max_bytes):
+        raise LimitExceededError(f"Source is larger than {limits.max_bytes} bytes",
+                                 limit="bytes")
+    check = None
+    if limits.timeout is not None or cancel is not None:
+        # Checked from the scanner's match loop, which also bounds the
+        # parser: it does a bounded amount of work per token it pulls.
+        check = lexer.checkpoint = _time_check(source, limits.timeout, cancel)
+    tokens = lexer
+    if limits.max_tokens is not None or limits.max_depth is not None:
+        tokens = _GuardedTokens(lexer, limits)
+    program = _parse(tokens)
+    if check is not None:
+        check(len(source))
+    return program
+
+
+def _parse(tokens) -> Program:
+    try:
+        return Parser(tokens).parse()
+    except RecursionError:
+        raise LimitExceededError("Nesting too deep to parse", limit="depth") from None
+
+
+class CheckResult:
+    """
+    The outcome of checking one snippet.
+
+    Attributes:
+        error: The LexicalError, SyntaxError or LimitExceededError that
+            rejected the snippet, or None
+    """
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Optional[CompilerError]):
+        self.error: Optional[CompilerError] = error
+
+    @property
+    def ok(self) -> bool:
+        """Whether the snippet was accepted."""
+        return self.error is None
+
+    def __repr__(self) -> str:
+        if self.error is None:
+            return "CheckResult(ok)"
+        return f"CheckResult({type(self.error).__name__}: {self.error})"
+
+
+# Every accepted snippet shares this result.
+_ACCEPTED = CheckResult(None)
+
+# Parse tables by start rule, built the first time a session needs one.
+_START_TABLES: Dict[str, LL1Table] = {}
+_START_EXPANSIONS: Dict[str, List[list]] = {}
+
+# Token texts of plain ASCII sources without comments: words, two-character
+# operators, and any other single character, tried in the order the Lexer
+# tries them. Which texts are tokens at all is decided by _TEXT_TERMINALS.
+_SNIPPET_TOKEN = re.compile(
+    r"[A-Za-z]\w*|[0-9]+|"
+    + "|".join(re.escape(op) for op in sorted(OPERATORS) if len(op) == 2)
+    + r"|\S")
+# Terminal of every keyword and punctuation text; other words are
+# identifiers or numbers.
+_TEXT_TERMINALS: Dict[str, int] = dict(PUNCTUATION_CODES)
+_TEXT_TERMINALS.update(KEYWORD_TERMINALS)
+
+
+def start_table(rule: str) -> LL1Table:
+    """
+    Return the LL(1) table that accepts exactly one snippet of a start rule.
+
+    Raises:
+        ValueError: If rule is not in START_RULES
+    """
+    table = _START_TABLES.get(rule)
+    if table is None:
+        if rule not in START_RULES:
+            raise ValueError(f"Unknown start rule '{rule}'")
+        name = START_RULES[rule][1]
+        inner = next(grammar_rule for grammar_rule in GRAMMAR if grammar_rule.name == name)
+        start = Rule("Start", [[name, "EOF:end of input"]], error=inner.error or name)
+        table = _START_TABLES[rule] = LL1Table([start] + GRAMMAR)
+    return table
+
+
+def expansion_table(table: LL1Table) -> List[list]:
+    """
+    Fold the chains of expansions an LL(1) table makes for one lookahead.
+
+    Before it can match a token, the driver may expand several
+    nonterminals in a row on the same lookahead, such as every precedence
+    level of an expression for its first operand. Row n, column t gives
+    the net effect of expanding nonterminal n on terminal t until t is
+    matched: the symbols left to push afterwards, as a tuple; None if n
+    derives nothing and the symbol below it has to take the lookahead; or
+    the "Expected ..." text of the error.
+    """
+    rows = table.table
+    match_terminals = table.match_terminals
+    expansions = []
+    for nonterminal in range(len(rows)):
+        row = []
+        for terminal in range(len(rows[nonterminal])):
+            pending = [~nonterminal]
+            result = None
+            while pending:
+                symbol = pending.pop()
+                if symbol >= 0:
+                    if match_terminals[symbol] == terminal:
+                        result = tuple(pending)
+                    else:
+                        result = table.match_labels[symbol]
+                    break
+                entry = rows[~symbol][terminal]
+                if entry.__class__ is str:
+                    result = entry
+                    break
+                pending.extend(entry)
+            row.append(result)
+        expansions.append(row)
+    return expansions
+
+
+class CompilerSession:
+    """
+    Checks and parses many small sources against one start rule.
+
+    Everything that does not depend on the source is set up once: the parse
+    table for the start rule, its chains of expansions folded into single
+    steps, and the map from token text to terminal. check() splits a
+    source into token texts with one findall() and drives the folded table
+    over them, with no token tuples, generators or parser objects in
+    between. A source that loop cannot decide on its own, because it is
+    rejected or holds comments or characters outside plain ASCII tokens,
+    is checked again by LL1Parser over a Lexer, so results and errors are
+    always exactly those of Parser.
+    """
+
+    def __init__(self, rule: str = "program"):
+        """
+        Create a session.
+
+        Args:
+            rule: Which part of the grammar each source must be, one of
+                START_RULES
+
+        Raises:
+            ValueError: If rule is not in START_RULES
+        """
+        self.table: LL1Table = start_table(rule)
+        self.rule: str = rule
+        self._method: str = START_RULES[rule][0]
+        self._expansions = _START_EXPANSIONS.get(rule)
+        if self._expansions is None:
+            self._expansions = _START_EXPANSIONS[rule] = expansion_table(self.table)
+        self._match_terminals = self.table.match_terminals
+        self._start = self.table.start
+
+    def check(self, source: str) -> CheckResult:
+        """Check one source, returning its result instead of raising."""
+        if self._accepts(source):
+            return _ACCEPTED
+        try:
+            LL1Parser(Lexer(source), self.table).parse()
+        except CompilerError as e:
+            return CheckResult(e)
+        return _ACCEPTED
+
+    def check_many(self, sources: Iterable[str]) -> List[CheckResult]:
+        """
+        Check sources one after another.
+
+        Returns:
+            One result per source, in order
+        """
+        accepts = self._accepts
+        check = self.check
+        return [_ACCEPTED if accepts(source) else check(source) for source in sources]
+
+    def parse(self, source: str) -> Node:
+        """
+        Parse one source into a syntax tree.
+
+        Returns:
+            The node of the session's start rule
+
+        Raises:
+            LexicalError, SyntaxError: If the source does not parse
+            LimitExceededError: If it nests too deeply for Parser
+        """
+        parser = Parser(Lexer(source))
+        try:
+            if self._method == "parse":
+                return parser.parse()
+            if self._method == "parse_statement" and parser._code == TokenCode.EOF:
+                parser.error("Statement")
+            node = getattr(parser, self._method)()
+        except RecursionError:
+            raise LimitExceededError("Nesting too deep to parse", limit="depth") from None
+        if parser._code != TokenCode.EOF:
+            parser.error("end of input")
+        return node
+
+    def _accepts(self, source: str) -> bool:
+        """
+        Check a source in one pass over its token texts.
+
+        Returns:
+            True if it is accepted; False if it is rejected or needs the
+            Lexer's rules for comments or unusual characters
+        """
+        if not source.isascii() or "/*" in source or "//" in source:
+            return False
+        expansions = self._expansions
+        match_terminals = self._match_terminals
+        terminals = _TEXT_TERMINALS
+        id_code = TokenCode.ID
+        number_code = TokenCode.NUMBER
+        stack = [self._start]
+        pop = stack.pop
+        push = stack.extend
+        for text in _SNIPPET_TOKEN.findall(source):
+            terminal = terminals.get(text)
+            if terminal is None:
+                if text[0].isalpha():
+                    terminal = id_code
+                elif text[0].isdigit():
+                    terminal = number_code
+                else:
+                    return False
+            while True:
+                if not stack:
+                    return False
+                symbol = pop()
+                if symbol >= 0:
+                    if match_terminals[symbol] != terminal:
+                        return False
+                    break
+                rest = expansions[~symbol][terminal]
+                if rest is None:
+                    continue
+                if rest.__class__ is str:
+                    return False
+                push(rest)
+                break
+        # The start rule ends by matching the end of input.
+        while stack:
+            symbol = pop()
+            if symbol >= 0:
+                return match_terminals[symbol] == TokenCode.EOF and not stack
+            rest = expansions[~symbol][TokenCode.EOF]
+            if rest is None:
+                continue
+            return rest.__class__ is tuple and not rest and not stack
+        return False
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Compile a source file within limits.
+
+    Returns:
+        0 if the file parses within the limits, 1 otherwise
+    """
+    arg_parser = argparse.ArgumentParser(description="Scan and parse a file within limits.")
+    arg_parser.add_argument("path", nargs="?", default="input.txt")
+    arg_parser.add_argument("--max-bytes", type=int, help="largest source accepted")
+    arg_parser.add_argument("--max-tokens", type=int, help="most tokens scanned")
+    arg_parser.add_argument("--max-depth", type=int, help="deepest nesting of '{' and '('")
+    arg_parser.add_argument("--timeout", type=float, help="seconds allowed")
+    args = arg_parser.parse_args(argv)
+
+    limits = CompileLimits(args.max_bytes, args.max_tokens, args.max_depth, args.timeout)
+    try:
+        try:
+            with open(args.path, 'r', encoding='utf-8') as file_reader:
+                source_code = file_reader.read()
+        except IOError as e:
+            raise FileError(f"Cannot open file: {args.path}", 0, 0) from e
+        compile_source(source_code, limits)
+    except CompilerError as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    print("Code is syntactically correct.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
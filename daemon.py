@@ -0,0 +1,441 @@
+"""Resident compile daemon answering JSON-RPC 2.0 requests over stdin or a Unix socket."""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, IO, List, Optional, Tuple
+
+from lexer import Lexer
+from parser import Parser
+from ll1 import LL1Parser
+from semantic import SemanticAnalyzer
+from bytecode import compile_program
+from batch import describe_error
+from errors import CompilerError, FileError
+
+# JSON-RPC 2.0 error codes.
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# Latencies kept per method for the percentiles in stats().
+LATENCY_WINDOW = 10_000
+
+
+class RequestError(Exception):
+    """A request that gets a JSON-RPC error response instead of a result."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class LatencyStats:
+    """Counts and recent latencies of the requests to one method."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.count: int = 0
+        self.errors: int = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float, failed: bool) -> None:
+        self.count += 1
+        self.errors += failed
+        self.latencies.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the counts and the p50/p90/p99/max latency in milliseconds."""
+        ordered = sorted(self.latencies)
+        result: Dict[str, Any] = {"count": self.count, "errors": self.errors}
+        for name, fraction in (("p50_ms", 0.50), ("p90_ms", 0.90), ("p99_ms", 0.99)):
+            result[name] = (ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+                            if ordered else None)
+        result["max_ms"] = ordered[-1] * 1000 if ordered else None
+        return result
+
+
+class CompileDaemon:
+    """
+    Answers check, compile and stats requests, keeping results warm.
+
+    Requests run on a thread pool, so the result cache is shared without
+    copying; parsing holds the GIL, so the pool overlaps file reads and
+    socket I/O with compiles rather than running compiles in parallel.
+    Results are cached by file path, modification time and size, and by
+    the SHA-256 of the source text, in one LRU cache.
+    """
+
+    def __init__(self, workers: int = 4, cache_entries: int = 1024):
+        """
+        Create a daemon.
+
+        Args:
+            workers: Threads in the request pool
+            cache_entries: Results kept warm
+        """
+        self.workers: int = workers
+        self.cache_entries: int = cache_entries
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.started: float = time.time()
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+        self.stopped = threading.Event()
+        self._cache: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._latency: Dict[str, LatencyStats] = {}
+        self._lock = threading.Lock()
+        self.methods: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+            "check": self.check,
+            "compile": self.compile,
+            "stats": self.stats,
+            "shutdown": self.shutdown,
+        }
+
+    # Methods
+
+    def check(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Scan, parse and check a source.
+
+        Args:
+            params: "source" (the text) or "path" (a file to read), and
+                optionally "max_errors", the diagnostics to report (default 1)
+
+        Returns:
+            {"path", "status": "ok" | "error", "diagnostics": [...],
+            "cached", "seconds"}; each diagnostic is describe_error()'s
+            dict (class, message, line, column)
+        """
+        return self._cached("check", params, compile_code=False)
+
+    def compile(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Check a source and compile it to bytecode.
+
+        Takes the same params as check. A correct source's result also has
+        "functions", the bytecode instruction count of each function.
+        """
+        return self._cached("compile", params, compile_code=True)
+
+    def stats(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Return uptime, cache counters and latency percentiles per method."""
+        with self._lock:
+            requests = {method: stats.summary() for method, stats in self._latency.items()}
+            return {
+                "uptime_seconds": time.time() - self.started,
+                "workers": self.workers,
+                "cache": {"entries": len(self._cache), "hits": self.cache_hits,
+                          "misses": self.cache_misses},
+                "requests": requests,
+            }
+
+    def shutdown(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Ask the server loop to stop once this response is sent."""
+        self.stopped.set()
+        return {"stopping": True}
+
+    # Compiling
+
+    def _analyze(self, source: str, max_errors: int, compile_code: bool) -> Dict[str, Any]:
+        diagnostics: List[CompilerError] = []
+        functions = None
+        try:
+            parser = Parser(Lexer(source), recover=max_errors > 1, max_errors=max_errors)
+            try:
+                program = parser.parse()
+            except RecursionError:
+                if not parser.errors:
+                    LL1Parser(Lexer(source)).parse()
+                program = None
+            diagnostics = list(parser.errors)
+            if not diagnostics and program is not None:
+                diagnostics = SemanticAnalyzer(source, max_errors).analyze(program)
+                if not diagnostics and compile_code:
+                    functions = {name: {"instructions": len(code)}
+                                 for name, code in compile_program(program).items()}
+        except CompilerError as e:
+            diagnostics = [e]
+        result: Dict[str, Any] = {
+            "status": "error" if diagnostics else "ok",
+            "diagnostics": [describe_error(error) for error in diagnostics[:max_errors]],
+        }
+        if functions is not None:
+            result["functions"] = functions
+        return result
+
+    def _cached(self, method: str, params: Dict[str, Any], compile_code: bool) -> Dict[str, Any]:
+        started = time.perf_counter()
+        max_errors = params.get("max_errors", 1)
+        if not isinstance(max_errors, int) or max_errors < 1:
+            raise RequestError(INVALID_PARAMS, "max_errors must be a positive integer")
+        path = params.get("path")
+        source = params.get("source")
+        if (path is None) == (source is None):
+            raise RequestError(INVALID_PARAMS, "Give exactly one of 'source' and 'path'")
+
+        file_key = None
+        if path is not None:
+            if not isinstance(path, str):
+                raise RequestError(INVALID_PARAMS, "path must be a string")
+            try:
+                status = os.stat(path)
+                file_key = (method, max_errors, "path", os.path.abspath(path),
+                            status.st_mtime_ns, status.st_size)
+            except OSError:
+                file_key = None
+            result = self._lookup(file_key)
+            if result is None:
+                try:
+                    with open(path, 'r', encoding='utf-8') as file_reader:
+                        source = file_reader.read()
+                except (IOError, UnicodeDecodeError):
+                    error = FileError(f"Cannot open file: {path}", 0, 0)
+                    return {"path": path, "status": "error", "cached": False,
+                            "diagnostics": [describe_error(error)],
+                            "seconds": time.perf_counter() - started}
+        elif not isinstance(source, str):
+            raise RequestError(INVALID_PARAMS, "source must be a string")
+        else:
+            result = None
+
+        cached = result is not None
+        if result is None:
+            digest = hashlib.sha256(source.encode("utf-8", "surrogatepass")).hexdigest()
+            source_key = (method, max_errors, "source", digest)
+            result = self._lookup(source_key)
+            cached = result is not None
+            if result is None:
+                result = self._analyze(source, max_errors, compile_code)
+                self._store(source_key, result)
+            if file_key is not None:
+                self._store(file_key, result)
+        with self._lock:
+            if cached:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+        return dict(result, path=path, cached=cached,
+                    seconds=time.perf_counter() - started)
+
+    def _lookup(self, key: Optional[Tuple]) -> Optional[Dict[str, Any]]:
+        if key is None:
+            return None
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+            return result
+
+    def _store(self, key: Tuple, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    # JSON-RPC
+
+    def handle(self, request: Any) -> Optional[Dict[str, Any]]:
+        """
+        Answer one decoded JSON-RPC request.
+
+        Returns:
+            The response, or None for a notification (a request without id)
+        """
+        started = time.perf_counter()
+        request_id = request.get("id") if isinstance(request, dict) else None
+        method = None
+        try:
+            if (not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or
+                    not isinstance(request.get("method"), str)):
+                raise RequestError(INVALID_REQUEST, "Invalid Request")
+            method = request["method"]
+            handler = self.methods.get(method)
+            if handler is None:
+                raise RequestError(METHOD_NOT_FOUND, f"Method not found: {method}")
+            params = request.get("params", {})
+            if not isinstance(params, dict):
+                raise RequestError(INVALID_PARAMS, "params must be an object")
+            response = {"jsonrpc": "2.0", "id": request_id, "result": handler(params)}
+            failed = False
+        except RequestError as e:
+            response = {"jsonrpc": "2.0", "id": request_id,
+                        "error": {"code": e.code, "message": e.message}}
+            failed = True
+        except Exception as e:
+            response = {"jsonrpc": "2.0", "id": request_id,
+                        "error": {"code": INTERNAL_ERROR,
+                                  "message": f"{type(e).__name__}: {e}"}}
+            failed = True
+        if method in self.methods:
+            with self._lock:
+                stats = self._latency.get(method)
+                if stats is None:
+                    stats = self._latency[method] = LatencyStats()
+                stats.record(time.perf_counter() - started, failed)
+        if isinstance(request, dict) and "id" not in request:
+            return None
+        return response
+
+    def handle_line(self, line: str) -> Optional[str]:
+        """
+        Answer one line of JSON: a request or a batch (array) of requests.
+
+        Returns:
+            The JSON response line, or None if nothing is to be sent back
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return json.dumps({"jsonrpc": "2.0", "id": None,
+                               "error": {"code": PARSE_ERROR, "message": "Parse error"}})
+        if isinstance(request, list):
+            if not request:
+                return json.dumps(self.handle(None))
+            responses = [response for response in map(self.handle, request)
+                         if response is not None]
+            return json.dumps(responses) if responses else None
+        response = self.handle(request)
+        return None if response is None else json.dumps(response)
+
+    def submit(self, line: str, reply: Callable[[str], None]) -> Future:
+        """Answer a line on the pool and pass the response, if any, to reply."""
+        def run() -> None:
+            response = self.handle_line(line)
+            if response is not None:
+                reply(response)
+        return self.pool.submit(run)
+
+    # Transports
+
+    def serve_stdio(self, reader: IO[str] = None, writer: IO[str] = None) -> None:
+        """
+        Serve newline-delimited requests from reader until EOF or shutdown.
+
+        Responses go to writer, one per line, in the order they finish;
+        clients match them to requests by id.
+        """
+        reader = reader or sys.stdin
+        writer = writer or sys.stdout
+        write_lock = threading.Lock()
+        finished = threading.Event()
+
+        def reply(response: str) -> None:
+            with write_lock:
+                writer.write(response + "\n")
+                writer.flush()
+
+        def read() -> None:
+            for line in reader:
+                if line.strip():
+                    self.submit(line, reply)
+                if self.stopped.is_set():
+                    break
+            finished.set()
+
+        # Lines are read on a separate thread so a shutdown request stops
+        # the server without waiting for more input.
+        threading.Thread(target=read, daemon=True).start()
+        while not (finished.wait(0.1) or self.stopped.is_set()):
+            pass
+        self.pool.shutdown(wait=True)
+
+    def serve_unix(self, path: str) -> None:
+        """
+        Serve newline-delimited requests on a Unix socket until shutdown.
+
+        Each connection may send any number of requests, answered in the
+        order they finish.
+        """
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                write_lock = threading.Lock()
+                pending = []
+
+                def reply(response: str) -> None:
+                    with write_lock:
+                        try:
+                            self.wfile.write(response.encode("utf-8") + b"\n")
+                            self.wfile.flush()
+                        except OSError:
+                            pass
+
+                for raw in self.rfile:
+                    line = raw.decode("utf-8", "replace")
+                    if line.strip():
+                        pending.append(daemon.submit(line, reply))
+                # Keep the connection open until every request is answered.
+                wait(pending)
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        if os.path.exists(path):
+            os.unlink(path)
+        with Server(path, Handler) as server:
+            watcher = threading.Thread(target=lambda: (daemon.stopped.wait(),
+                                                       server.shutdown()),
+                                       daemon=True)
+            watcher.start()
+            try:
+                server.serve_forever()
+            finally:
+                os.unlink(path)
+                self.pool.shutdown(wait=True)
+
+
+def send_request(path: str, method: str, params: Dict[str, Any] = None,
+                 request_id: int = 1) -> Dict[str, Any]:
+    """
+    Send one request to a daemon listening on a Unix socket.
+
+    Returns:
+        The decoded response
+    """
+    request = {"jsonrpc": "2.0", "id": request_id, "method": method,
+               "params": params or {}}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        connection.shutdown(socket.SHUT_WR)
+        with connection.makefile("rb") as reader:
+            return json.loads(reader.readline())
+
+
+def main(argv: List[str] = None) -> int:
+    """Run the daemon on stdin/stdout or on a Unix socket."""
+    arg_parser = argparse.ArgumentParser(
+        description="Serve check/compile/stats requests as JSON-RPC 2.0, one per line.")
+    arg_parser.add_argument("--socket", metavar="PATH",
+                            help="listen on this Unix socket instead of stdin/stdout")
+    arg_parser.add_argument("--workers", type=int, default=4,
+                            help="threads answering requests")
+    arg_parser.add_argument("--cache-entries", type=int, default=1024,
+                            help="results kept warm between requests")
+    args = arg_parser.parse_args(argv)
+
+    daemon = CompileDaemon(args.workers, args.cache_entries)
+    if args.socket:
+        if not hasattr(socket, "AF_UNIX"):
+            print("Unix sockets are not available on this platform", file=sys.stderr)
+            return 1
+        daemon.serve_unix(args.socket)
+    else:
+        daemon.serve_stdio()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
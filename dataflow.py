@@ -0,0 +1,420 @@
+"""Bitset dataflow analyses over control-flow graphs, and the lint checks built on them."""
+
+import argparse
+import sys
+import heapq
+from typing import List, Optional, Tuple
+
+from lexer import Lexer
+from parser import Parser
+from positions import LineIndex
+from syntax_tree import Program
+from cfg import ControlFlowGraph, Step, build_program
+from errors import CompilerError, FileError, SemanticError
+
+
+class DataflowAnalysis:
+    """
+    A gen/kill dataflow problem over a ControlFlowGraph.
+
+    Sets are Python ints used as bitmasks, so meeting and transferring a
+    set of any size is a handful of big-integer operations. A step turns a
+    set x into gen | (x & ~kill); subclasses say what gen and kill are for
+    one step, and the solver composes them into one pair per block.
+
+    Attributes:
+        graph: The graph being analysed
+        forward: True if facts flow along edges, False if against them
+        intersect: True to meet sets by intersection, False for union
+    """
+
+    forward = True
+    intersect = False
+
+    def __init__(self, graph: ControlFlowGraph):
+        self.graph: ControlFlowGraph = graph
+
+    def step_effect(self, step: Step) -> Tuple[int, int]:
+        """Return the (gen, kill) masks of one step."""
+        raise NotImplementedError
+
+    def boundary(self) -> int:
+        """Return the set at the entry (forward) or exit (backward) block."""
+        return 0
+
+    def top(self) -> int:
+        """Return the set every other block starts from."""
+        return 0
+
+    def apply(self, value: int, step: Step) -> int:
+        """Return the set after a step, in the direction of the analysis."""
+        gen, kill = self.step_effect(step)
+        return gen | (value & ~kill)
+
+    def block_effect(self, index: int) -> Tuple[int, int]:
+        """Return the (gen, kill) masks of a whole block."""
+        steps = self.graph.blocks[index].steps
+        if not self.forward:
+            steps = reversed(steps)
+        gen = 0
+        kill = 0
+        for step in steps:
+            step_gen, step_kill = self.step_effect(step)
+            gen = step_gen | (gen & ~step_kill)
+            kill |= step_kill
+        return gen, kill
+
+
+class DataflowResult:
+    """
+    The fixed point of a DataflowAnalysis.
+
+    Attributes:
+        ins: The set on entry to each block, in program order
+        outs: The set on exit from each block, in program order
+        iterations: Number of block visits it took to converge
+    """
+
+    def __init__(self, ins: List[int], outs: List[int], iterations: int):
+        self.ins: List[int] = ins
+        self.outs: List[int] = outs
+        self.iterations: int = iterations
+
+
+def solve(analysis: DataflowAnalysis) -> DataflowResult:
+    """
+    Find the fixed point of an analysis with a worklist.
+
+    The worklist is a heap of positions in reverse postorder for a
+    forward analysis and in postorder for a backward one. It starts with
+    the entry (or exit) block alone, and a block is queued when it is
+    first reached or a set it depends on changes. The block taken next is
+    always the earliest in that order, so a loop settles before the code
+    after it is first visited, and the number of visits is about the
+    number of blocks times (loop depth + 2) rather than growing with the
+    square of the function's length.
+
+    Returns:
+        The sets on entry to and exit from every block
+    """
+    graph = analysis.graph
+    blocks = graph.blocks
+    count = len(blocks)
+    gens = [0] * count
+    keeps = [0] * count
+    for index in range(count):
+        gen, kill = analysis.block_effect(index)
+        gens[index] = gen
+        keeps[index] = ~kill
+
+    forward = analysis.forward
+    order = graph.postorder()
+    if forward:
+        order.reverse()
+        start = graph.ENTRY
+    else:
+        start = graph.EXIT
+    visited = [False] * count
+    for index in order:
+        visited[index] = True
+    order.extend(index for index in range(count) if not visited[index])
+    position = [0] * count
+    for rank, index in enumerate(order):
+        position[index] = rank
+
+    top = analysis.top()
+    boundary = analysis.boundary()
+    intersect = analysis.intersect
+    # For a backward analysis "before" a block is its exit and "after" its
+    # entry; the two lists are swapped back at the end.
+    before = [top] * count
+    after = [top] * count
+    seen = [False] * count
+    queued = [False] * count
+    worklist: List[int] = []
+    pop = heapq.heappop
+    push = heapq.heappush
+    iterations = 0
+    for first in range(count):
+        # Normally only the start seeds the worklist; blocks it never
+        # reaches, such as a loop with no way out in a backward analysis,
+        # seed it in turn once everything before them has settled.
+        if seen[order[first]]:
+            continue
+        push(worklist, first)
+        while worklist:
+            index = order[pop(worklist)]
+            queued[index] = False
+            iterations += 1
+            block = blocks[index]
+            sources = block.predecessors if forward else block.successors
+            targets = block.successors if forward else block.predecessors
+            if index == start:
+                value = boundary
+            elif not sources:
+                value = top
+            else:
+                value = after[sources[0]]
+                if intersect:
+                    for source in sources:
+                        value &= after[source]
+                else:
+                    for source in sources:
+                        value |= after[source]
+            before[index] = value
+            value = gens[index] | (value & keeps[index])
+            if value != after[index] or not seen[index]:
+                seen[index] = True
+                after[index] = value
+                for target in targets:
+                    if not queued[target]:
+                        queued[target] = True
+                        push(worklist, position[target])
+
+    if forward:
+        return DataflowResult(before, after, iterations)
+    return DataflowResult(after, before, iterations)
+
+
+class LiveVariables(DataflowAnalysis):
+    """
+    Which variables may still be read before they are next written.
+
+    Bit v stands for variable v of the graph.
+    """
+
+    forward = False
+
+    def step_effect(self, step: Step) -> Tuple[int, int]:
+        gen = 0
+        for variable, _ in step.uses:
+            gen |= 1 << variable
+        kill = 1 << step.defined if step.defined >= 0 else 0
+        return gen, kill
+
+
+class ReachingDefinitions(DataflowAnalysis):
+    """
+    Which writes to variables may not have been overwritten yet.
+
+    Every step that writes a variable is a definition, numbered in block
+    order; bit d stands for definition d.
+
+    Attributes:
+        definitions: The step of each definition
+        by_variable: For each variable, the mask of its definitions
+        undefined: The mask of the definitions made by declarations
+            without an initializer
+    """
+
+    def __init__(self, graph: ControlFlowGraph):
+        super().__init__(graph)
+        self.definitions: List[Step] = []
+        self._numbers = {}
+        lists: List[List[int]] = [[] for _ in graph.variables]
+        undefined = []
+        for block in graph.blocks:
+            for step in block.steps:
+                if step.defined >= 0:
+                    number = len(self.definitions)
+                    self._numbers[id(step)] = number
+                    self.definitions.append(step)
+                    lists[step.defined].append(number)
+                    if step.undefines:
+                        undefined.append(number)
+        self.by_variable: List[int] = [_mask(numbers) for numbers in lists]
+        self.undefined: int = _mask(undefined)
+
+    def step_effect(self, step: Step) -> Tuple[int, int]:
+        if step.defined < 0:
+            return 0, 0
+        return 1 << self._numbers[id(step)], self.by_variable[step.defined]
+
+
+def _mask(bits: List[int]) -> int:
+    """Return the int with the given bits set."""
+    # Setting bits one at a time would copy the growing mask each time.
+    if not bits:
+        return 0
+    flags = bytearray(max(bits) // 8 + 1)
+    for bit in bits:
+        flags[bit >> 3] |= 1 << (bit & 7)
+    return int.from_bytes(flags, "little")
+
+
+def _unreachable(graph: ControlFlowGraph, reachable: List[bool]) -> List[Step]:
+    """
+    Return the first step of each unreachable region of a graph.
+
+    Unreachable blocks joined by an edge form one region, so a dead branch
+    or the code after a return is reported once.
+    """
+    parents = list(range(len(graph.blocks)))
+
+    def root(index: int) -> int:
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for block in graph.blocks:
+        if reachable[block.index]:
+            continue
+        for successor in block.successors:
+            parents[root(successor)] = root(block.index)
+
+    first = {}
+    for block in graph.blocks:
+        if reachable[block.index] or not block.steps:
+            continue
+        region = root(block.index)
+        step = block.steps[0]
+        if region not in first or step.node.start < first[region].node.start:
+            first[region] = step
+    return list(first.values())
+
+
+def check_function(graph: ControlFlowGraph,
+                   lines: Optional[LineIndex] = None) -> List[SemanticError]:
+    """
+    Lint one function.
+
+    Reports reads of a variable that a declaration without an initializer
+    may have left unset, declared variables that are never read, values
+    written to a variable that are never read, and unreachable code.
+    Names used without a declaration are left to SemanticAnalyzer.
+
+    Args:
+        graph: The function's graph
+        lines: Line index of the source, to give warnings a position
+
+    Returns:
+        The warnings, in source order
+    """
+    found: List[Tuple[int, str]] = []
+    declared = [number not in graph.implicit for number in range(len(graph.variables))]
+    read = [False] * len(graph.variables)
+    for block in graph.blocks:
+        for step in block.steps:
+            for variable, _ in step.uses:
+                read[variable] = True
+    for number, symbol in enumerate(graph.variables):
+        if declared[number] and not read[number]:
+            found.append((symbol.start, f"Unused variable '{symbol.name}'"))
+
+    reachable = graph.reachable()
+    reaching = ReachingDefinitions(graph)
+    reaching_result = solve(reaching)
+    liveness = LiveVariables(graph)
+    live_result = solve(liveness)
+    for block in graph.blocks:
+        if not reachable[block.index]:
+            continue
+        value = reaching_result.ins[block.index]
+        for step in block.steps:
+            unset = value & reaching.undefined
+            if unset:
+                for variable, offset in step.uses:
+                    if unset & reaching.by_variable[variable]:
+                        name = graph.variables[variable].name
+                        found.append((offset, f"Variable '{name}' may be used "
+                                              f"before it is assigned"))
+            value = reaching.apply(value, step)
+
+        live = live_result.outs[block.index]
+        for step in reversed(block.steps):
+            variable = step.defined
+            if (variable >= 0 and not step.undefines and declared[variable]
+                    and read[variable] and not live >> variable & 1):
+                name = graph.variables[variable].name
+                found.append((step.node.start, f"Value assigned to '{name}' is never used"))
+            live = liveness.apply(live, step)
+
+    for step in _unreachable(graph, reachable):
+        found.append((step.node.start, "Unreachable code"))
+
+    found.sort(key=lambda item: item[0])
+    return [SemanticError(message, offset=offset, lines=lines) for offset, message in found]
+
+
+def check_program(program: Program, source: Optional[str] = None) -> List[SemanticError]:
+    """
+    Lint every function of a program.
+
+    Args:
+        program: The syntax tree
+        source: The source it was parsed from, to give warnings a position
+
+    Returns:
+        The warnings, function by function
+    """
+    lines = LineIndex(source) if source is not None else None
+    warnings: List[SemanticError] = []
+    for graph in build_program(program):
+        warnings.extend(check_function(graph, lines))
+    return warnings
+
+
+def visit_bound(graph: ControlFlowGraph) -> int:
+    """Return the block visits solve() is expected to stay within on a graph."""
+    return len(graph.blocks) * (graph.loop_depth + 2)
+
+
+def solver_stats(program: Program) -> List[str]:
+    """
+    Solve both analyses for every function and compare the work with visit_bound().
+
+    Returns:
+        One line per function and analysis; a line ends with "OVER BOUND"
+        if the solver needed more visits than visit_bound() allows
+    """
+    lines = []
+    for graph in build_program(program):
+        bound = visit_bound(graph)
+        for analysis in (ReachingDefinitions(graph), LiveVariables(graph)):
+            visits = solve(analysis).iterations
+            line = (f"{graph.name}: {type(analysis).__name__} {visits} visits, "
+                    f"{len(graph.blocks)} blocks, loop depth {graph.loop_depth}, "
+                    f"bound {bound}")
+            lines.append(line + (" OVER BOUND" if visits > bound else ""))
+    return lines
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Lint a source file and print its warnings.
+
+    Returns:
+        0 if there are no warnings, 1 otherwise; with --stats, 1 if the
+        solver went over its visit bound
+    """
+    arg_parser = argparse.ArgumentParser(
+        description="Find unset, unused and unreachable code with dataflow analysis.")
+    arg_parser.add_argument("path", nargs="?", default="input.txt")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="report solver visits against blocks x (loop depth + 2)")
+    args = arg_parser.parse_args(argv)
+
+    try:
+        try:
+            with open(args.path, 'r', encoding='utf-8') as file_reader:
+                source_code = file_reader.read()
+        except IOError as e:
+            raise FileError(f"Cannot open file: {args.path}", 0, 0) from e
+        program = Parser(Lexer(source_code)).parse()
+    except CompilerError as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    if args.stats:
+        lines = solver_stats(program)
+        for line in lines:
+            print(line)
+        return 1 if any(line.endswith("OVER BOUND") for line in lines) else 0
+    warnings = check_program(program, source_code)
+    for warning in warnings:
+        print(f"Warning: {warning}")
+    return 1 if warnings else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,54 @@
 """Custom exception classes for the compiler."""
 
+from typing import Optional
+
+from positions import LineIndex
+
 
 class CompilerError(Exception):
-    """Base exception for all compiler errors."""
+    """
+    Base exception for all compiler errors.
+
+    A position is given either as a line and column or as a source offset
+    together with the LineIndex of that source. An offset is only turned
+    into a line and column when the error is formatted or one of them is
+    read, so raising an error costs nothing for positions nobody sees.
+    """
     
-    def __init__(self, message: str, line: int = None, column: int = None):
+    def __init__(self, message: str, line: int = None, column: int = None,
+                 offset: int = None, lines: LineIndex = None):
         self.message = message
-        self.line = line
-        self.column = column
-        super().__init__(self._format_message())
+        self.offset = offset
+        self._line = line
+        self._column = column
+        self._lines = lines
+        super().__init__(message)
+
+    @property
+    def line(self) -> Optional[int]:
+        """Line number, starting at 1, or None if unknown."""
+        self._resolve()
+        return self._line
+
+    @property
+    def column(self) -> Optional[int]:
+        """Column number, starting at 1, or None if unknown."""
+        self._resolve()
+        return self._column
+
+    def _resolve(self) -> None:
+        """Turn the offset into a line and column, once."""
+        if self._lines is not None:
+            if self.offset is not None and self.offset >= 0:
+                self._line, self._column = self._lines.position(self.offset)
+            self._lines = None
+
+    def __str__(self) -> str:
+        return self._format_message()
+
+    def __reduce__(self):
+        # Resolved first, so a pickled error does not carry its source.
+        return (type(self), (self.message, self.line, self.column, self.offset))
     
     def _format_message(self) -> str:
         if self.line is not None and self.column is not None:
@@ -28,7 +68,34 @@ class SyntaxError(CompilerError):
     pass
 
 
+class SemanticError(CompilerError):
+    """Raised when a program parses but misuses a name."""
+    pass
+
+
 class FileError(CompilerError):
     """Raised when there's an error reading or opening a file."""
     pass
 
+
+class ExecutionError(CompilerError):
+    """Raised when a compiled program fails while it runs."""
+    pass
+
+
+class LimitExceededError(CompilerError):
+    """
+    Raised when a compile goes over one of its limits or is cancelled.
+
+    Attributes:
+        limit: "bytes", "tokens", "depth", "time" or "cancelled"
+    """
+
+    def __init__(self, message: str, line: int = None, column: int = None,
+                 offset: int = None, lines: LineIndex = None, limit: str = None):
+        super().__init__(message, line, column, offset, lines)
+        self.limit = limit
+
+    def __reduce__(self):
+        return (type(self), (self.message, self.line, self.column, self.offset,
+                             None, self.limit))
@@ -0,0 +1,229 @@
+"""Incremental re-scanning and re-parsing of edited sources."""
+
+from array import array
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+
+from lexer import Lexer
+from parser import Parser
+from syntax_tree import Function, Program
+from token_stream import TokenStream, TokenSuffix, offset_typecode
+from errors import CompilerError, LexicalError
+
+
+class IncrementalResult:
+    """
+    The outcome of scanning and parsing one version of a source file.
+
+    Functions are kept with the token index range each one was parsed
+    from, which is what lets the next edit reuse them.
+    """
+
+    def __init__(self, source: str, tokens: Optional[TokenStream],
+                 functions: List[Function], spans: List[Tuple[int, int]],
+                 error: Optional[CompilerError]):
+        """
+        Initialize a result.
+
+        Args:
+            source: The source code this result describes
+            tokens: Its tokens, or None if scanning failed
+            functions: Successfully parsed functions, in source order
+            spans: (first, last + 1) token indices of each function
+            error: The lexical or syntax error that stopped the compile
+        """
+        self.source: str = source
+        self.tokens: Optional[TokenStream] = tokens
+        self.functions: List[Function] = functions
+        self.spans: List[Tuple[int, int]] = spans
+        self.error: Optional[CompilerError] = error
+        # Work done to produce this result, for callers that track reuse.
+        self.relexed_tokens: int = 0
+        self.reparsed_functions: int = 0
+
+    @property
+    def tree(self) -> Optional[Program]:
+        """The syntax tree Parser.parse() returns, or None after an error."""
+        if self.error is not None:
+            return None
+        if not self.functions:
+            return Program([], -1, -1)
+        return Program(self.functions, self.functions[0].start,
+                       self.functions[-1].end)
+
+
+class IncrementalParser:
+    """
+    Rebuilds scan and parse results after a text edit, redoing only the
+    part of the work the edit can affect.
+
+    Scanning restarts at the end of the last token that ends before the
+    edit, which is always outside any comment, and stops as soon as a new
+    token starts where an old token started past the edit. From there on
+    the old tokens are reused. Top-level functions whose tokens are all
+    unchanged are reused as well; only the functions the edit touches are
+    parsed again. The result always equals a full rebuild.
+    """
+
+    def build(self, source: str) -> IncrementalResult:
+        """
+        Scan and parse a whole source from scratch.
+
+        Args:
+            source: The source code
+
+        Returns:
+            The result, holding an error instead of raising one
+        """
+        try:
+            tokens = Lexer(source).scan_stream()
+        except LexicalError as e:
+            return IncrementalResult(source, None, [], [], e)
+
+        result = IncrementalResult(source, tokens, [], [], None)
+        result.relexed_tokens = len(tokens)
+        self._parse_from(result, 0, None)
+        return result
+
+    def update(self, previous: IncrementalResult, offset: int,
+               removed: int, inserted: str) -> IncrementalResult:
+        """
+        Apply a text edit and return the new result.
+
+        The syntax tree nodes of previous are reused and, where the edit
+        shifted them, moved in place, so previous must not be used again.
+
+        Args:
+            previous: Result for the source before the edit
+            offset: Where the edit starts in the old source
+            removed: Number of characters removed at offset
+            inserted: Text inserted at offset
+
+        Returns:
+            The result for the edited source
+        """
+        old_source = previous.source
+        if offset < 0 or removed < 0 or offset + removed > len(old_source):
+            raise ValueError("Edit lies outside the source")
+        source = old_source[:offset] + inserted + old_source[offset + removed:]
+        old = previous.tokens
+        if old is None:
+            return self.build(source)
+
+        delta = len(inserted) - removed
+        edit_end = offset + len(inserted)
+
+        # Tokens ending before the edit cannot change: the character right
+        # after each of them is still the same.
+        keep = bisect_left(old.ends, offset)
+        resume = old.ends[keep - 1] if keep else 0
+
+        # The edit may take the source past 4 GiB, and its offsets to 'Q'.
+        typecode = offset_typecode(len(source))
+        codes = array('B')
+        starts = array(typecode)
+        ends = array(typecode)
+        resync = len(old)
+        try:
+            for code, _, start, end in Lexer(source).iter_coded(resume):
+                if start >= edit_end:
+                    old_index = bisect_left(old.starts, start - delta, keep)
+                    if old_index < len(old) and old.starts[old_index] == start - delta:
+                        resync = old_index
+                        break
+                codes.append(code)
+                starts.append(start)
+                ends.append(end)
+        except LexicalError:
+            # Error positions depend on everything before them on the line;
+            # a full scan reports them exactly as a fresh compile would.
+            return self.build(source)
+
+        tokens = TokenStream(source)
+        tokens.codes = old.codes[:keep] + codes + old.codes[resync:]
+        tokens.starts = (_shifted(old.starts[:keep], 0, typecode) + starts
+                         + _shifted(old.starts[resync:], delta, typecode))
+        tokens.ends = (_shifted(old.ends[:keep], 0, typecode) + ends
+                       + _shifted(old.ends[resync:], delta, typecode))
+
+        result = IncrementalResult(source, tokens, [], [], None)
+        result.relexed_tokens = len(codes)
+
+        # Functions made only of tokens before the edit stay as they are.
+        reused = 0
+        while reused < len(previous.spans) and previous.spans[reused][1] <= keep:
+            reused += 1
+        result.functions = previous.functions[:reused]
+        result.spans = previous.spans[:reused]
+        first = result.spans[-1][1] if reused else 0
+
+        # Old functions starting at or after the resync point can be reused
+        # once the new parse reaches their start.
+        index_shift = len(codes) - (resync - keep)
+        tail = {}
+        for position in range(reused, len(previous.spans)):
+            start, end = previous.spans[position]
+            if start >= resync:
+                tail[start + index_shift] = position
+
+        self._parse_from(result, first, (previous, tail, index_shift, delta))
+        return result
+
+    def _parse_from(self, result: IncrementalResult, index: int, reuse) -> None:
+        """
+        Parse functions from token index on, appending them to result.
+
+        Args:
+            result: Result to complete; its error is set on failure
+            index: Token index where the next function starts
+            reuse: None, or (previous, tail, index_shift, delta) describing
+                old functions that can be taken over once parsing reaches
+                one of the token indices in tail
+        """
+        tokens = result.tokens
+        parser = None
+        base = 0
+        while index < len(tokens):
+            if reuse is not None and index in reuse[1]:
+                previous, tail, index_shift, delta = reuse
+                position = tail[index]
+                for start, end in previous.spans[position:]:
+                    result.spans.append((start + index_shift, end + index_shift))
+                for function in previous.functions[position:]:
+                    if delta:
+                        _shift_offsets(function, delta)
+                    result.functions.append(function)
+                reuse = None
+                index = result.spans[-1][1]
+                parser = None
+                continue
+
+            if parser is None:
+                parser = Parser(TokenSuffix(tokens, index))
+                base = index
+            try:
+                function = parser.parse_function()
+            except CompilerError as e:
+                result.error = e
+                return
+            result.functions.append(function)
+            result.spans.append((index, base + parser.current_index))
+            result.reparsed_functions += 1
+            index = base + parser.current_index
+
+
+def _shifted(offsets: array, delta: int, typecode: str) -> array:
+    """Return an offset array with delta added to every entry, as typecode."""
+    if not delta and offsets.typecode == typecode:
+        return offsets
+    return array(typecode, [offset + delta for offset in offsets])
+
+
+def _shift_offsets(node, delta: int) -> None:
+    """Move every node of a subtree by delta characters, in place."""
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        node.start += delta
+        node.end += delta
+        pending.extend(node.children())
@@ -0,0 +1,757 @@
+"""Three-address intermediate representation, lowering and optimisation passes."""
+
+import argparse
+import sys
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+import arith
+from lexer import Lexer
+from parser import Parser
+from syntax_tree import (Program, Function, Block, If, For, Declaration,
+                         Assignment, UnaryOp, Identifier, Number)
+from errors import CompilerError, FileError, LexicalError
+
+
+class Opcode:
+    """
+    Instruction opcodes.
+
+    Operands are slots (>= 0: variables and temporaries) or constants
+    (~index into the function's constant pool, so always negative).
+    """
+    NOP = 0
+    MOVE = 1             # dst = a
+    NEG = 2              # dst = -a
+    NOT = 3              # dst = !a
+    ADD = 4              # dst = a + b
+    SUB = 5
+    MUL = 6
+    DIV = 7
+    MOD = 8
+    LT = 9
+    LE = 10
+    GT = 11
+    GE = 12
+    EQ = 13
+    NE = 14
+    LABEL = 15           # label a
+    JUMP = 16            # goto label a
+    JUMP_IF_ZERO = 17    # if a == 0 goto label b
+    JUMP_IF_NONZERO = 18  # if a != 0 goto label b
+    RETURN = 19          # return a
+
+
+OPCODE_NAMES: List[str] = [name for name, _ in sorted(
+    ((name, code) for name, code in vars(Opcode).items() if not name.startswith("_")),
+    key=lambda item: item[1])]
+
+BINARY_OPCODES: Dict[str, int] = {
+    "+": Opcode.ADD, "-": Opcode.SUB, "*": Opcode.MUL, "/": Opcode.DIV,
+    "%": Opcode.MOD, "<": Opcode.LT, "<=": Opcode.LE, ">": Opcode.GT,
+    ">=": Opcode.GE, "==": Opcode.EQ, "!=": Opcode.NE,
+}
+UNARY_OPCODES: Dict[str, int] = {"-": Opcode.NEG, "!": Opcode.NOT}
+OPCODE_OPERATORS: Dict[int, str] = {code: operator for operator, code
+                                    in list(BINARY_OPCODES.items()) + list(UNARY_OPCODES.items())}
+COMPOUND_ASSIGN: Dict[str, int] = {
+    "+=": Opcode.ADD, "-=": Opcode.SUB, "*=": Opcode.MUL, "/=": Opcode.DIV,
+}
+
+BINARY = frozenset(BINARY_OPCODES.values())
+UNARY = frozenset(UNARY_OPCODES.values())
+# Which fields each opcode reads and writes.
+WRITES_DST = BINARY | UNARY | {Opcode.MOVE}
+READS_A = WRITES_DST | {Opcode.JUMP_IF_ZERO, Opcode.JUMP_IF_NONZERO, Opcode.RETURN}
+READS_B = BINARY
+BRANCHES = frozenset((Opcode.JUMP_IF_ZERO, Opcode.JUMP_IF_NONZERO))
+BLOCK_ENDS = BRANCHES | {Opcode.JUMP, Opcode.RETURN}
+
+
+class IRFunction:
+    """
+    One function as a linear list of three-address instructions.
+
+    Instructions are stored column-wise in four parallel arrays (opcode,
+    dst, a, b) rather than as one object each, so a function of n
+    instructions costs about 13n bytes. Jumps name labels, not positions,
+    so passes can delete instructions by turning them into NOPs and then
+    compacting the arrays.
+    """
+
+    def __init__(self, name: str):
+        """
+        Create an empty function.
+
+        Args:
+            name: Function name
+        """
+        self.name: str = name
+        self.ops = array('B')
+        self.dst = array('i')
+        self.a = array('i')
+        self.b = array('i')
+        self.slot_names: List[str] = []
+        self.constants: List[int] = []
+        self._constant_index: Dict[int, int] = {}
+        self.label_count: int = 0
+        self._temp_count: int = 0
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def emit(self, op: int, dst: int = 0, a: int = 0, b: int = 0) -> None:
+        """Append an instruction."""
+        self.ops.append(op)
+        self.dst.append(dst)
+        self.a.append(a)
+        self.b.append(b)
+
+    def constant(self, value: int) -> int:
+        """Return the operand for a constant, adding it to the pool if new."""
+        index = self._constant_index.get(value)
+        if index is None:
+            index = self._constant_index[value] = len(self.constants)
+            self.constants.append(value)
+        return ~index
+
+    def value(self, operand: int) -> Optional[int]:
+        """Return the value of a constant operand, or None for a slot."""
+        return self.constants[~operand] if operand < 0 else None
+
+    def new_slot(self, name: str) -> int:
+        """Allocate a slot for a variable."""
+        self.slot_names.append(name)
+        return len(self.slot_names) - 1
+
+    def new_temp(self) -> int:
+        """Allocate a slot for an intermediate result."""
+        self._temp_count += 1
+        return self.new_slot(f"t{self._temp_count - 1}")
+
+    def new_label(self) -> int:
+        """Allocate a label number."""
+        self.label_count += 1
+        return self.label_count - 1
+
+    def can_fail(self, index: int) -> bool:
+        """Whether the instruction at index may divide by zero."""
+        return (self.ops[index] in (Opcode.DIV, Opcode.MOD) and
+                self.value(self.b[index]) in (None, 0))
+
+    def compact(self) -> int:
+        """
+        Drop NOP instructions.
+
+        Returns:
+            Number of instructions removed
+        """
+        ops = self.ops
+        keep = [index for index in range(len(ops)) if ops[index] != Opcode.NOP]
+        removed = len(ops) - len(keep)
+        if removed:
+            self.ops = array('B', [ops[index] for index in keep])
+            self.dst = array('i', [self.dst[index] for index in keep])
+            self.a = array('i', [self.a[index] for index in keep])
+            self.b = array('i', [self.b[index] for index in keep])
+        return removed
+
+    def operand_text(self, operand: int) -> str:
+        """Return how an operand is written in dumps."""
+        if operand < 0:
+            return str(self.constants[~operand])
+        return self.slot_names[operand]
+
+    def instruction_text(self, index: int) -> str:
+        """Return one instruction in dump format."""
+        op = self.ops[index]
+        dst = self.slot_names[self.dst[index]] if op in WRITES_DST else ""
+        a = self.operand_text(self.a[index]) if op in READS_A else ""
+        if op == Opcode.MOVE:
+            return f"    {dst} = {a}"
+        if op in UNARY:
+            return f"    {dst} = {OPCODE_OPERATORS[op]}{a}"
+        if op in BINARY:
+            return f"    {dst} = {a} {OPCODE_OPERATORS[op]} {self.operand_text(self.b[index])}"
+        if op == Opcode.LABEL:
+            return f"L{self.a[index]}:"
+        if op == Opcode.JUMP:
+            return f"    goto L{self.a[index]}"
+        if op == Opcode.JUMP_IF_ZERO:
+            return f"    ifz {a} goto L{self.b[index]}"
+        if op == Opcode.JUMP_IF_NONZERO:
+            return f"    ifnz {a} goto L{self.b[index]}"
+        if op == Opcode.RETURN:
+            return f"    return {a}"
+        return f"    {OPCODE_NAMES[op].lower()}"
+
+    def dump(self) -> str:
+        """Return the function as text, one instruction per line."""
+        lines = [f"function {self.name}:"]
+        lines.extend(self.instruction_text(index) for index in range(len(self.ops)))
+        return "\n".join(lines)
+
+
+class _Lowering:
+    """Translates one syntax tree function into an IRFunction."""
+
+    def __init__(self, node: Function):
+        self.function = IRFunction(node.name)
+        self.node = node
+        self.scopes: List[Dict[str, int]] = [{}]
+        self._shadow_counts: Dict[str, int] = {}
+
+    def run(self) -> IRFunction:
+        self.block(self.node.body)
+        # Falling off the end returns 0.
+        self.function.emit(Opcode.RETURN, a=self.function.constant(0))
+        return self.function
+
+    def declare(self, name: str) -> int:
+        """Allocate a slot for a new variable; shadowing ones get a suffix."""
+        count = self._shadow_counts.get(name, 0)
+        self._shadow_counts[name] = count + 1
+        return self.function.new_slot(name if count == 0 else f"{name}.{count}")
+
+    def lookup(self, name: str) -> int:
+        """Return the slot of a variable; undeclared names live at function level."""
+        for scope in reversed(self.scopes):
+            slot = scope.get(name)
+            if slot is not None:
+                return slot
+        slot = self.scopes[0][name] = self.declare(name)
+        return slot
+
+    def block(self, block: Block) -> None:
+        self.scopes.append({})
+        for statement in block.statements:
+            self.statement(statement)
+        if block.ret is not None:
+            self.function.emit(Opcode.RETURN, a=self.number(block.ret.value))
+        self.scopes.pop()
+
+    def statement(self, node) -> None:
+        function = self.function
+        if isinstance(node, Declaration):
+            # The initializer is evaluated before the new name is in scope.
+            slot = self.declare(node.name)
+            self.store(slot, node.operator, node.value, declared=True)
+            self.scopes[-1][node.name] = slot
+        elif isinstance(node, Assignment):
+            if node.operator is None:
+                return
+            slot = self.lookup(node.name)
+            if node.operator in ("++", "--"):
+                opcode = Opcode.ADD if node.operator == "++" else Opcode.SUB
+                function.emit(opcode, slot, slot, function.constant(1))
+            else:
+                self.store(slot, node.operator, node.value, declared=False)
+        elif isinstance(node, If):
+            else_label = function.new_label()
+            condition = self.expression(node.condition)
+            function.emit(Opcode.JUMP_IF_ZERO, a=condition, b=else_label)
+            self.block(node.then_block)
+            if node.else_block is None:
+                function.emit(Opcode.LABEL, a=else_label)
+            else:
+                end_label = function.new_label()
+                function.emit(Opcode.JUMP, a=end_label)
+                function.emit(Opcode.LABEL, a=else_label)
+                self.block(node.else_block)
+                function.emit(Opcode.LABEL, a=end_label)
+        elif isinstance(node, For):
+            self.scopes.append({})
+            self.statement(node.init)
+            top = function.new_label()
+            end = function.new_label()
+            function.emit(Opcode.LABEL, a=top)
+            condition = self.expression(node.condition)
+            function.emit(Opcode.JUMP_IF_ZERO, a=condition, b=end)
+            self.block(node.body)
+            self.statement(node.update)
+            function.emit(Opcode.JUMP, a=top)
+            function.emit(Opcode.LABEL, a=end)
+            self.scopes.pop()
+        else:
+            raise TypeError(f"Cannot lower {type(node).__name__}")
+
+    def store(self, slot: int, operator: Optional[str], value, declared: bool) -> None:
+        """Lower '= value', a compound assignment, or a bare declaration."""
+        function = self.function
+        if operator is None:
+            # Declared without a value: variables start at 0.
+            function.emit(Opcode.MOVE, slot, function.constant(0))
+        elif operator == "=":
+            result = self.expression(value, slot)
+            if result != slot:
+                function.emit(Opcode.MOVE, slot, result)
+        else:
+            if declared:
+                function.emit(Opcode.MOVE, slot, function.constant(0))
+            operand = self.expression(value)
+            function.emit(COMPOUND_ASSIGN[operator], slot, slot, operand)
+
+    def number(self, node: Number) -> int:
+        try:
+            return self.function.constant(arith.number_value(node.value))
+        except ValueError:
+            raise LexicalError(f"Invalid number '{node.value}'") from None
+
+    def expression(self, node, target: Optional[int] = None) -> int:
+        """
+        Lower an expression and return the operand holding its value.
+
+        The walk uses an explicit stack, so expressions of any depth lower
+        without recursion. The outermost arithmetic operation writes
+        straight into target when one is given.
+
+        Args:
+            node: Expression node
+            target: Preferred destination slot
+        """
+        function = self.function
+        results: List[int] = []
+        # (stage, node, target or temporary, label)
+        pending: List[Tuple[str, object, Optional[int], int]] = [("eval", node, target, 0)]
+        while pending:
+            stage, node, slot, label = pending.pop()
+            if stage == "eval":
+                if isinstance(node, Number):
+                    results.append(self.number(node))
+                elif isinstance(node, Identifier):
+                    results.append(self.lookup(node.name))
+                elif isinstance(node, UnaryOp):
+                    pending.append(("unary", node, slot, 0))
+                    pending.append(("eval", node.operand, None, 0))
+                elif node.operator in ("&&", "||"):
+                    # Short-circuit: the right side only runs when needed.
+                    pending.append(("logical", node, function.new_temp(),
+                                    function.new_label()))
+                    pending.append(("eval", node.left, None, 0))
+                else:
+                    pending.append(("binary", node, slot, 0))
+                    pending.append(("eval", node.right, None, 0))
+                    pending.append(("eval", node.left, None, 0))
+            elif stage == "unary":
+                operand = results.pop()
+                dst = function.new_temp() if slot is None else slot
+                function.emit(UNARY_OPCODES[node.operator], dst, operand)
+                results.append(dst)
+            elif stage == "binary":
+                right = results.pop()
+                left = results.pop()
+                dst = function.new_temp() if slot is None else slot
+                function.emit(BINARY_OPCODES[node.operator], dst, left, right)
+                results.append(dst)
+            elif stage == "logical":
+                left = results.pop()
+                is_and = node.operator == "&&"
+                function.emit(Opcode.MOVE, slot, function.constant(0 if is_and else 1))
+                function.emit(Opcode.JUMP_IF_ZERO if is_and else Opcode.JUMP_IF_NONZERO,
+                              a=left, b=label)
+                pending.append(("logical_end", node, slot, label))
+                pending.append(("eval", node.right, None, 0))
+            else:
+                right = results.pop()
+                function.emit(Opcode.NE, slot, right, function.constant(0))
+                function.emit(Opcode.LABEL, a=label)
+                results.append(slot)
+        return results[0]
+
+
+def lower_function(node: Function) -> IRFunction:
+    """
+    Lower a parsed function.
+
+    Variables start at 0, so a declaration without a value stores 0 and
+    'int x += 1;' yields 1. A name used without a declaration is treated
+    as a variable of the whole function.
+
+    Raises:
+        LexicalError: For a numeric literal that is not made of digits
+    """
+    return _Lowering(node).run()
+
+
+def lower_program(program: Program) -> List[IRFunction]:
+    """Lower every function of a program."""
+    return [lower_function(function) for function in program.functions]
+
+
+def _fold(function: IRFunction, index: int) -> bool:
+    """Turn the instruction at index into a MOVE of its result, if it is constant."""
+    op = function.ops[index]
+    value = function.value
+    if op in BINARY:
+        left = value(function.a[index])
+        right = value(function.b[index])
+        if left is None or right is None:
+            return False
+        if right == 0 and op in (Opcode.DIV, Opcode.MOD):
+            return False
+        result = arith.BINARY[OPCODE_OPERATORS[op]](left, right)
+    elif op in UNARY:
+        operand = value(function.a[index])
+        if operand is None:
+            return False
+        result = arith.UNARY[OPCODE_OPERATORS[op]](operand)
+    else:
+        return False
+    function.ops[index] = Opcode.MOVE
+    function.a[index] = function.constant(result)
+    function.b[index] = 0
+    return True
+
+
+def fold_constants(function: IRFunction) -> int:
+    """
+    Replace operations on constants by their result, e.g. 3 == 3 by 1.
+
+    Division and remainder by zero are left alone so they still fail when
+    the program runs.
+
+    Returns:
+        Number of instructions rewritten
+    """
+    return sum(_fold(function, index) for index in range(len(function.ops)))
+
+
+def propagate_constants(function: IRFunction) -> int:
+    """
+    Replace reads of slots known to hold a constant by the constant.
+
+    Knowledge flows forward through straight-line code and is dropped at
+    every label, where other paths may join. An instruction whose operands
+    all become constant is folded on the spot, so a chain such as
+    t0 = 1 + 1; t1 = t0 + 1; ... collapses in one sweep.
+
+    Returns:
+        Number of operands replaced
+    """
+    ops, dst, a, b = function.ops, function.dst, function.a, function.b
+    known: Dict[int, int] = {}
+    changes = 0
+    for index in range(len(ops)):
+        op = ops[index]
+        if op == Opcode.LABEL:
+            known.clear()
+            continue
+        replaced = False
+        if op in READS_A and a[index] in known:
+            a[index] = known[a[index]]
+            replaced = True
+            changes += 1
+        if op in READS_B and b[index] in known:
+            b[index] = known[b[index]]
+            replaced = True
+            changes += 1
+        if replaced and _fold(function, index):
+            op = Opcode.MOVE
+        if op in WRITES_DST:
+            if op == Opcode.MOVE and a[index] < 0:
+                known[dst[index]] = a[index]
+            else:
+                known.pop(dst[index], None)
+    return changes
+
+
+def remove_dead_branches(function: IRFunction) -> int:
+    """
+    Resolve branches on constants and delete code no path reaches.
+
+    This is what removes the else block of if (3 == 3) once folding has
+    turned the condition into a constant. Jumps to the next instruction
+    and labels nothing jumps to are removed as well.
+
+    Returns:
+        Number of instructions changed or removed
+    """
+    ops, a, b = function.ops, function.a, function.b
+    changes = 0
+    for index in range(len(ops)):
+        op = ops[index]
+        if op in BRANCHES:
+            condition = function.value(a[index])
+            if condition is None:
+                continue
+            if (condition == 0) == (op == Opcode.JUMP_IF_ZERO):
+                ops[index] = Opcode.JUMP
+                a[index] = b[index]
+                b[index] = 0
+            else:
+                ops[index] = Opcode.NOP
+            changes += 1
+
+    count = len(ops)
+    position = {a[index]: index for index in range(count) if ops[index] == Opcode.LABEL}
+    reachable = bytearray(count)
+    work = [0] if count else []
+    while work:
+        index = work.pop()
+        while index < count and not reachable[index]:
+            reachable[index] = 1
+            op = ops[index]
+            if op == Opcode.JUMP:
+                work.append(position[a[index]])
+                break
+            if op == Opcode.RETURN:
+                break
+            if op in BRANCHES:
+                work.append(position[b[index]])
+            index += 1
+    for index in range(count):
+        if not reachable[index] and ops[index] != Opcode.NOP:
+            ops[index] = Opcode.NOP
+            changes += 1
+
+    # A jump or branch to a label that follows it directly does nothing.
+    for index in range(count):
+        op = ops[index]
+        if op != Opcode.JUMP and op not in BRANCHES:
+            continue
+        target = a[index] if op == Opcode.JUMP else b[index]
+        following = index + 1
+        while following < count and ops[following] in (Opcode.NOP, Opcode.LABEL):
+            if ops[following] == Opcode.LABEL and a[following] == target:
+                ops[index] = Opcode.NOP
+                changes += 1
+                break
+            following += 1
+
+    targets = {a[index] for index in range(count) if ops[index] == Opcode.JUMP}
+    targets.update(b[index] for index in range(count) if ops[index] in BRANCHES)
+    for index in range(count):
+        if ops[index] == Opcode.LABEL and a[index] not in targets:
+            ops[index] = Opcode.NOP
+            changes += 1
+    return changes
+
+
+def simplify_algebra(function: IRFunction) -> int:
+    """
+    Apply identities such as x + 0 = x, x * 1 = x, x * 0 = 0 and x - x = 0.
+
+    None of them changes whether the instruction can fail: x / 1 is the
+    only division rewritten.
+
+    Returns:
+        Number of instructions rewritten or removed
+    """
+    ops, dst, a, b = function.ops, function.dst, function.a, function.b
+    value = function.value
+    zero = one = None
+    changes = 0
+    for index in range(len(ops)):
+        op = ops[index]
+        if op == Opcode.MOVE:
+            if a[index] == dst[index]:
+                ops[index] = Opcode.NOP
+                changes += 1
+            continue
+        if op not in BINARY:
+            continue
+        left, right = a[index], b[index]
+        left_value, right_value = value(left), value(right)
+        same = left == right and left >= 0
+        result = None
+        if op == Opcode.ADD:
+            if left_value == 0:
+                result = right
+            elif right_value == 0:
+                result = left
+        elif op == Opcode.SUB:
+            if right_value == 0:
+                result = left
+            elif same:
+                result = "0"
+        elif op == Opcode.MUL:
+            if left_value == 1:
+                result = right
+            elif right_value == 1:
+                result = left
+            elif left_value == 0 or right_value == 0:
+                result = "0"
+        elif op == Opcode.DIV:
+            if right_value == 1:
+                result = left
+        elif op == Opcode.MOD:
+            if right_value in (1, -1):
+                result = "0"
+        elif same:
+            result = "1" if op in (Opcode.EQ, Opcode.LE, Opcode.GE) else "0"
+        if result is None:
+            continue
+        if result == "0":
+            if zero is None:
+                zero = function.constant(0)
+            result = zero
+        elif result == "1":
+            if one is None:
+                one = function.constant(1)
+            result = one
+        ops[index] = Opcode.MOVE
+        a[index] = result
+        b[index] = 0
+        changes += 1
+    return changes
+
+
+def eliminate_dead_stores(function: IRFunction) -> int:
+    """
+    Remove writes whose value is never read.
+
+    A write is dead if its slot is not read anywhere in the function, or if
+    the same slot is written again later in the same basic block with no
+    read in between. Removing a write drops the reads it made, which can
+    make further writes dead; a worklist of slots whose read count fell to
+    zero keeps this linear. Divisions that may fail are kept, since failing
+    is observable.
+
+    Returns:
+        Number of instructions removed
+    """
+    ops, dst, a, b = function.ops, function.dst, function.a, function.b
+    reads = [0] * len(function.slot_names)
+    writes: Dict[int, List[int]] = {}
+    for index in range(len(ops)):
+        op = ops[index]
+        if op in READS_A and a[index] >= 0:
+            reads[a[index]] += 1
+        if op in READS_B and b[index] >= 0:
+            reads[b[index]] += 1
+        if op in WRITES_DST:
+            writes.setdefault(dst[index], []).append(index)
+    unread = [slot for slot in writes if not reads[slot]]
+    removed = 0
+
+    def remove(index: int) -> None:
+        op = ops[index]
+        ops[index] = Opcode.NOP
+        for operand in (a[index] if op in READS_A else -1,
+                        b[index] if op in READS_B else -1):
+            if operand >= 0:
+                reads[operand] -= 1
+                if not reads[operand]:
+                    unread.append(operand)
+
+    def drain() -> int:
+        count = 0
+        while unread:
+            for index in writes.get(unread.pop(), ()):
+                if ops[index] != Opcode.NOP and not function.can_fail(index):
+                    remove(index)
+                    count += 1
+        return count
+
+    removed += drain()
+    overwritten = set()
+    for index in range(len(ops) - 1, -1, -1):
+        op = ops[index]
+        if op == Opcode.NOP:
+            continue
+        if op == Opcode.LABEL or op in BLOCK_ENDS:
+            overwritten = set()
+        if op in WRITES_DST:
+            slot = dst[index]
+            if slot in overwritten and not function.can_fail(index):
+                remove(index)
+                removed += 1
+                continue
+            overwritten.add(slot)
+        if op in READS_A:
+            overwritten.discard(a[index])
+        if op in READS_B:
+            overwritten.discard(b[index])
+    return removed + drain()
+
+
+# Passes in the order optimize() runs them, by the name used in statistics.
+PASSES: Tuple[Tuple[str, Callable[[IRFunction], int]], ...] = (
+    ("fold", fold_constants),
+    ("propagate", propagate_constants),
+    ("branches", remove_dead_branches),
+    ("simplify", simplify_algebra),
+    ("dead_stores", eliminate_dead_stores),
+)
+
+
+def optimize(function: IRFunction, passes=PASSES, max_rounds: int = 16,
+             statistics: Optional[Dict[str, Dict[str, int]]] = None
+             ) -> Dict[str, Dict[str, int]]:
+    """
+    Run the passes in turn until none of them changes anything.
+
+    Args:
+        function: Function to optimise in place
+        passes: (name, pass) pairs
+        max_rounds: Upper bound on the number of rounds
+        statistics: Counters to add to, e.g. across functions
+
+    Returns:
+        For each pass name, "changed" (instructions it rewrote or removed)
+        and "removed" (how much shorter it made the function)
+    """
+    if statistics is None:
+        statistics = {}
+    for name, _ in passes:
+        statistics.setdefault(name, {"changed": 0, "removed": 0})
+    for _ in range(max_rounds):
+        progress = False
+        for name, run_pass in passes:
+            before = len(function)
+            changed = run_pass(function)
+            function.compact()
+            counters = statistics[name]
+            counters["changed"] += changed
+            counters["removed"] += before - len(function)
+            progress = progress or changed > 0
+        if not progress:
+            break
+    return statistics
+
+
+def optimize_program(functions: List[IRFunction], passes=PASSES) -> Dict[str, Dict[str, int]]:
+    """Optimise every function and return the combined statistics."""
+    statistics: Dict[str, Dict[str, int]] = {}
+    for function in functions:
+        optimize(function, passes, statistics=statistics)
+    return statistics
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Print the IR of a source file.
+
+    Returns:
+        0 on success, 1 if the file does not compile
+    """
+    arg_parser = argparse.ArgumentParser(description="Print the three-address IR of a program.")
+    arg_parser.add_argument("path", nargs="?", default="input.txt")
+    arg_parser.add_argument("-O0", dest="optimize", action="store_false",
+                            help="print the IR without optimising it")
+    args = arg_parser.parse_args(argv)
+
+    try:
+        try:
+            with open(args.path, 'r', encoding='utf-8') as file_reader:
+                source_code = file_reader.read()
+        except IOError as e:
+            raise FileError(f"Cannot open file: {args.path}", 0, 0) from e
+        functions = lower_program(Parser(Lexer(source_code)).parse())
+    except CompilerError as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+
+    before = sum(len(function) for function in functions)
+    statistics = optimize_program(functions) if args.optimize else {}
+    print("\n\n".join(function.dump() for function in functions))
+    if statistics:
+        after = sum(len(function) for function in functions)
+        print(f"\n# {before} -> {after} instructions")
+        for name, counters in statistics.items():
+            print(f"# {name:<12} changed {counters['changed']:>6}  removed {counters['removed']:>6}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
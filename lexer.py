@@ -0,0 +1,250 @@
+"""Regex-driven lexical analyzer generated from the token tables."""
+
+import re
+import sys
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from tokens import (TokenCode, KEYWORDS, OPERATORS, SPECIAL_CHARACTERS,
+                    TOKEN_CODES, TOKEN_NAMES)
+from token_stream import TokenStream
+from positions import LineIndex
+from errors import LexicalError
+
+
+# Every punctuation spelling mapped to its token type. Special characters and
+# operators never share a spelling, so one lookup table serves both.
+PUNCTUATION = dict(SPECIAL_CHARACTERS)
+PUNCTUATION.update(OPERATORS)
+PUNCTUATION_CODES = {text: TOKEN_CODES[token_type]
+                     for text, token_type in PUNCTUATION.items()}
+
+
+def _build_master_pattern():
+    """
+    Build the master pattern from the tables in tokens.py.
+
+    Leading whitespace is folded into every match so it is skipped in bulk.
+    Two-character operators are tried before one-character ones, as
+    Scanner._scan_operator does by peeking at the next character.
+    """
+    double = sorted(op for op in OPERATORS if len(op) == 2)
+    single = sorted(op for op in PUNCTUATION if len(op) == 1)
+    punctuation = "|".join(re.escape(op) for op in double)
+    punctuation += "|[" + "".join(re.escape(op) for op in single) + "]"
+
+    return re.compile(
+        r"\s*(?:"
+        r"(?P<id>[A-Za-z]\w*)"
+        # ASCII digits not followed by a non-ASCII character; anything else
+        # falls through to the slow path so Unicode numerics still extend it.
+        r"|(?P<num>[0-9]+(?![0-9]|[^\x00-\x7f]))"
+        r"|(?P<unum>[0-9]+)"
+        r"|(?P<lc>//[^\n]*\n?)"
+        r"|(?P<bc>/\*.*?\*/)"
+        r"|(?P<uc>/\*)"
+        r"|(?P<punct>" + punctuation + r")"
+        r"|(?P<other>.)"
+        r"|(?P<eof>\Z))",
+        re.DOTALL
+    )
+
+
+_MASTER = _build_master_pattern()
+# Regex matches between two calls of Lexer.checkpoint. A match is a token
+# or a comment with the whitespace before it, so this bounds the time
+# between calls even in a stretch of comments that yields no tokens.
+CHECKPOINT_INTERVAL = 256
+_WORD_TAIL = re.compile(r"\w*")
+
+
+class Lexer:
+    """
+    Scans source code with a single compiled pattern.
+
+    Produces exactly the same tokens and LexicalErrors as Scanner, but
+    matches whole tokens, whitespace runs and comments in one regex step
+    instead of walking the source one character at a time.
+    """
+
+    def __init__(self, source_code: str):
+        """
+        Initialize the lexer with source code.
+
+        Args:
+            source_code: The source code string to scan
+        """
+        self.tokens: List[Tuple[str, str]] = []
+        self.src: str = source_code
+        # Called with the current offset every CHECKPOINT_INTERVAL matches
+        # while scanning, to let a caller enforce a time limit or cancel by
+        # raising; None, the default, costs one test per match.
+        self.checkpoint: Optional[Callable[[int], None]] = None
+
+    @property
+    def source(self) -> str:
+        """The source code, under the name TokenStream uses."""
+        return self.src
+
+    def scan(self) -> List[Tuple[str, str]]:
+        """
+        Scan the source code and return a list of tokens.
+
+        Returns:
+            List of tuples containing (token_type, token_value)
+
+        Raises:
+            LexicalError: If an invalid character or an unclosed comment
+                is encountered
+        """
+        self.tokens.extend(self.iter_tokens())
+        return self.tokens
+
+    def iter_tokens(self) -> Iterator[Tuple[str, str]]:
+        """
+        Yield tokens one at a time as they are scanned.
+
+        Nothing is accumulated, so memory use does not grow with the number
+        of tokens, and a consumer that stops early stops the scan too.
+
+        Yields:
+            Tuples containing (token_type, token_value)
+
+        Raises:
+            LexicalError: If an invalid character or an unclosed comment
+                is encountered
+        """
+        names = TOKEN_NAMES
+        for code, value, _, _ in self.iter_coded():
+            yield (names[code], value)
+
+    def scan_stream(self) -> TokenStream:
+        """
+        Scan the source code into a compact TokenStream.
+
+        Returns:
+            TokenStream holding type codes and offsets into the source
+
+        Raises:
+            LexicalError: If an invalid character or an unclosed comment
+                is encountered
+        """
+        stream = TokenStream(self.src)
+        add_code = stream.codes.append
+        add_start = stream.starts.append
+        add_end = stream.ends.append
+        for code, _, start, end in self.iter_coded():
+            add_code(code)
+            add_start(start)
+            add_end(end)
+        return stream
+
+    def iter_coded(self, start: int = 0) -> Iterator[Tuple[int, str, int, int]]:
+        """
+        Yield (code, value, start, end) for each token as it is scanned.
+
+        This is the form Parser consumes directly: an integer type code from
+        TokenCode, the token text and its offsets in the source.
+
+        Args:
+            start: Offset to start scanning from. It must not lie inside a
+                token or a comment.
+
+        Raises:
+            LexicalError: If an invalid character or an unclosed comment
+                is encountered
+        """
+        src = self.src
+        keywords = KEYWORDS
+        punctuation = PUNCTUATION_CODES
+        keyword_code = TokenCode.KEYWORD
+        id_code = TokenCode.ID
+        number_code = TokenCode.NUMBER
+        intern = sys.intern
+        checkpoint = self.checkpoint
+        matches = 0
+        pos = start
+
+        while True:
+            for m in _MASTER.finditer(src, pos):
+                if checkpoint is not None:
+                    matches += 1
+                    if matches == CHECKPOINT_INTERVAL:
+                        matches = 0
+                        checkpoint(m.start())
+                kind = m.lastgroup
+                # Leading whitespace is part of the match, so a token's
+                # start is recovered from its end and length.
+                if kind == "id":
+                    value = m.group("id")
+                    end = m.end()
+                    if value in keywords:
+                        yield (keyword_code, value, end - len(value), end)
+                    else:
+                        yield (id_code, intern(value), end - len(value), end)
+                elif kind == "punct":
+                    value = m.group("punct")
+                    end = m.end()
+                    yield (punctuation[value], value, end - len(value), end)
+                elif kind == "num":
+                    value = m.group("num")
+                    end = m.end()
+                    yield (number_code, value, end - len(value), end)
+                elif kind == "lc" or kind == "bc":
+                    pass
+                elif kind == "eof":
+                    return
+                elif kind == "uc":
+                    self._unclosed_comment()
+                    return
+                else:
+                    # Non-ASCII input or an invalid character: hand over to
+                    # the character-by-character rules and resume after it.
+                    token = self._scan_slow(m.start(kind))
+                    yield token
+                    pos = token[3]
+                    break
+
+    def _scan_slow(self, start: int) -> Tuple[int, str, int, int]:
+        """
+        Scan one token with the same character tests Scanner uses.
+
+        Args:
+            start: Offset of the first character of the token
+
+        Returns:
+            Tuple of (code, value, start, end) for the token
+
+        Raises:
+            LexicalError: If the character cannot start a token
+        """
+        src = self.src
+        c = src[start]
+
+        if c.isalpha():
+            end = _WORD_TAIL.match(src, start + 1).end()
+            value = src[start:end]
+            if value in KEYWORDS:
+                return (TokenCode.KEYWORD, value, start, end)
+            return (TokenCode.ID, sys.intern(value), start, end)
+
+        if c.isnumeric():
+            end = start + 1
+            while end < len(src) and src[end].isnumeric():
+                end += 1
+            return (TokenCode.NUMBER, src[start:end], start, end)
+
+        raise self._error(f"Invalid character '{c}'", start)
+
+    def _unclosed_comment(self) -> None:
+        """
+        Handle a multi-line comment that runs to the end of the source.
+
+        Raises:
+            LexicalError: Always; subclasses scanning part of a source may
+                instead record that the comment continues
+        """
+        raise self._error("Unclosed multi-line comment", len(self.src))
+
+    def _error(self, message: str, offset: int) -> LexicalError:
+        """Build a LexicalError at an offset, positioned when reported."""
+        return LexicalError(message, offset=offset, lines=LineIndex(self.src))
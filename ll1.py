@@ -0,0 +1,388 @@
+"""Table-driven LL(1) parser: the grammar as data and a non-recursive driver."""
+
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Union
+
+from tokens import TokenCode, KEYWORDS
+from token_stream import TokenStream
+from parser import CodedToken, BINARY_PRECEDENCE, UNARY_OPERATORS, _code_tuples
+from positions import LineIndex
+from errors import SyntaxError as ParserSyntaxError
+
+
+# How a nullable rule picks its empty alternative: on the terminals that can
+# follow it (FOLLOW), or on every lookahead no other alternative claims (ANY),
+# which is what a recursive-descent loop or optional match does.
+FOLLOW = "follow"
+ANY = "any"
+
+# Terminals are the token codes, except that each keyword is a terminal of
+# its own, numbered after the codes and written in quotes in the grammar.
+KEYWORD_BASE = TokenCode.OR + 1
+KEYWORD_TERMINALS: Dict[str, int] = {
+    keyword: KEYWORD_BASE + index for index, keyword in enumerate(KEYWORDS)
+}
+TERMINALS: Dict[str, int] = {
+    name: code for name, code in vars(TokenCode).items() if not name.startswith("_")
+}
+TERMINALS.update((f"'{keyword}'", terminal)
+                 for keyword, terminal in KEYWORD_TERMINALS.items())
+TERMINAL_COUNT = KEYWORD_BASE + len(KEYWORDS)
+TERMINAL_NAMES: List[str] = [""] * TERMINAL_COUNT
+for _name, _terminal in TERMINALS.items():
+    TERMINAL_NAMES[_terminal] = _name
+del _name, _terminal
+
+
+class Rule:
+    """
+    One nonterminal of the grammar.
+
+    Alternatives are lists of symbols: nonterminal names, or terminal names
+    optionally followed by ':' and the text used in "Expected ..." when the
+    terminal is missing.
+    """
+
+    __slots__ = ("name", "alternatives", "error", "epsilon", "reject")
+
+    def __init__(self, name: str, alternatives: List[List[str]],
+                 error: Optional[str] = None, epsilon=FOLLOW,
+                 reject: Iterable[Tuple[Iterable[str], str]] = ()):
+        """
+        Args:
+            name: Nonterminal name
+            alternatives: Right-hand sides; an empty list is the empty string
+            error: What is "Expected" when no alternative fits the lookahead
+            epsilon: FOLLOW, ANY, or the terminal names on which the empty
+                alternative is chosen
+            reject: (terminal names, expected text) pairs that are errors
+                even though an ANY rule would otherwise derive nothing
+        """
+        self.name = name
+        self.alternatives = alternatives
+        self.error = error
+        self.epsilon = epsilon
+        self.reject = tuple(reject)
+
+
+ASSIGN_OPERATORS = ["ASSIGN", "ADD_ASSIGN", "SUB_ASSIGN", "MUL_ASSIGN", "DIV_ASSIGN"]
+KEYWORD_NAMES = [f"'{keyword}'" for keyword in KEYWORDS]
+STATEMENT_KEYWORDS = ["'if'", "'for'", "'int'"]
+
+# The language Parser accepts, rule for rule. Where Parser matches a token
+# without checking the result, the grammar has an optional (ANY) rule; where
+# Parser dispatches on a single keyword, the rule starts with that keyword.
+GRAMMAR: List[Rule] = [
+    Rule("Program", [["Function", "Program"], []],
+         error="Data Type of Function"),
+    Rule("Function", [["FunctionType", "ID:Name of Function", "LPAREN:(",
+                       "RPAREN:)", "Block"]],
+         error="Data Type of Function"),
+    Rule("FunctionType", [[keyword] for keyword in KEYWORD_NAMES],
+         error="Data Type of Function"),
+    Rule("Block", [["LBRACE:{", "Statements", "Return", "RBRACE:}"]],
+         error="{"),
+    Rule("Statements", [["Statement", "Statements"], []], epsilon=ANY,
+         reject=[([keyword for keyword in KEYWORD_NAMES
+                   if keyword not in STATEMENT_KEYWORDS and keyword != "'return'"],
+                  "Statement")]),
+    Rule("Statement", [["IfStatement"], ["ForLoop"], ["Declaration"], ["Assignment"]],
+         error="Statement"),
+    Rule("Return", [["'return'", "NUMBER:Number", "SEMICOLON:Semicolon"], []],
+         epsilon=ANY),
+    Rule("IfStatement", [["'if'", "OptionalLParen", "Expression", "OptionalRParen",
+                          "Block", "Else"]]),
+    Rule("Else", [["'else'", "Block"], []], epsilon=ANY),
+    Rule("ForLoop", [["'for'", "OptionalLParen", "ForInit", "Expression",
+                      "OptionalSemicolon", "Assignment", "OptionalRParen", "Block"]]),
+    Rule("OptionalLParen", [["LPAREN"], []], epsilon=ANY),
+    Rule("OptionalRParen", [["RPAREN"], []], epsilon=ANY),
+    Rule("OptionalSemicolon", [["SEMICOLON"], []], epsilon=ANY),
+    # A declaration statement starts with 'int'; the one in a for loop
+    # takes any keyword as its type, like Parser.parse_declaration().
+    Rule("Declaration", [["'int'", "ID:ID", "Initializer"]]),
+    Rule("ForInit", [["DataType", "ID:ID", "Initializer"]], error="Data Type"),
+    Rule("DataType", [[keyword] for keyword in KEYWORD_NAMES], error="Data Type"),
+    Rule("Initializer", [["AssignOperator", "Expression", "SEMICOLON:Semicolon"],
+                         ["SEMICOLON:Semicolon"]],
+         error="Semicolon", reject=[(["MOD_ASSIGN"], "Assignment operator")]),
+    Rule("Assignment", [["ID:ID", "AssignmentTail"]], error="ID"),
+    Rule("AssignmentTail", [["INCREASE", "IncrementEnd"], ["DECREASE", "IncrementEnd"],
+                            ["AssignOperator", "Expression", "SEMICOLON:Semicolon"],
+                            []],
+         epsilon=ANY,
+         reject=[(["EOF"], "Semicolon or operator"),
+                 (["MOD_ASSIGN"], "Assignment operator")]),
+    # x++ directly before ')' ends without a semicolon, as in a for loop.
+    Rule("IncrementEnd", [["SEMICOLON:Semicolon"], []], error="Semicolon",
+         epsilon=["RPAREN"]),
+    Rule("AssignOperator", [[operator] for operator in ASSIGN_OPERATORS],
+         error="Assignment operator"),
+    Rule("Expression", [["Level1"]], error="Expression"),
+]
+
+
+def _expression_rules() -> List[Rule]:
+    """
+    Write Parser's operator precedence table as grammar rules.
+
+    The n-th loosest precedence level becomes Level<n> -> Level<n+1>
+    Level<n>Tail, with a tail that repeats the level's operators
+    left-associatively, so the grammar and Parser.parse_expression() always
+    agree on precedence.
+    """
+    levels = sorted(set(BINARY_PRECEDENCE.values()))
+    rules = []
+    for position, level in enumerate(levels, 1):
+        name = f"Level{position}"
+        operand = f"Level{position + 1}" if position < len(levels) else "Unary"
+        tail = f"{name}Tail"
+        operators = sorted(TERMINAL_NAMES[code] for code, precedence
+                           in BINARY_PRECEDENCE.items() if precedence == level)
+        rules.append(Rule(name, [[operand, tail]], error="Expression"))
+        rules.append(Rule(tail, [[operator, operand, tail] for operator in operators] + [[]],
+                          epsilon=ANY))
+    rules.append(Rule("Unary", [[TERMINAL_NAMES[code], "Unary"]
+                                for code in sorted(UNARY_OPERATORS)] + [["Primary"]],
+                      error="Expression"))
+    rules.append(Rule("Primary", [["ID"], ["NUMBER"], ["LPAREN", "Expression", "RPAREN:)"]],
+                      error="Expression"))
+    return rules
+
+
+GRAMMAR.extend(_expression_rules())
+
+
+class LL1Table:
+    """
+    FIRST and FOLLOW sets of a grammar and the predictive parse table
+    built from them.
+
+    Stack symbols are integers: a nonterminal n is ~n (negative), anything
+    else indexes match_terminals and match_labels, the terminal to match and
+    the text to report when it is missing. Each table cell holds the
+    symbols to push (right-hand side reversed) or an "Expected ..." text.
+    """
+
+    def __init__(self, grammar: List[Rule]):
+        """
+        Analyse a grammar.
+
+        Args:
+            grammar: Rules, the first of which is the start symbol
+
+        Raises:
+            ValueError: If the grammar is not LL(1)
+        """
+        self.grammar = grammar
+        self.nonterminals: Dict[str, int] = {rule.name: index
+                                             for index, rule in enumerate(grammar)}
+        self.match_terminals: List[int] = []
+        self.match_labels: List[str] = []
+        self._match_items: Dict[str, int] = {}
+        self.nullable: List[bool] = [False] * len(grammar)
+        self.first: List[FrozenSet[int]] = []
+        self.follow: List[FrozenSet[int]] = []
+        self._compute_first()
+        self._compute_follow()
+        self.table: List[List[Union[Tuple[int, ...], str]]] = self._build_table()
+        self.start: int = ~0
+
+    def _symbol(self, item: str) -> int:
+        """Return the stack symbol for a grammar item."""
+        if item in self.nonterminals:
+            return ~self.nonterminals[item]
+        symbol = self._match_items.get(item)
+        if symbol is None:
+            name, _, label = item.partition(":")
+            if name not in TERMINALS:
+                raise ValueError(f"Unknown grammar symbol '{name}'")
+            symbol = self._match_items[item] = len(self.match_terminals)
+            self.match_terminals.append(TERMINALS[name])
+            self.match_labels.append(label or name)
+        return symbol
+
+    def _first_of(self, symbols: List[int]) -> Tuple[set, bool]:
+        """Return FIRST of a symbol sequence and whether it derives nothing."""
+        result = set()
+        for symbol in symbols:
+            if symbol >= 0:
+                result.add(self.match_terminals[symbol])
+                return result, False
+            result |= self.first[~symbol]
+            if not self.nullable[~symbol]:
+                return result, False
+        return result, True
+
+    def _compute_first(self) -> None:
+        self._alternatives = [[[self._symbol(item) for item in alternative]
+                               for alternative in rule.alternatives]
+                              for rule in self.grammar]
+        self.first = [set() for _ in self.grammar]
+        changed = True
+        while changed:
+            changed = False
+            for index, alternatives in enumerate(self._alternatives):
+                for symbols in alternatives:
+                    first, nullable = self._first_of(symbols)
+                    if not first <= self.first[index]:
+                        self.first[index] |= first
+                        changed = True
+                    if nullable and not self.nullable[index]:
+                        self.nullable[index] = True
+                        changed = True
+        self.first = [frozenset(first) for first in self.first]
+
+    def _compute_follow(self) -> None:
+        follow = [set() for _ in self.grammar]
+        follow[0].add(TokenCode.EOF)
+        changed = True
+        while changed:
+            changed = False
+            for index, alternatives in enumerate(self._alternatives):
+                for symbols in alternatives:
+                    for position, symbol in enumerate(symbols):
+                        if symbol >= 0:
+                            continue
+                        first, nullable = self._first_of(symbols[position + 1:])
+                        if nullable:
+                            first |= follow[index]
+                        if not first <= follow[~symbol]:
+                            follow[~symbol] |= first
+                            changed = True
+        self.follow = [frozenset(terminals) for terminals in follow]
+
+    def _build_table(self) -> List[List[Union[Tuple[int, ...], str]]]:
+        table = []
+        for index, rule in enumerate(self.grammar):
+            row: List[Union[Tuple[int, ...], str, None]] = [None] * TERMINAL_COUNT
+            empty = None
+
+            def claim(terminal: int, entry) -> None:
+                if row[terminal] is not None and row[terminal] != entry:
+                    raise ValueError(f"LL(1) conflict in {rule.name} on "
+                                     f"{TERMINAL_NAMES[terminal]}")
+                row[terminal] = entry
+
+            for symbols in self._alternatives[index]:
+                entry = tuple(reversed(symbols))
+                first, nullable = self._first_of(symbols)
+                for terminal in first:
+                    claim(terminal, entry)
+                if nullable:
+                    empty = entry
+            for names, expected in rule.reject:
+                for name in names:
+                    claim(TERMINALS[name], expected)
+
+            if empty is not None and rule.epsilon != ANY:
+                if rule.epsilon == FOLLOW:
+                    lookaheads = self.follow[index]
+                else:
+                    lookaheads = [TERMINALS[name] for name in rule.epsilon]
+                for terminal in lookaheads:
+                    claim(terminal, empty)
+            default = empty if rule.epsilon == ANY else (rule.error or rule.name)
+            table.append([default if entry is None else entry for entry in row])
+        return table
+
+
+TABLE = LL1Table(GRAMMAR)
+
+
+class LL1Parser:
+    """
+    Checks tokens against GRAMMAR with an explicit stack instead of
+    recursion, so nesting depth is limited only by memory.
+
+    Accepts and rejects exactly what Parser does, with the same error
+    messages and positions, but builds no syntax tree.
+    """
+
+    def __init__(self, tokens: Union[TokenStream, Iterable[Tuple[str, str]]],
+                 table: LL1Table = TABLE):
+        """
+        Initialize the parser.
+
+        Args:
+            tokens: TokenStream, Lexer, or iterable of
+                (token_type, token_value) tuples, as for Parser
+            table: Parse table to drive
+        """
+        if hasattr(tokens, "iter_coded"):
+            self._tokens: Iterator[CodedToken] = tokens.iter_coded()
+            self._source: Optional[str] = getattr(tokens, "source", None)
+        else:
+            self._tokens = _code_tuples(tokens)
+            self._source = None
+        self.table: LL1Table = table
+        self.current_index: int = 0
+
+    def parse(self) -> None:
+        """
+        Check the tokens.
+
+        Raises:
+            SyntaxError: At the first token Parser would reject
+        """
+        rows = self.table.table
+        match_terminals = self.table.match_terminals
+        keywords = KEYWORD_TERMINALS
+        source = self._source
+        tokens = self._tokens
+        keyword_code = TokenCode.KEYWORD
+
+        token = next(tokens, None)
+        terminal = self._terminal(token)
+        stack = [self.table.start]
+        pop = stack.pop
+        push = stack.extend
+        index = 0
+        try:
+            while stack:
+                symbol = pop()
+                if symbol >= 0:
+                    if match_terminals[symbol] != terminal:
+                        self._error(self.table.match_labels[symbol], token)
+                    index += 1
+                    token = next(tokens, None)
+                    if token is None:
+                        terminal = TokenCode.EOF
+                    elif token[0] == keyword_code:
+                        text = token[1]
+                        if text is None:
+                            text = source[token[2]:token[3]]
+                        terminal = keywords[text]
+                    else:
+                        terminal = token[0]
+                else:
+                    entry = rows[~symbol][terminal]
+                    if entry.__class__ is str:
+                        self._error(entry, token)
+                    push(entry)
+        finally:
+            self.current_index = index
+
+    def _terminal(self, token: Optional[CodedToken]) -> int:
+        """Return the grammar terminal of a token."""
+        if token is None:
+            return TokenCode.EOF
+        if token[0] == TokenCode.KEYWORD:
+            return KEYWORD_TERMINALS[self._text(token)]
+        return token[0]
+
+    def _text(self, token: CodedToken) -> str:
+        if token[1] is not None:
+            return token[1]
+        return self._source[token[2]:token[3]]
+
+    def _error(self, expected: str, token: Optional[CodedToken]) -> None:
+        """Raise the SyntaxError Parser.error() would raise."""
+        offset = lines = None
+        if self._source is not None and (token is None or token[2] >= 0):
+            offset = len(self._source) if token is None else token[2]
+            lines = LineIndex(self._source)
+        if token is not None:
+            raise ParserSyntaxError(f"Expected {expected}, got '{self._text(token)}'",
+                                    offset=offset, lines=lines)
+        raise ParserSyntaxError(f"Expected {expected}, but reached end of file",
+                                offset=offset, lines=lines)
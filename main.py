@@ -1,25 +1,86 @@
 """Main entry point for the compiler."""
 
-from scanner import Scanner
+import argparse
+
+from lexer import Lexer
+from byte_lexer import ByteLexer, MappedSource
 from parser import Parser
+from ll1 import LL1Parser
+from parse_events import TraceWriter
+from semantic import SemanticAnalyzer
+from profiling import Profiler, profile_file
 from errors import LexicalError, SyntaxError, FileError
 
 
-def main():
-    """Main function to run the compiler."""
+def main(trace: bool = False, profile: str = None, pstats: str = None,
+         scanner: str = "lexer", max_errors: int = 1, mapped: bool = False):
+    """
+    Main function to run the compiler.
+
+    Args:
+        trace: Print every consumed token, as the parser used to
+        profile: Write phase, function and token statistics to this JSON file
+        pstats: Write the same statistics to this file in pstats format
+        scanner: Scanner to profile with, "lexer" or "scanner"
+        max_errors: Syntax errors to report; above 1 the parser recovers
+            from each error and keeps going. Semantic errors, checked once
+            the program parses, are limited the same way
+        mapped: Map the file into memory and scan its bytes in place
+            instead of decoding it into a string first; non-ASCII bytes
+            are then lexical errors
+    """
     file_path = "input.txt"
+    profiler = Profiler() if profile or pstats else None
+    mapped_source = None
 
     try:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file_reader:
-                source_code = file_reader.read()
-        except IOError as e:
-            raise FileError(f"Cannot open file: {file_path}", 0, 0) from e
-        
-        sc = Scanner(source_code)
-        tokens = sc.scan()
-        p = Parser(tokens)
-        parsed_code = p.parse()
+        if profiler is not None:
+            syntax_errors, semantic_errors = profile_file(
+                file_path, profiler, scanner, max_errors)
+            if syntax_errors:
+                for error in syntax_errors:
+                    print(f"Syntax Error: {error}")
+                return
+        else:
+            if mapped:
+                mapped_source = MappedSource(file_path)
+                source_code = mapped_source.data
+                lexer_class = ByteLexer
+            else:
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as file_reader:
+                        source_code = file_reader.read()
+                except IOError as e:
+                    raise FileError(f"Cannot open file: {file_path}", 0, 0) from e
+                lexer_class = Lexer
+
+            sc = lexer_class(source_code)
+            p = Parser(sc, TraceWriter() if trace else None,
+                       recover=max_errors > 1, max_errors=max_errors)
+            try:
+                parsed_code = p.parse()
+            except RecursionError:
+                # Too deep for the recursive parser. Keep the errors it
+                # recovered before the overflow; with none, the table-driven
+                # one gives the same verdict without recursing, but no tree
+                # to check names in.
+                if not p.errors:
+                    LL1Parser(lexer_class(source_code)).parse()
+                parsed_code = None
+            if p.errors:
+                if not trace:
+                    for error in p.errors:
+                        print(f"Syntax Error: {error}")
+                return
+            semantic_errors = []
+            if parsed_code is not None:
+                semantic_errors = SemanticAnalyzer(source_code, max_errors).analyze(parsed_code)
+        if semantic_errors:
+            for error in semantic_errors:
+                print(f"Semantic Error: {error}")
+            return
+        if not trace:
+            print("Code is syntactically correct.")
         
     except FileError as e:
         print(f"File Error: {e}")
@@ -29,7 +90,31 @@ def main():
         print(f"Syntax Error: {e}")
     except Exception as e:
         print(f"Unexpected error: {e}")
+    finally:
+        if mapped_source is not None:
+            mapped_source.close()
+        if profile:
+            profiler.write_json(profile)
+        if pstats:
+            profiler.dump_stats(pstats)
 
 
 if __name__ == '__main__':
-    main()
+    arg_parser = argparse.ArgumentParser(description="Scan and parse input.txt.")
+    arg_parser.add_argument("--trace", action="store_true",
+                            help="print every token the parser consumes")
+    arg_parser.add_argument("--profile", metavar="FILE",
+                            help="write a JSON profile of the compile")
+    arg_parser.add_argument("--pstats", metavar="FILE",
+                            help="write a profile readable with pstats.Stats")
+    arg_parser.add_argument("--profile-scanner", choices=("lexer", "scanner"),
+                            default="lexer",
+                            help="profile with the Lexer or the reference Scanner")
+    arg_parser.add_argument("--max-errors", type=int, default=1,
+                            help="report up to this many syntax errors")
+    arg_parser.add_argument("--mmap", action="store_true",
+                            help="scan the memory-mapped file as ASCII bytes")
+    args = arg_parser.parse_args()
+    main(trace=args.trace, profile=args.profile, pstats=args.pstats,
+         scanner=args.profile_scanner, max_errors=args.max_errors,
+         mapped=args.mmap)
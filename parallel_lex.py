@@ -0,0 +1,277 @@
+"""Scanning one large source in chunks on a process pool."""
+
+import argparse
+import os
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from lexer import Lexer
+from token_stream import TokenStream, offset_typecode
+from errors import CompilerError, FileError, LexicalError
+
+# Characters per chunk before moving the cut to the next line break.
+CHUNK_SIZE = 4 * 1024 * 1024
+# Below this many characters a pool costs more than it saves.
+MIN_PARALLEL_SIZE = 1024 * 1024
+
+# What a worker returns for one start state of a chunk: token codes, starts
+# and ends, whether the chunk ends inside a multi-line comment, and the
+# error as (message, line within the chunk, column, offset within the
+# chunk), if any.
+ChunkTokens = Tuple[array, array, array, bool, Optional[Tuple[str, int, int, int]]]
+
+
+def cut_chunks(source: str, chunk_size: int = CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """
+    Cut a source into chunks that each end just after a line break.
+
+    No token contains a line break and a '//' comment ends at one, so a
+    chunk starts either in ordinary code or inside a '/* */' comment.
+
+    Returns:
+        (start, end) offsets of each chunk, covering the whole source
+    """
+    chunks = []
+    start = 0
+    while start < len(source):
+        newline = source.find("\n", start + chunk_size) if start + chunk_size < len(source) else -1
+        end = newline + 1 if newline >= 0 else len(source)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+class _ChunkLexer(Lexer):
+    """A Lexer over one chunk that may end inside a comment."""
+
+    def __init__(self, text: str, last: bool):
+        super().__init__(text)
+        self.last: bool = last
+        self.ends_in_comment: bool = False
+
+    def _unclosed_comment(self) -> None:
+        if self.last:
+            super()._unclosed_comment()
+        self.ends_in_comment = True
+
+
+def _collect(lexer: _ChunkLexer, start: int, typecode: str, stop=None):
+    """
+    Scan a chunk from start, optionally stopping early.
+
+    Args:
+        lexer: Lexer over the chunk
+        start: Offset to scan from
+        typecode: Array typecode of the offsets
+        stop: Called with each token's start; returning True stops the scan
+            before that token
+
+    Returns:
+        codes, starts, ends, the error tuple or None, and whether stop did
+    """
+    codes = array('B')
+    starts = array(typecode)
+    ends = array(typecode)
+    try:
+        for code, _, token_start, token_end in lexer.iter_coded(start):
+            if stop is not None and stop(token_start):
+                return codes, starts, ends, None, True
+            codes.append(code)
+            starts.append(token_start)
+            ends.append(token_end)
+    except LexicalError as e:
+        return codes, starts, ends, (e.message, e.line, e.column, e.offset), False
+    return codes, starts, ends, None, False
+
+
+def _rebased(offsets: array, base: int) -> array:
+    if not base:
+        return offsets
+    return array(offsets.typecode, [offset + base for offset in offsets])
+
+
+def _lex_chunk(text: str, base: int, last: bool,
+               typecode: str) -> Tuple[int, ChunkTokens, ChunkTokens]:
+    """
+    Scan a chunk under both start states, in a worker process.
+
+    The in-comment scan skips to the first '*/' and carries on from there.
+    It stops as soon as it reaches a token the ordinary scan also found,
+    because from then on both scans agree; the rest is taken from the
+    ordinary scan.
+
+    Args:
+        text: The chunk
+        base: Offset of the chunk in the source
+        last: Whether the chunk ends the source
+        typecode: Array typecode of offsets into the whole source
+
+    Returns:
+        The number of line breaks in the chunk, then the tokens for a chunk
+        starting in code and for one starting inside a comment, with
+        offsets in the whole source
+    """
+    lexer = _ChunkLexer(text, last)
+    codes, starts, ends, error, _ = _collect(lexer, 0, typecode)
+    normal = (codes, starts, ends, lexer.ends_in_comment, error)
+
+    close = text.find("*/")
+    inner = _ChunkLexer(text, last)
+    if close < 0:
+        inner_error = None
+        if last:
+            unclosed = inner._error("Unclosed multi-line comment", len(text))
+            inner_error = (unclosed.message, unclosed.line, unclosed.column,
+                           unclosed.offset)
+        in_comment = (array('B'), array(typecode), array(typecode), True, inner_error)
+    else:
+        joined = []
+
+        def converged(token_start: int) -> bool:
+            index = bisect_left(starts, token_start)
+            if index == len(starts) or starts[index] != token_start:
+                return False
+            joined.append(index)
+            return True
+
+        own = _collect(inner, close + 2, typecode, converged)
+        if own[4]:
+            index = joined[0]
+            in_comment = (own[0] + codes[index:], own[1] + starts[index:],
+                          own[2] + ends[index:], normal[3], error)
+        else:
+            in_comment = (own[0], own[1], own[2], inner.ends_in_comment, own[3])
+
+    def rebase(result: ChunkTokens) -> ChunkTokens:
+        return (result[0], _rebased(result[1], base), _rebased(result[2], base),
+                result[3], result[4])
+
+    return text.count("\n"), rebase(normal), rebase(in_comment)
+
+
+class ParallelLexer:
+    """
+    Scans a source in chunks on worker processes.
+
+    The source is cut after line breaks into chunks of about chunk_size
+    characters. Each worker scans its chunk twice, as if it started in code
+    and as if it started inside a multi-line comment; a sequential pass
+    then follows the real state from chunk to chunk, keeps the matching
+    scan of each, and adds the line breaks of earlier chunks to error line
+    numbers. Tokens and errors are exactly those of Lexer.scan_stream().
+    """
+
+    def __init__(self, source_code: str, jobs: Optional[int] = None,
+                 chunk_size: int = CHUNK_SIZE):
+        """
+        Initialize the lexer.
+
+        Args:
+            source_code: The source code string to scan
+            jobs: Worker processes; None for one per CPU
+            chunk_size: Characters per chunk, before moving the cut to the
+                next line break
+        """
+        self.src: str = source_code
+        self.jobs: int = jobs or os.cpu_count() or 1
+        self.chunk_size: int = chunk_size
+
+    @property
+    def source(self) -> str:
+        """The source code, under the name TokenStream uses."""
+        return self.src
+
+    def scan_stream(self) -> TokenStream:
+        """
+        Scan the source code into a TokenStream.
+
+        Raises:
+            LexicalError: If an invalid character or an unclosed comment
+                is encountered
+        """
+        src = self.src
+        if self.jobs <= 1 or len(src) < MIN_PARALLEL_SIZE:
+            return Lexer(src).scan_stream()
+
+        chunks = cut_chunks(src, self.chunk_size)
+        stream = TokenStream(src)
+        in_comment = False
+        lines = 0
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            typecode = offset_typecode(len(src))
+            futures = [executor.submit(_lex_chunk, src[start:end], start,
+                                       end == len(src), typecode)
+                       for start, end in chunks]
+            for (base, _), future in zip(chunks, futures):
+                newlines, normal, commented = future.result()
+                codes, starts, ends, in_comment, error = commented if in_comment else normal
+                if error is not None:
+                    for pending in futures:
+                        pending.cancel()
+                    message, line, column, offset = error
+                    raise LexicalError(message, line + lines, column,
+                                       offset=base + offset)
+                stream.codes += codes
+                stream.starts += starts
+                stream.ends += ends
+                lines += newlines
+        return stream
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Scan one file on a process pool.
+
+    Returns:
+        0 if the file scans, 1 otherwise
+    """
+    arg_parser = argparse.ArgumentParser(
+        description="Scan one large file in parallel chunks.")
+    arg_parser.add_argument("path", nargs="?", default="input.txt")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                            help="worker processes (default: number of CPUs)")
+    arg_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE // 1024,
+                            help="chunk size in KB (default: %(default)s)")
+    arg_parser.add_argument("--compare", action="store_true",
+                            help="also scan serially and compare results and times")
+    args = arg_parser.parse_args(argv)
+
+    try:
+        try:
+            with open(args.path, 'r', encoding='utf-8') as file_reader:
+                source_code = file_reader.read()
+        except IOError as e:
+            raise FileError(f"Cannot open file: {args.path}", 0, 0) from e
+    except CompilerError as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+
+    def outcome(lexer):
+        started = time.perf_counter()
+        try:
+            stream = lexer.scan_stream()
+            result = (stream.codes, stream.starts, stream.ends)
+        except CompilerError as e:
+            result = f"{type(e).__name__}: {e}"
+        return result, time.perf_counter() - started
+
+    result, elapsed = outcome(ParallelLexer(source_code, args.jobs, args.chunk_size * 1024))
+    if isinstance(result, str):
+        print(result, file=sys.stderr)
+    print(f"scanned in {elapsed:.3f}s with {args.jobs} jobs", file=sys.stderr)
+    if args.compare:
+        serial, elapsed = outcome(Lexer(source_code))
+        same = serial == result
+        print(f"serial scan {elapsed:.3f}s, {'identical' if same else 'DIFFERENT'}",
+              file=sys.stderr)
+        if not same:
+            return 1
+    return 1 if isinstance(result, str) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
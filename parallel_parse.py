@@ -0,0 +1,310 @@
+"""Parsing the top-level functions of one large file on a process pool."""
+
+import argparse
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from lexer import Lexer
+from parser import Parser, CodedToken
+from syntax_tree import Function, Program
+from tokens import TokenCode
+from token_stream import TokenStream, TokenSuffix
+from errors import CompilerError, FileError, SyntaxError as ParserSyntaxError
+
+# Tokens handed to a worker at a time, unless the file is small enough that
+# this would leave workers idle.
+CHUNK_TOKENS = 200_000
+# Below this many tokens a pool costs more than it saves.
+MIN_PARALLEL_TOKENS = 50_000
+
+
+def split_functions(tokens: TokenStream) -> List[Tuple[int, int]]:
+    """
+    Split a token stream into the spans of its top-level functions.
+
+    Only braces are looked at: a span ends with each '}' that brings the
+    brace depth back to zero, and a stray '}' at depth zero is ignored.
+    For a correct program every span is exactly one function; for an
+    incorrect one the spans are only a guess, which ParallelParser checks.
+
+    Returns:
+        (first, last + 1) token indices of each span, covering all tokens
+    """
+    spans = []
+    first = 0
+    depth = 0
+    lbrace = TokenCode.LBRACE
+    rbrace = TokenCode.RBRACE
+    for index, code in enumerate(tokens.codes):
+        if code == lbrace:
+            depth += 1
+        elif code == rbrace and depth:
+            depth -= 1
+            if not depth:
+                spans.append((first, index + 1))
+                first = index + 1
+    if first < len(tokens):
+        spans.append((first, len(tokens)))
+    return spans
+
+
+class _ChunkTokens:
+    """Coded tokens of a chunk with their text filled in, as a Parser input."""
+
+    source = None
+
+    def __init__(self, tokens: Iterator[CodedToken]):
+        self._tokens = tokens
+
+    def iter_coded(self) -> Iterator[CodedToken]:
+        return self._tokens
+
+
+def _parse_chunk(text: str, base: int, codes: array, starts: array, ends: array,
+                 spans: List[Tuple[int, int]], keep_trees: bool) -> Tuple[int, List[Function]]:
+    """
+    Parse consecutive function spans in a worker process.
+
+    Args:
+        text: The source from the first token of the chunk to its last
+        base: Offset of text in the whole source
+        codes, starts, ends: Token arrays of the chunk; offsets are in the
+            whole source, so the nodes come back positioned correctly
+        spans: (first, last + 1) indices into the chunk arrays
+        keep_trees: Return the parsed functions, not just their number
+
+    Returns:
+        The number of spans parsed, stopping at the first that fails to
+        parse or is not exactly one function, and the functions if asked
+    """
+    intern = sys.intern
+    id_code = TokenCode.ID
+    functions = []
+    parsed = 0
+    for first, last in spans:
+        tokens = []
+        for index in range(first, last):
+            value = text[starts[index] - base:ends[index] - base]
+            if codes[index] == id_code:
+                value = intern(value)
+            tokens.append((codes[index], value, starts[index], ends[index]))
+        parser = Parser(_ChunkTokens(iter(tokens)))
+        try:
+            function = parser.parse_function()
+        except (CompilerError, RecursionError):
+            break
+        if parser.current_index != last - first:
+            break
+        parsed += 1
+        if keep_trees:
+            functions.append(function)
+    return parsed, functions
+
+
+class ParallelParser:
+    """
+    Parses the top-level functions of a token stream on worker processes.
+
+    The stream is cut into function spans by split_functions() and runs of
+    spans are parsed on a process pool. Each worker parses its spans as
+    separate functions; the results come back in source order. If a span
+    does not parse as exactly one function, everything from that span on
+    is parsed again serially, so the tree, the errors and their positions
+    are always those Parser.parse() gives for the whole stream.
+    """
+
+    def __init__(self, tokens: TokenStream, jobs: Optional[int] = None,
+                 recover: bool = False, max_errors: int = 100,
+                 chunk_tokens: int = CHUNK_TOKENS):
+        """
+        Initialize the parser.
+
+        Args:
+            tokens: The scanned program
+            jobs: Worker processes; None for one per CPU
+            recover: As for Parser
+            max_errors: As for Parser
+            chunk_tokens: Tokens sent to a worker at a time
+        """
+        self.tokens: TokenStream = tokens
+        self.jobs: int = jobs or os.cpu_count() or 1
+        self.recover: bool = recover
+        self.max_errors: int = max_errors
+        self.chunk_tokens: int = chunk_tokens
+        self.errors: List[ParserSyntaxError] = []
+        # Index of the span serial parsing resumed from, or None if every
+        # span parsed in the pool.
+        self.fallback_span: Optional[int] = None
+
+    def parse(self) -> Program:
+        """
+        Parse the program.
+
+        Sending a tree back from a worker costs about as much as building
+        it, so this is bounded by the time to unpickle the nodes; check()
+        does not have that cost.
+
+        Returns:
+            The syntax tree, equal to the one Parser.parse() builds
+
+        Raises:
+            SyntaxError: If a syntax error is encountered and recover is off
+        """
+        return self._run(True)
+
+    def check(self) -> List[ParserSyntaxError]:
+        """
+        Parse the program without bringing the tree back from the workers.
+
+        Returns:
+            The errors, as Parser.errors holds them after a parse
+
+        Raises:
+            SyntaxError: If a syntax error is encountered and recover is off
+        """
+        self._run(False)
+        return self.errors
+
+    def _run(self, keep_trees: bool) -> Program:
+        """Parse on the pool, falling back to Parser at the first bad span."""
+        tokens = self.tokens
+        if self.jobs <= 1 or len(tokens) < MIN_PARALLEL_TOKENS:
+            return self._parse_serially([], 0)
+
+        spans = split_functions(tokens)
+        chunks = self._chunks(spans)
+        functions: List[Function] = []
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [executor.submit(_parse_chunk,
+                                       *self._chunk_arguments(spans, first, last),
+                                       keep_trees)
+                       for first, last in chunks]
+            for (first, last), future in zip(chunks, futures):
+                try:
+                    parsed, trees = future.result()
+                except RecursionError:
+                    # A tree too deep to pickle; Parser decides what the
+                    # serial parse does with it.
+                    parsed, trees = 0, []
+                functions.extend(trees)
+                if parsed < last - first:
+                    for pending in futures:
+                        pending.cancel()
+                    self.fallback_span = first + parsed
+                    return self._parse_serially(functions, spans[self.fallback_span][0])
+        start = tokens.starts[0] if functions else -1
+        end = functions[-1].end if functions else -1
+        return Program(functions, start, end)
+
+    def _chunks(self, spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Group spans into runs of about chunk_tokens tokens each."""
+        # Several chunks per worker keep the pool busy when spans vary in size.
+        size = min(self.chunk_tokens, max(1, len(self.tokens) // (self.jobs * 4)))
+        chunks = []
+        first = 0
+        for index, (_, last) in enumerate(spans):
+            if last - spans[first][0] >= size:
+                chunks.append((first, index + 1))
+                first = index + 1
+        if first < len(spans):
+            chunks.append((first, len(spans)))
+        return chunks
+
+    def _chunk_arguments(self, spans: List[Tuple[int, int]], first: int, last: int):
+        """Return the arguments of _parse_chunk for spans first to last - 1."""
+        tokens = self.tokens
+        low = spans[first][0]
+        high = spans[last - 1][1]
+        base = tokens.starts[low]
+        text = tokens.source[base:tokens.ends[high - 1]]
+        if not isinstance(text, str):
+            text = text.decode("ascii")
+        local = [(start - low, end - low) for start, end in spans[first:last]]
+        return (text, base, tokens.codes[low:high], tokens.starts[low:high],
+                tokens.ends[low:high], local)
+
+    def _parse_serially(self, functions: List[Function], index: int) -> Program:
+        """
+        Parse from token index on with Parser, after the given functions.
+
+        The functions before index parsed without errors, so the parser's
+        state there is the one a parse of the whole stream would have.
+        """
+        tokens = self.tokens
+        parser = Parser(TokenSuffix(tokens, index), recover=self.recover,
+                        max_errors=self.max_errors)
+        try:
+            program = parser.parse()
+        finally:
+            self.errors = parser.errors
+        functions.extend(program.functions)
+        start = tokens.starts[0] if functions else -1
+        if program.end >= 0:
+            end = program.end
+        else:
+            end = functions[-1].end if functions else -1
+        return Program(functions, start, end)
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Parse one file on a process pool.
+
+    Returns:
+        0 if the file parses, 1 otherwise
+    """
+    arg_parser = argparse.ArgumentParser(
+        description="Parse the top-level functions of one file in parallel.")
+    arg_parser.add_argument("path", nargs="?", default="input.txt")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                            help="worker processes (default: number of CPUs)")
+    arg_parser.add_argument("--max-errors", type=int, default=1,
+                            help="report up to this many syntax errors")
+    arg_parser.add_argument("--tree", action="store_true",
+                            help="bring the syntax tree back from the workers")
+    arg_parser.add_argument("--compare", action="store_true",
+                            help="also parse serially and compare results and times")
+    args = arg_parser.parse_args(argv)
+
+    try:
+        try:
+            with open(args.path, 'r', encoding='utf-8') as file_reader:
+                source_code = file_reader.read()
+        except IOError as e:
+            raise FileError(f"Cannot open file: {args.path}", 0, 0) from e
+        tokens = Lexer(source_code).scan_stream()
+        recover = args.max_errors > 1
+        started = time.perf_counter()
+        parser = ParallelParser(tokens, args.jobs, recover, args.max_errors)
+        program = None
+        if args.tree:
+            program = parser.parse()
+        else:
+            parser.check()
+        elapsed = time.perf_counter() - started
+    except CompilerError as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+
+    for error in parser.errors:
+        print(f"Syntax Error: {error}")
+    print(f"parsed in {elapsed:.3f}s with {parser.jobs} jobs", file=sys.stderr)
+    if args.compare:
+        started = time.perf_counter()
+        serial = Parser(tokens, recover=recover, max_errors=args.max_errors)
+        serial_program = serial.parse()
+        same = ([str(e) for e in serial.errors] == [str(e) for e in parser.errors] and
+                (program is None or serial_program == program))
+        print(f"serial parse {time.perf_counter() - started:.3f}s, "
+              f"{'identical' if same else 'DIFFERENT'}", file=sys.stderr)
+        if not same:
+            return 1
+    return 1 if parser.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Listeners that observe the parser as it runs."""
+
+import sys
+from typing import List, TextIO
+
+from errors import CompilerError, SyntaxError
+
+
+class ParseListener:
+    """
+    Receives parse events from a Parser.
+
+    Every method does nothing; subclasses override the events they need.
+    A parser created without a listener never calls any of these, so an
+    unobserved parse pays nothing for this interface.
+    """
+
+    def token(self, token_type: str, value: str, start: int, end: int) -> None:
+        """Called when the parser consumes a token (offsets are -1 if unknown)."""
+
+    def enter_rule(self, rule: str) -> None:
+        """Called when a grammar rule method such as parse_block starts."""
+
+    def exit_rule(self, rule: str) -> None:
+        """Called when a grammar rule method returns without an error."""
+
+    def error(self, error: CompilerError) -> None:
+        """
+        Called when parsing stops with an error.
+
+        This is usually a SyntaxError, but a LexicalError raised while the
+        parser pulls tokens from a lexer is reported here as well.
+        """
+
+    def finish(self) -> None:
+        """Called when the whole input has been parsed successfully."""
+
+
+class TraceWriter(ParseListener):
+    """
+    Writes the classic parse trace: one line per consumed token, then
+    the success message or the syntax error.
+
+    Lines are buffered and written in batches rather than one print() per
+    token.
+    """
+
+    def __init__(self, stream: TextIO = None, buffer_lines: int = 4096):
+        """
+        Initialize the writer.
+
+        Args:
+            stream: Where to write the trace; defaults to sys.stdout
+            buffer_lines: Number of lines to collect before writing
+        """
+        self.stream: TextIO = stream if stream is not None else sys.stdout
+        self.buffer_lines: int = buffer_lines
+        self._lines: List[str] = []
+
+    def token(self, token_type: str, value: str, start: int, end: int) -> None:
+        self._lines.append(value)
+        if len(self._lines) >= self.buffer_lines:
+            self.flush()
+
+    def error(self, error: CompilerError) -> None:
+        if isinstance(error, SyntaxError):
+            self._lines.append(f"SyntaxError: {error}")
+        self.flush()
+
+    def finish(self) -> None:
+        self._lines.append("Code is syntactically correct.")
+        self.flush()
+
+    def flush(self) -> None:
+        """Write out any buffered lines."""
+        if self._lines:
+            self._lines.append("")
+            self.stream.write("\n".join(self._lines))
+            self._lines = []
@@ -1,55 +1,221 @@
-"""Parser for the compiler - builds parse tree from tokens."""
-
-from typing import List, Tuple, Optional
-from tokens import TokenType
-from errors import SyntaxError as ParserSyntaxError
+"""Parser for the compiler - builds a syntax tree from tokens."""
+
+import sys
+from typing import Iterable, Iterator, List, Tuple, Optional, Union
+from tokens import TokenCode, OPERATORS, TOKEN_CODES, TOKEN_NAMES
+from token_stream import TokenStream
+from parse_events import ParseListener
+from positions import LineIndex
+from syntax_tree import (Node, Program, Function, Block, If, For, Declaration,
+                         Assignment, Return, UnaryOp, BinaryOp, Compare,
+                         Identifier, Number)
+from errors import CompilerError, SyntaxError as ParserSyntaxError
+
+
+# Bump whenever the language the parser accepts or the errors it reports
+# change, so results cached by an older parser are not reused.
+GRAMMAR_VERSION = 4
+
+# A token as the parser holds it: (code, value, start, end). The value is None
+# when the text still lives in the source; offsets are -1 when unknown.
+CodedToken = Tuple[int, Optional[str], int, int]
+
+# Grammar rule methods reported to a ParseListener on entry and exit.
+RULES = (
+    "parse_function", "parse_block", "parse_statement", "parse_if_statement",
+    "parse_for_loop", "parse_declaration", "parse_assignment",
+    "parse_expression",
+)
+
+ASSIGN_OPERATORS = frozenset((
+    TokenCode.ASSIGN, TokenCode.ADD_ASSIGN, TokenCode.SUB_ASSIGN,
+    TokenCode.MUL_ASSIGN, TokenCode.DIV_ASSIGN, TokenCode.MOD_ASSIGN,
+))
+
+# Binary operators and their precedence; a higher number binds tighter and
+# every level is left-associative, as in C.
+BINARY_PRECEDENCE = {
+    TokenCode.OR: 1,
+    TokenCode.AND: 2,
+    TokenCode.EQUAL: 3, TokenCode.NOT_EQU: 3,
+    TokenCode.LESS: 4, TokenCode.LESSER: 4,
+    TokenCode.GREAT: 4, TokenCode.GREATER: 4,
+    TokenCode.PLUS: 5, TokenCode.MINUS: 5,
+    TokenCode.MUL: 6, TokenCode.DIV: 6, TokenCode.MOD: 6,
+}
+COMPARISON_OPERATORS = frozenset((
+    TokenCode.EQUAL, TokenCode.NOT_EQU, TokenCode.LESS, TokenCode.LESSER,
+    TokenCode.GREAT, TokenCode.GREATER,
+))
+# Prefix operators bind tighter than any binary operator.
+UNARY_OPERATORS = frozenset((TokenCode.NOT, TokenCode.MINUS))
+UNARY_PRECEDENCE = 7
+
+# Operator spelling by token code, so building a node needs no source slice.
+OPERATOR_TEXT = {TOKEN_CODES[token_type]: text for text, token_type in OPERATORS.items()}
+
+# Keywords that begin a statement; recovery resumes in front of them.
+STATEMENT_KEYWORDS = frozenset(("if", "for", "int"))
+
+
+class _StopParsing(Exception):
+    """Ends a recovering parse early; never escapes Parser.parse()."""
+
+
+def _code_tuples(tokens: Iterable[Tuple[str, str]]) -> Iterator[CodedToken]:
+    """Convert (token_type, token_value) tuples into coded tokens."""
+    codes = TOKEN_CODES
+    for token_type, value in tokens:
+        yield (codes[token_type], value, -1, -1)
 
 
 class Parser:
     """Parses tokens according to the grammar rules."""
 
-    def __init__(self, tokens: List[Tuple[str, str]]):
+    def __init__(self, tokens: Union[TokenStream, Iterable[Tuple[str, str]]],
+                 listener: Optional[ParseListener] = None,
+                 recover: bool = False, max_errors: int = 100):
         """
-        Initialize the parser with a list of tokens.
+        Initialize the parser with a sequence or stream of tokens.
+        
+        Tokens are pulled one at a time, so a generator such as
+        Scanner.iter_tokens() is consumed lazily and the full token list
+        never has to exist in memory. A TokenStream, or a Lexer to stream
+        from, is read through its integer type codes directly.
         
         Args:
-            tokens: List of (token_type, token_value) tuples
+            tokens: TokenStream, Lexer, or iterable of
+                (token_type, token_value) tuples
+            listener: Optional ParseListener notified of every consumed
+                token, rule entry and exit, and the outcome. Without one
+                the parser produces no output at all.
+            recover: Instead of stopping at the first syntax error, record
+                it in self.errors, skip to the next ';', '}' or function,
+                and carry on
+            max_errors: Stop recovering after this many errors
         """
-        self.tokens: List[Tuple[str, str]] = tokens
+        if hasattr(tokens, "iter_coded"):
+            self._tokens: Iterator[CodedToken] = tokens.iter_coded()
+            self._source: Optional[str] = getattr(tokens, "source", None)
+        else:
+            self._tokens = _code_tuples(tokens)
+            self._source = None
+        # One-token lookahead buffer; code is TokenCode.EOF once exhausted.
+        self._current: Optional[CodedToken] = None
+        self._previous: Optional[CodedToken] = None
+        self._code: int = TokenCode.EOF
         self.current_index: int = 0
-
-    def parse(self) -> None:
+        self.listener: Optional[ParseListener] = listener
+        self.recover: bool = recover
+        self.max_errors: int = max_errors
+        self.errors: List[ParserSyntaxError] = []
+        # Braces opened and not yet closed, which is what recovery syncs on.
+        self._depth: int = 0
+        self._lines: Optional[LineIndex] = None
+        self._eof_error: bool = False
+        if listener is not None:
+            self._attach_listener(listener)
+        self._advance()
+
+    def parse(self) -> Program:
         """
         Parse the tokens according to the grammar.
         
+        When recovering, syntax errors are collected in self.errors instead
+        of raised, and the tree leaves out the statements and functions
+        they occurred in.
+        
+        Returns:
+            The syntax tree of the whole program
+            
         Raises:
-            SyntaxError: If a syntax error is encountered
+            SyntaxError: If a syntax error is encountered and recover is off
         """
+        start = self._start()
+        functions = []
         try:
-            while self.current_index < len(self.tokens):
-                self.parse_function()
-            print("Code is syntactically correct.")
-        except ParserSyntaxError as e:
-            print(f"SyntaxError: {e}")
+            while self._code != TokenCode.EOF:
+                first = self.current_index
+                try:
+                    functions.append(self.parse_function())
+                except ParserSyntaxError as e:
+                    if not self.recover:
+                        raise
+                    self._recovered(e)
+                    self._skip_function(first)
+        except _StopParsing:
+            pass
+        except CompilerError as e:
+            if self.listener is not None:
+                self.listener.error(e)
             raise
+        if self.listener is not None and not self.errors:
+            self.listener.finish()
+        return Program(functions, start if functions else -1, self._end())
 
-    def match(self, expected_type: str) -> bool:
+    def match(self, expected_code: int) -> bool:
         """
         Check if current token matches expected type and advance if it does.
         
         Args:
-            expected_type: The expected token type
+            expected_code: The expected token type, as a TokenCode
             
         Returns:
             True if match, False otherwise
         """
-        if (self.current_index < len(self.tokens) and
-                self.tokens[self.current_index][0] == expected_type):
-            print(self.tokens[self.current_index][1])
+        if self._code == expected_code:
+            self._previous = self._current
+            self.current_index += 1
+            self._advance()
+            return True
+        return False
+
+    def _match_observed(self, expected_code: int) -> bool:
+        """Version of match() installed when a listener is attached."""
+        if self._code == expected_code:
+            token = self._current
+            self.listener.token(TOKEN_NAMES[token[0]], self._text(),
+                                token[2], token[3])
+            self._previous = token
             self.current_index += 1
+            self._advance()
             return True
         return False
 
+    def _attach_listener(self, listener: ParseListener) -> None:
+        """
+        Route events to the listener.
+
+        The observing versions of match() and the rule methods are bound on
+        this instance only, so parsers without a listener run the plain
+        methods with no per-token checks.
+        """
+        self.match = self._match_observed
+        for rule in RULES:
+            setattr(self, rule, self._observed_rule(rule, getattr(self, rule)))
+
+    def _observed_rule(self, rule: str, method):
+        """Wrap a rule method so the listener sees it enter and exit."""
+        listener = self.listener
+
+        def observed(*args, **kwargs):
+            listener.enter_rule(rule)
+            result = method(*args, **kwargs)
+            listener.exit_rule(rule)
+            return result
+
+        return observed
+
+    def _advance(self) -> None:
+        """Pull the next token into the lookahead buffer."""
+        token = next(self._tokens, None)
+        self._current = token
+        self._code = TokenCode.EOF if token is None else token[0]
+
+    def _text(self) -> str:
+        """Return the text of the current token."""
+        return self._token_text(self._current)
+
     def error(self, expected_type: str) -> None:
         """
         Raise a syntax error with context information.
@@ -60,221 +226,392 @@ class Parser:
         Raises:
             SyntaxError: Always raises this exception
         """
-        if self.current_index < len(self.tokens):
-            got = self.tokens[self.current_index][1]
-            raise ParserSyntaxError(f"Expected {expected_type}, got '{got}'")
+        offset, lines = self._location()
+        if self._code != TokenCode.EOF:
+            got = self._text()
+            raise ParserSyntaxError(f"Expected {expected_type}, got '{got}'",
+                                    offset=offset, lines=lines)
+        else:
+            raise ParserSyntaxError(f"Expected {expected_type}, but reached end of file",
+                                    offset=offset, lines=lines)
+
+    def _location(self) -> Tuple[Optional[int], Optional[LineIndex]]:
+        """
+        Return the offset of the current token, if known, and the LineIndex
+        that turns it into a line and column, if the source is known.
+        """
+        if self._current is None:
+            if self._source is None:
+                return None, None
+            offset = len(self._source)
         else:
-            raise ParserSyntaxError(f"Expected {expected_type}, but reached end of file")
+            offset = self._current[2]
+            if offset < 0:
+                return None, None
+        if self._source is None:
+            return offset, None
+        if self._lines is None:
+            self._lines = LineIndex(self._source)
+        return offset, self._lines
+
+    def _recovered(self, error: ParserSyntaxError) -> None:
+        """
+        Record an error the parser is about to recover from.
+
+        Raises:
+            _StopParsing: Once max_errors is reached, or on a second error
+                at the end of the file, where each unclosed block would
+                otherwise report the same missing brace again
+        """
+        at_end = self._code == TokenCode.EOF
+        if at_end and self.errors and self._eof_error:
+            raise _StopParsing()
+        self._eof_error = at_end
+        self.errors.append(error)
+        if self.listener is not None:
+            self.listener.error(error)
+        if len(self.errors) >= self.max_errors:
+            raise _StopParsing()
+
+    def _skip(self) -> None:
+        """Discard the current token while recovering."""
+        code = self._code
+        if code == TokenCode.LBRACE:
+            self._depth += 1
+        elif code == TokenCode.RBRACE and self._depth > 0:
+            self._depth -= 1
+        self._previous = self._current
+        self.current_index += 1
+        self._advance()
+
+    def _skip_statement(self, depth: int) -> None:
+        """
+        Skip the rest of a broken statement in a block at the given depth.
+
+        Stops after a ';' or in front of the block's '}' or a statement
+        keyword that follows a nested block, leaving the block to carry on.
+        """
+        while self._code != TokenCode.EOF:
+            code = self._code
+            if self._depth == depth:
+                if code == TokenCode.RBRACE:
+                    return
+                if code == TokenCode.SEMICOLON:
+                    self._skip()
+                    return
+            self._skip()
+            if (code == TokenCode.RBRACE and self._depth == depth and
+                    self._code == TokenCode.KEYWORD and
+                    self._text() in STATEMENT_KEYWORDS):
+                return
+
+    def _skip_function(self, first: int) -> None:
+        """
+        Skip the rest of a broken function that started at token index first.
+
+        Stops at the next keyword outside all braces, which starts the
+        next function.
+        """
+        while self._code != TokenCode.EOF:
+            if (self._depth == 0 and self._code == TokenCode.KEYWORD and
+                    self.current_index > first):
+                return
+            self._skip()
 
-    def parse_function(self) -> None:
+    def parse_function(self) -> Function:
         """
         Parse a function declaration.
         Grammar: DataType ID ( ) Block
         """
-        if not self.match(TokenType.KEYWORD):
+        start = self._start()
+        type_token = self._current
+        if not self.match(TokenCode.KEYWORD):
             self.error("Data Type of Function")
-        if not self.match(TokenType.ID):
+        name_token = self._current
+        if not self.match(TokenCode.ID):
             self.error("Name of Function")
-        if not self.match(TokenType.LPAREN):
+        if not self.match(TokenCode.LPAREN):
             self.error("(")
-        if not self.match(TokenType.RPAREN):
+        if not self.match(TokenCode.RPAREN):
             self.error(")")
 
-        self.parse_block()
+        body = self.parse_block()
+        return Function(self._token_text(type_token), self._token_text(name_token),
+                        body, start, self._end())
 
-    def parse_block(self) -> None:
+    def parse_block(self) -> Block:
         """
         Parse a block of statements.
         Grammar: { Statement* ReturnStatement? }
         """
-        if not self.match(TokenType.LBRACE):
+        start = self._start()
+        if not self.match(TokenCode.LBRACE):
             self.error("{")
+        self._depth += 1
+        depth = self._depth
 
         # Parse statements while we have if, for, declarations, or assignments
-        while (self.current_index < len(self.tokens) and
-               (self._is_token("if") or
-                self._is_token("for") or
-                (self.tokens[self.current_index][0] == TokenType.KEYWORD and
-                 not self._is_token("return")) or
-                self.tokens[self.current_index][0] == TokenType.ID)):
-            self.parse_statement()
+        statements = []
+        while (self._is_keyword("if") or
+               self._is_keyword("for") or
+               (self._code == TokenCode.KEYWORD and
+                not self._is_keyword("return")) or
+               self._code == TokenCode.ID):
+            try:
+                statements.append(self.parse_statement())
+            except ParserSyntaxError as e:
+                if not self.recover:
+                    raise
+                self._recovered(e)
+                self._skip_statement(depth)
 
         # Parse return statement if present
-        if (self.current_index < len(self.tokens) and
-                self._is_token("return")):
-            self.match(TokenType.KEYWORD)
-            if not self.match(TokenType.NUMBER):
+        ret = None
+        if self._is_keyword("return"):
+            return_start = self._start()
+            self.match(TokenCode.KEYWORD)
+            value = self._current
+            if not self.match(TokenCode.NUMBER):
                 self.error("Number")
-            if not self.match(TokenType.SEMICOLON):
+            if not self.match(TokenCode.SEMICOLON):
                 self.error("Semicolon")
+            ret = Return(Number(self._token_text(value), value[2], value[3]),
+                         return_start, self._end())
 
-        if not self.match(TokenType.RBRACE):
+        if not self.match(TokenCode.RBRACE):
             self.error("}")
+        self._depth -= 1
+        return Block(statements, ret, start, self._end())
 
-    def parse_statement(self) -> None:
+    def parse_statement(self) -> Optional[Node]:
         """Parse a statement (if, for, declaration, or assignment)."""
-        if self.current_index >= len(self.tokens):
-            return
+        if self._code == TokenCode.EOF:
+            return None
         
-        if self._is_token("if"):
-            self.parse_if_statement()
-        elif self._is_token("for"):
-            self.parse_for_loop()
-        elif (self.tokens[self.current_index][0] == TokenType.KEYWORD and
-              self._is_token("int")):
-            self.parse_declaration()
-        elif self.tokens[self.current_index][0] == TokenType.ID:
-            self.parse_assignment()
-
-    def parse_if_statement(self) -> None:
+        if self._is_keyword("if"):
+            return self.parse_if_statement()
+        elif self._is_keyword("for"):
+            return self.parse_for_loop()
+        elif self._is_keyword("int"):
+            return self.parse_declaration()
+        elif self._code == TokenCode.ID:
+            return self.parse_assignment()
+        else:
+            # Any other keyword cannot start a statement; consuming nothing
+            # here would make parse_block spin on the same token forever.
+            self.error("Statement")
+
+    def parse_if_statement(self) -> If:
         """
         Parse an if statement.
         Grammar: if ( Expression ) Block [else Block]
         """
-        self.match(TokenType.KEYWORD)
-        self.match(TokenType.LPAREN)
-        self.parse_expression()
-        self.match(TokenType.RPAREN)
-        self.parse_block()
+        start = self._start()
+        self.match(TokenCode.KEYWORD)
+        self.match(TokenCode.LPAREN)
+        condition = self.parse_expression()
+        self.match(TokenCode.RPAREN)
+        then_block = self.parse_block()
         
         # Optional else clause
-        if (self.current_index < len(self.tokens) and
-                self._is_token("else")):
-            self.match(TokenType.KEYWORD)
-            self.parse_block()
+        else_block = None
+        if self._is_keyword("else"):
+            self.match(TokenCode.KEYWORD)
+            else_block = self.parse_block()
+        return If(condition, then_block, else_block, start, self._end())
 
-    def parse_for_loop(self) -> None:
+    def parse_for_loop(self) -> For:
         """
         Parse a for loop.
         Grammar: for ( Declaration Expression ; Assignment ) Block
         """
-        self.match(TokenType.KEYWORD)
-        self.match(TokenType.LPAREN)
-        self.parse_declaration()
-        self.parse_expression()
-        self.match(TokenType.SEMICOLON)
-        self.parse_assignment()
-        self.match(TokenType.RPAREN)
-        self.parse_block()
-
-    def parse_declaration(self) -> None:
+        start = self._start()
+        self.match(TokenCode.KEYWORD)
+        self.match(TokenCode.LPAREN)
+        init = self.parse_declaration()
+        condition = self.parse_expression()
+        self.match(TokenCode.SEMICOLON)
+        update = self.parse_assignment()
+        self.match(TokenCode.RPAREN)
+        body = self.parse_block()
+        return For(init, condition, update, body, start, self._end())
+
+    def parse_declaration(self) -> Declaration:
         """
         Parse a variable declaration.
         Grammar: int ID [= Expression] ;
         """
-        if not self.match(TokenType.KEYWORD):
+        start = self._start()
+        type_token = self._current
+        if not self.match(TokenCode.KEYWORD):
             self.error("Data Type")
-        if not self.match(TokenType.ID):
+        name_token = self._current
+        if not self.match(TokenCode.ID):
             self.error("ID")
         
         # Optional assignment
-        if (self.current_index < len(self.tokens) and
-                self._is_assign_operator()):
-            if not (self.match(TokenType.ASSIGN) or
-                    self.match(TokenType.ADD_ASSIGN) or
-                    self.match(TokenType.SUB_ASSIGN) or
-                    self.match(TokenType.MUL_ASSIGN) or
-                    self.match(TokenType.DIV_ASSIGN)):
+        operator = None
+        value = None
+        if self._is_assign_operator():
+            operator = self._text()
+            if not (self.match(TokenCode.ASSIGN) or
+                    self.match(TokenCode.ADD_ASSIGN) or
+                    self.match(TokenCode.SUB_ASSIGN) or
+                    self.match(TokenCode.MUL_ASSIGN) or
+                    self.match(TokenCode.DIV_ASSIGN)):
                 self.error("Assignment operator")
             
-            if not (self.match(TokenType.ID) or self.match(TokenType.NUMBER)):
-                self.error("ID or Number")
-            
-            # Parse additional expression terms
-            while (self.current_index < len(self.tokens) and
-                   self.tokens[self.current_index][0] != TokenType.SEMICOLON):
-                if not (self.match("Plus") or
-                        self.match("Mul") or
-                        self.match("Minus") or
-                        self.match("Div")):
-                    self.error("Operator")
-
-                if not (self.match(TokenType.ID) or self.match(TokenType.NUMBER)):
-                    self.error("ID or Number")
-
-        if not self.match(TokenType.SEMICOLON):
+            value = self.parse_expression()
+
+        if not self.match(TokenCode.SEMICOLON):
             self.error("Semicolon")
+        return Declaration(self._token_text(type_token), self._token_text(name_token),
+                           operator, value, start, self._end())
 
-    def parse_assignment(self) -> None:
+    def parse_assignment(self) -> Assignment:
         """
         Parse an assignment statement.
         Grammar: ID [++|--] | ID [= | += | -= | *= | /=] Expression ;
         """
-        if not self.match(TokenType.ID):
+        start = self._start()
+        name_token = self._current
+        if not self.match(TokenCode.ID):
             self.error("ID")
+        name = self._token_text(name_token)
 
-        if self.current_index >= len(self.tokens):
+        if self._code == TokenCode.EOF:
             self.error("Semicolon or operator")
 
         # Handle increment/decrement operators (x++ or x--)
-        if self._is_token("++") or self._is_token("--"):
-            if not (self.match(TokenType.INCREASE) or self.match(TokenType.DECREASE)):
+        if self._code == TokenCode.INCREASE or self._code == TokenCode.DECREASE:
+            operator = self._text()
+            if not (self.match(TokenCode.INCREASE) or self.match(TokenCode.DECREASE)):
                 self.error("Increment or decrement operator")
+            end = self._end()
             
             # Check if we're in a for loop (next token might be )
-            if (self.current_index < len(self.tokens) and
-                    self._is_token(")")):
-                return
+            if self._code == TokenCode.RPAREN:
+                return Assignment(name, operator, None, start, end)
             
-            if not self.match(TokenType.SEMICOLON):
+            if not self.match(TokenCode.SEMICOLON):
                 self.error("Semicolon")
-            return
+            return Assignment(name, operator, None, start, self._end())
 
         # Handle assignment operators (=, +=, -=, *=, /=)
         if self._is_assign_operator():
-            if not (self.match(TokenType.ASSIGN) or
-                    self.match(TokenType.ADD_ASSIGN) or
-                    self.match(TokenType.SUB_ASSIGN) or
-                    self.match(TokenType.MUL_ASSIGN) or
-                    self.match(TokenType.DIV_ASSIGN)):
+            operator = self._text()
+            if not (self.match(TokenCode.ASSIGN) or
+                    self.match(TokenCode.ADD_ASSIGN) or
+                    self.match(TokenCode.SUB_ASSIGN) or
+                    self.match(TokenCode.MUL_ASSIGN) or
+                    self.match(TokenCode.DIV_ASSIGN)):
                 self.error("Assignment operator")
             
-            if not (self.match(TokenType.ID) or self.match(TokenType.NUMBER)):
-                self.error("ID or Number")
-
-            # Parse additional expression terms
-            while (self.current_index < len(self.tokens) and
-                   self.tokens[self.current_index][0] != TokenType.SEMICOLON):
-                if not (self.match(TokenType.PLUS) or
-                        self.match(TokenType.MUL) or
-                        self.match(TokenType.MINUS) or
-                        self.match(TokenType.DIV)):
-                    self.error("Operator")
-
-                if not (self.match(TokenType.ID) or self.match(TokenType.NUMBER)):
-                    self.error("ID or Number")
-
-            if not self.match(TokenType.SEMICOLON):
+            value = self.parse_expression()
+
+            if not self.match(TokenCode.SEMICOLON):
                 self.error("Semicolon")
+            return Assignment(name, operator, value, start, self._end())
+
+        # A bare identifier is accepted as a statement of its own
+        return Assignment(name, None, None, start, self._end())
 
-    def parse_expression(self) -> None:
+    def parse_expression(self) -> Node:
         """
-        Parse a comparison expression.
-        Grammar: (ID | Number) ComparisonOperator (ID | Number)
+        Parse an expression by precedence climbing.
+        Grammar: Unary (BinaryOperator Unary)*
+                 Unary: (! | -) Unary | ID | Number | ( Expression )
+
+        Operators and operands are kept on explicit stacks rather than the
+        call stack, so the time taken is linear in the length of the
+        expression and its nesting depth is not limited by recursion. The
+        expression ends at the first token that cannot continue it; a ')'
+        that closes no '(' of its own is left for the caller.
         """
-        if not (self.match(TokenType.ID) or self.match(TokenType.NUMBER)):
-            self.error("ID or Number")
-
-        if not (self.match(TokenType.LESS) or
-                self.match(TokenType.LESSER) or
-                self.match(TokenType.EQUAL) or
-                self.match(TokenType.GREAT) or
-                self.match(TokenType.GREATER) or
-                self.match(TokenType.NOT_EQU)):
-            self.error("Comparison operator")
-
-        if not (self.match(TokenType.ID) or self.match(TokenType.NUMBER)):
-            self.error("ID or Number")
-
-    def _is_token(self, value: str) -> bool:
-        """Check if current token has the given value."""
-        return (self.current_index < len(self.tokens) and
-                self.tokens[self.current_index][1] == value)
+        operands = []
+        # (precedence, operator, start or token code); precedence 0 is a '('
+        operators = []
+        open_parens = 0
+        precedence_of = BINARY_PRECEDENCE.get
+        while True:
+            # Operand position: prefix operators and '(' pile up until an
+            # operand arrives.
+            token = self._current
+            code = self._code
+            if code == TokenCode.ID:
+                self.match(TokenCode.ID)
+                operands.append(Identifier(self._token_text(token), token[2], token[3]))
+            elif code == TokenCode.NUMBER:
+                self.match(TokenCode.NUMBER)
+                operands.append(Number(self._token_text(token), token[2], token[3]))
+            elif code in UNARY_OPERATORS:
+                self.match(code)
+                operators.append((UNARY_PRECEDENCE, OPERATOR_TEXT[code], token[2]))
+                continue
+            elif code == TokenCode.LPAREN:
+                self.match(TokenCode.LPAREN)
+                operators.append((0, "(", token[2]))
+                open_parens += 1
+                continue
+            else:
+                self.error("Expression")
+
+            # Operator position: close parentheses, then either continue
+            # with a binary operator or end the expression.
+            while True:
+                code = self._code
+                precedence = precedence_of(code)
+                if precedence is not None:
+                    self._reduce(operands, operators, precedence)
+                    self.match(code)
+                    operators.append((precedence, OPERATOR_TEXT[code], code))
+                    break
+                if code == TokenCode.RPAREN and open_parens:
+                    self._reduce(operands, operators, 1)
+                    operators.pop()
+                    open_parens -= 1
+                    self.match(TokenCode.RPAREN)
+                    continue
+                if open_parens:
+                    self.error(")")
+                self._reduce(operands, operators, 1)
+                return operands[0]
+
+    def _reduce(self, operands: List[Node], operators: list, precedence: int) -> None:
+        """Apply stacked operators that bind at least as tightly as precedence."""
+        while operators and operators[-1][0] >= precedence:
+            level, operator, extra = operators.pop()
+            right = operands.pop()
+            if level == UNARY_PRECEDENCE:
+                operands.append(UnaryOp(operator, right, extra, right.end))
+            else:
+                left = operands.pop()
+                node_class = Compare if extra in COMPARISON_OPERATORS else BinaryOp
+                operands.append(node_class(operator, left, right, left.start, right.end))
+
+    def _start(self) -> int:
+        """Return the start offset of the current token, or -1."""
+        return self._current[2] if self._current is not None else -1
+
+    def _end(self) -> int:
+        """Return the end offset of the last consumed token, or -1."""
+        return self._previous[3] if self._previous is not None else -1
+
+    def _token_text(self, token: CodedToken) -> str:
+        """Return the text of a token captured before it was consumed."""
+        if token[1] is not None:
+            return token[1]
+        text = self._source[token[2]:token[3]]
+        if not isinstance(text, str):
+            text = text.decode("ascii")
+        # Token streams keep no text; names are interned as the scanners do.
+        return sys.intern(text) if token[0] == TokenCode.ID else text
+
+    def _is_keyword(self, value: str) -> bool:
+        """Check if current token is the given keyword."""
+        return self._code == TokenCode.KEYWORD and self._text() == value
 
     def _is_assign_operator(self) -> bool:
         """Check if current token is an assignment operator."""
-        if self.current_index >= len(self.tokens):
-            return False
-        token_value = self.tokens[self.current_index][1]
-        return token_value in ["=", "+=", "-=", "*=", "/=", "%="]
+        return self._code in ASSIGN_OPERATORS
 
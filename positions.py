@@ -0,0 +1,75 @@
+"""Mapping between source offsets and line/column positions."""
+
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+# Characters counted at a time in a source that has no count() of its own,
+# such as a memory-mapped file, so no copy of the whole prefix is made.
+_COUNT_CHUNK = 1 << 20
+
+
+class LineIndex:
+    """
+    Converts character offsets into 1-based (line, column) positions.
+
+    Nothing is computed until a position is asked for. The first lookup
+    counts line breaks in bulk, which is all a single error message needs;
+    from the second on, the offsets of all line starts are found once and
+    each lookup is a binary search, so reporting many diagnostics for one
+    file stays cheap. The source may also be ASCII bytes, such as a mapped
+    file, in which case offsets and columns count bytes.
+    """
+
+    def __init__(self, source: str):
+        """
+        Prepare to index the line starts of a source.
+
+        Args:
+            source: The source code, as str or bytes
+        """
+        self.source = source
+        self._newline = "\n" if isinstance(source, str) else b"\n"
+        self._line_starts: Optional[List[int]] = None
+        self._lookups: int = 0
+
+    @property
+    def line_starts(self) -> List[int]:
+        """Offsets of the first character of every line, built on first use."""
+        if self._line_starts is None:
+            line_starts = [0]
+            find = self.source.find
+            newline_char = self._newline
+            newline = find(newline_char)
+            while newline >= 0:
+                line_starts.append(newline + 1)
+                newline = find(newline_char, newline + 1)
+            self._line_starts = line_starts
+        return self._line_starts
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        """
+        Return the position of a character offset.
+
+        Args:
+            offset: Offset into the source; len(source) means end of file
+
+        Returns:
+            (line, column), both starting at 1
+        """
+        self._lookups += 1
+        if self._line_starts is None and self._lookups == 1:
+            line_start = self.source.rfind(self._newline, 0, offset) + 1
+            return self._count_newlines(offset) + 1, offset - line_start + 1
+        line_starts = self.line_starts
+        line = bisect_right(line_starts, offset)
+        return line, offset - line_starts[line - 1] + 1
+
+    def _count_newlines(self, offset: int) -> int:
+        """Return the number of line breaks before offset."""
+        source = self.source
+        if hasattr(source, "count"):
+            return source.count(self._newline, 0, offset)
+        count = 0
+        for start in range(0, offset, _COUNT_CHUNK):
+            count += source[start:min(offset, start + _COUNT_CHUNK)].count(self._newline)
+        return count
@@ -0,0 +1,266 @@
+"""Opt-in profiling of compile phases, scanner helpers and parser rules."""
+
+import json
+import marshal
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from scanner import Scanner, SCANNER_HELPERS
+from lexer import Lexer
+from parser import Parser, RULES
+from ll1 import LL1Parser
+from semantic import SemanticAnalyzer
+from tokens import TOKEN_NAMES
+from errors import FileError, SemanticError, SyntaxError
+
+
+# pstats identifies a function by (file name, first line, function name).
+FunctionKey = Tuple[str, int, str]
+
+
+class FunctionStats:
+    """Call counts and times of one instrumented function."""
+
+    __slots__ = ("calls", "primitive_calls", "own_time", "cumulative_time",
+                 "callers")
+
+    def __init__(self):
+        self.calls: int = 0
+        # Calls that were not recursive; only these add to cumulative_time.
+        self.primitive_calls: int = 0
+        self.own_time: float = 0.0
+        self.cumulative_time: float = 0.0
+        # Caller key -> [calls, primitive calls, own time, cumulative time]
+        self.callers: Dict[FunctionKey, List[float]] = {}
+
+
+class Profiler:
+    """
+    Collects phase timings, per-function statistics and token counts.
+
+    Nothing is measured unless a Profiler is created: functions are timed by
+    wrapping the methods of one Scanner or Parser instance, the same way
+    Parser attaches a ParseListener, so uninstrumented objects run exactly
+    as before.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        """
+        Initialize an empty profile.
+
+        Args:
+            clock: Function returning the current time in seconds
+        """
+        self.clock = clock
+        self.phases: Dict[str, float] = {}
+        self.functions: Dict[FunctionKey, FunctionStats] = {}
+        self.token_counts: Counter = Counter()
+        # [key, time spent in instrumented callees] per active call
+        self._stack: List[list] = []
+        self._depth: Dict[FunctionKey, int] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a block of code as the named phase, even if it raises."""
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + self.clock() - started
+
+    def instrument(self, obj: Any, names: Iterable[str]) -> None:
+        """
+        Time the named methods of one object.
+
+        Args:
+            obj: Instance whose methods to wrap
+            names: Method names; the wrappers are bound on obj only
+        """
+        for name in names:
+            method = getattr(obj, name)
+            code = method.__code__
+            key = (code.co_filename, code.co_firstlineno,
+                   f"{type(obj).__name__}.{name}")
+            setattr(obj, name, self._timed(key, method))
+
+    def _timed(self, key: FunctionKey, method):
+        """Wrap a method so every call is recorded under key."""
+        stack = self._stack
+        depth = self._depth
+        clock = self.clock
+        record = self._record
+
+        def timed(*args, **kwargs):
+            stack.append([key, 0.0])
+            depth[key] = depth.get(key, 0) + 1
+            started = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - started
+                _, inner = stack.pop()
+                depth[key] -= 1
+                caller = None
+                if stack:
+                    caller = stack[-1][0]
+                    stack[-1][1] += elapsed
+                record(key, caller, elapsed, elapsed - inner, depth[key] == 0)
+
+        return timed
+
+    def _record(self, key: FunctionKey, caller: Optional[FunctionKey],
+                elapsed: float, own: float, outermost: bool) -> None:
+        stats = self.functions.get(key)
+        if stats is None:
+            stats = self.functions[key] = FunctionStats()
+        stats.calls += 1
+        stats.own_time += own
+        if outermost:
+            stats.primitive_calls += 1
+            stats.cumulative_time += elapsed
+        if caller is not None:
+            entry = stats.callers.get(caller)
+            if entry is None:
+                entry = stats.callers[caller] = [0, 0, 0.0, 0.0]
+            entry[0] += 1
+            entry[2] += own
+            if outermost:
+                entry[1] += 1
+                entry[3] += elapsed
+
+    def count_tokens(self, token_types: Iterable[str]) -> None:
+        """Add token types (TokenType values) to the token counts."""
+        self.token_counts.update(token_types)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Return the profile as JSON-serialisable data.
+
+        Returns:
+            A dict with "phases" (seconds per phase), "functions" (calls,
+            primitive calls, own and cumulative seconds, sorted by
+            cumulative time) and "tokens" (count per token type)
+        """
+        functions = [
+            {
+                "function": key[2],
+                "file": key[0],
+                "line": key[1],
+                "calls": stats.calls,
+                "primitive_calls": stats.primitive_calls,
+                "own_time": stats.own_time,
+                "cumulative_time": stats.cumulative_time,
+            }
+            for key, stats in self.functions.items()
+        ]
+        functions.sort(key=lambda entry: entry["cumulative_time"], reverse=True)
+        return {
+            "phases": dict(self.phases),
+            "functions": functions,
+            "tokens": dict(self.token_counts.most_common()),
+        }
+
+    def write_json(self, path: str) -> None:
+        """Write to_dict() to a file."""
+        with open(path, 'w', encoding='utf-8') as file_writer:
+            json.dump(self.to_dict(), file_writer, indent=2)
+
+    def dump_stats(self, path: str) -> None:
+        """
+        Write the profile in the format of cProfile.Profile.dump_stats().
+
+        The file loads with pstats.Stats(path). Phases appear as functions
+        named after them, in a pseudo file "<phase>".
+        """
+        stats = {}
+        for key, entry in self.functions.items():
+            callers = {caller: tuple(values) for caller, values in entry.callers.items()}
+            stats[key] = (entry.primitive_calls, entry.calls, entry.own_time,
+                          entry.cumulative_time, callers)
+        for name, seconds in self.phases.items():
+            stats[("<phase>", 0, name)] = (1, 1, seconds, seconds, {})
+        with open(path, 'wb') as file_writer:
+            marshal.dump(stats, file_writer)
+
+
+def profile_source(source: str, profiler: Profiler, scanner: str = "lexer",
+                   max_errors: int = 1
+                   ) -> Tuple[List[SyntaxError], List[SemanticError]]:
+    """
+    Scan, parse and check source, recording everything in profiler.
+
+    Scanning and parsing run one after the other rather than interleaved,
+    so each phase gets its own time.
+
+    Args:
+        source: The source code
+        profiler: Profiler to record into
+        scanner: "lexer" for the Lexer main.py uses, or "scanner" for the
+            reference Scanner, whose helper methods are timed one by one
+        max_errors: Syntax errors to report; above 1 the parser recovers
+            from each error and keeps going. Semantic errors are limited
+            the same way
+
+    Returns:
+        The syntax errors recovered from and, if there were none, the
+        semantic errors found
+
+    Raises:
+        LexicalError, SyntaxError: As the compile would
+    """
+    with profiler.phase("scan"):
+        if scanner == "scanner":
+            lexer = Scanner(source)
+            profiler.instrument(lexer, SCANNER_HELPERS)
+            tokens = lexer.scan()
+        elif scanner == "lexer":
+            tokens = Lexer(source).scan_stream()
+        else:
+            raise ValueError(f"Unknown scanner '{scanner}'")
+
+    if scanner == "scanner":
+        profiler.count_tokens(token_type for token_type, _ in tokens)
+    else:
+        profiler.count_tokens(TOKEN_NAMES[code] for code in tokens.codes)
+
+    with profiler.phase("parse"):
+        parser = Parser(tokens, recover=max_errors > 1, max_errors=max_errors)
+        profiler.instrument(parser, RULES)
+        try:
+            program = parser.parse()
+        except RecursionError:
+            # Too deep for the recursive parser, as in main(); keep the
+            # errors recovered before the overflow, and with none let the
+            # table-driven one give the verdict without recursing.
+            if not parser.errors:
+                LL1Parser(tokens).parse()
+            program = None
+    if parser.errors or program is None:
+        return parser.errors, []
+
+    with profiler.phase("semantic"):
+        return [], SemanticAnalyzer(source, max_errors).analyze(program)
+
+
+def profile_file(path: str, profiler: Profiler, scanner: str = "lexer",
+                 max_errors: int = 1
+                 ) -> Tuple[List[SyntaxError], List[SemanticError]]:
+    """
+    Read, scan, parse and check a file, recording everything in profiler.
+
+    Returns:
+        The syntax errors recovered from and the semantic errors found, as
+        profile_source returns them
+
+    Raises:
+        FileError, LexicalError, SyntaxError: As the compile would
+    """
+    with profiler.phase("read"):
+        try:
+            with open(path, 'r', encoding='utf-8') as file_reader:
+                source = file_reader.read()
+        except IOError as e:
+            raise FileError(f"Cannot open file: {path}", 0, 0) from e
+    return profile_source(source, profiler, scanner, max_errors)
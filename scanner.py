@@ -1,12 +1,28 @@
 """Lexical analyzer (scanner) for the compiler."""
 
-from typing import List, Tuple, Optional
-from tokens import TokenType, KEYWORDS, get_special_character, get_operator
+import sys
+from typing import Iterator, List, Tuple, Optional
+from tokens import (TokenType, KEYWORDS, TOKEN_CODES, TOKEN_NAMES,
+                    get_special_character, get_operator)
+from positions import LineIndex
 from errors import LexicalError
 
 
+# Helper methods that do the scanning work, for profilers to instrument.
+SCANNER_HELPERS = (
+    "_handle_whitespace", "_handle_comments", "_scan_identifier_or_keyword",
+    "_scan_number", "_scan_operator",
+)
+
+
 class Scanner:
-    """Scans source code and converts it into tokens."""
+    """
+    Scans source code and converts it into tokens.
+
+    Only the offset into the source is tracked while scanning; an error
+    carries its offset, and the line and column are worked out from the
+    source when the error is reported.
+    """
 
     def __init__(self, source_code: str):
         """
@@ -18,8 +34,12 @@ class Scanner:
         self.tokens: List[Tuple[str, str]] = []
         self.src: str = source_code
         self.pointer: int = 0
-        self.line: int = 1
-        self.column: int = 1
+        self.lines: LineIndex = LineIndex(source_code)
+
+    @property
+    def source(self) -> str:
+        """The source code, under the name Parser looks for."""
+        return self.src
 
     def scan(self) -> List[Tuple[str, str]]:
         """
@@ -31,6 +51,34 @@ class Scanner:
         Raises:
             LexicalError: If an invalid character is encountered
         """
+        self.tokens.extend(self.iter_tokens())
+        return self.tokens
+
+    def iter_tokens(self) -> Iterator[Tuple[str, str]]:
+        """
+        Yield tokens one at a time as they are scanned.
+        
+        Yields:
+            Tuples containing (token_type, token_value)
+            
+        Raises:
+            LexicalError: If an invalid character is encountered
+        """
+        names = TOKEN_NAMES
+        for code, value, _, _ in self.iter_coded():
+            yield (names[code], value)
+
+    def iter_coded(self) -> Iterator[Tuple[int, str, int, int]]:
+        """
+        Yield (code, value, start, end) for each token as it is scanned.
+
+        This is the form Parser consumes directly, so syntax errors get the
+        positions of the tokens they are reported at.
+
+        Raises:
+            LexicalError: If an invalid character is encountered
+        """
+        codes = TOKEN_CODES
         while not self.is_eof():
             # Skip whitespace and handle comments
             if self.src[self.pointer].isspace():
@@ -44,30 +92,24 @@ class Scanner:
             if self.is_eof():
                 break
             
+            start = self.pointer
             c = self.src[self.pointer]
             self.pointer += 1
-            self.column += 1
 
             if c.isalpha():
                 token = self._scan_identifier_or_keyword(c)
-                self.tokens.append(token)
             elif get_special_character(c):
-                token_type = get_special_character(c)
-                self.tokens.append((token_type, c))
-            elif get_operator(c):
+                token = (get_special_character(c), c)
+            elif get_operator(c) or get_operator(c + self.src[self.pointer:self.pointer + 1]):
+                # The second test admits && and ||, whose first character
+                # is not an operator on its own.
                 token = self._scan_operator(c)
-                self.tokens.append(token)
             elif c.isnumeric():
                 token = self._scan_number(c)
-                self.tokens.append(token)
             else:
-                raise LexicalError(
-                    f"Invalid character '{c}'",
-                    self.line,
-                    self.column - 1
-                )
-
-        return self.tokens
+                raise LexicalError(f"Invalid character '{c}'",
+                                   offset=start, lines=self.lines)
+            yield (codes[token[0]], token[1], start, self.pointer)
 
     def _scan_identifier_or_keyword(self, first_char: str) -> Tuple[str, str]:
         """Scan an identifier or keyword."""
@@ -76,8 +118,10 @@ class Scanner:
         while not self.is_eof() and (self.src[self.pointer].isalnum() or self.src[self.pointer] == '_'):
             token_string += self.src[self.pointer]
             self.pointer += 1
-            self.column += 1
         
+        # Interned, so every occurrence of a name is the same string object
+        # and later dict lookups compare by identity.
+        token_string = sys.intern(token_string)
         if token_string in KEYWORDS:
             return (TokenType.KEYWORD, token_string)
         else:
@@ -95,7 +139,6 @@ class Scanner:
         two_char = first_char + self.src[self.pointer]
         if get_operator(two_char):
             self.pointer += 1
-            self.column += 1
             return (get_operator(two_char), two_char)
         
         # Single character operator
@@ -113,18 +156,12 @@ class Scanner:
         while not self.is_eof() and self.src[self.pointer].isnumeric():
             token_string += self.src[self.pointer]
             self.pointer += 1
-            self.column += 1
         
         return (TokenType.NUMBER, token_string)
 
     def _handle_whitespace(self) -> None:
-        """Handle whitespace characters and update line/column tracking."""
+        """Skip whitespace characters."""
         while not self.is_eof() and self.src[self.pointer].isspace():
-            if self.src[self.pointer] == '\n':
-                self.line += 1
-                self.column = 1
-            else:
-                self.column += 1
             self.pointer += 1
 
     def _handle_comments(self) -> bool:
@@ -144,49 +181,21 @@ class Scanner:
         
         # Check for single-line comment //
         if next_char == '/':
-            # Skip // and rest of line
-            self.pointer += 2
-            self.column += 2
-            while not self.is_eof() and self.src[self.pointer] != '\n':
-                self.pointer += 1
-                self.column += 1
-            
-            # Skip the newline
-            if not self.is_eof():
-                self.pointer += 1
-                self.line += 1
-                self.column = 1
+            # Skip // and rest of line, including the newline
+            newline = self.src.find('\n', self.pointer + 2)
+            self.pointer = len(self.src) if newline < 0 else newline + 1
             return True
         
         # Check for multi-line comment /*
         if next_char == '*':
-            # Skip /*
-            self.pointer += 2
-            self.column += 2
-            
-            # Find closing */
-            while not self.is_eof():
-                if self.src[self.pointer] == '\n':
-                    self.line += 1
-                    self.column = 1
-                else:
-                    self.column += 1
-                
-                if (self.src[self.pointer] == '*' and 
-                    self._check_bounds(1) and 
-                    self.src[self.pointer + 1] == '/'):
-                    self.pointer += 2
-                    self.column += 2
-                    return True
-                
-                self.pointer += 1
-            
-            # Reached EOF without closing comment
-            raise LexicalError(
-                "Unclosed multi-line comment",
-                self.line,
-                self.column
-            )
+            # Skip /* and find closing */
+            close = self.src.find('*/', self.pointer + 2)
+            if close < 0:
+                self.pointer = len(self.src)
+                raise LexicalError("Unclosed multi-line comment",
+                                   offset=self.pointer, lines=self.lines)
+            self.pointer = close + 2
+            return True
         
         return False
 
@@ -0,0 +1,274 @@
+"""Semantic analysis: scoped symbol tables and name checks over the syntax tree."""
+
+import argparse
+import sys
+from typing import Dict, List, Optional
+
+import arith
+from lexer import Lexer
+from parser import Parser
+from positions import LineIndex
+from syntax_tree import (Program, Function, Block, If, For, Declaration,
+                         Assignment, UnaryOp, BinaryOp, Compare, Identifier,
+                         Number)
+from errors import CompilerError, FileError, SemanticError
+
+
+class ScopeKind:
+    """Kinds of scope a symbol can be declared in."""
+    FUNCTION = "function"
+    BLOCK = "block"
+    FOR = "for"
+
+
+class Symbol:
+    """
+    A declared name.
+
+    Attributes:
+        name: The identifier
+        kind: "function" or "variable"
+        start: Source offset of the declaration
+        level: Nesting level of the scope it was declared in, 0 for functions
+        references: How many times the name was used
+    """
+
+    __slots__ = ("name", "kind", "start", "level", "references")
+
+    def __init__(self, name: str, kind: str, start: int, level: int):
+        self.name: str = name
+        self.kind: str = kind
+        self.start: int = start
+        self.level: int = level
+        self.references: int = 0
+
+    def __repr__(self) -> str:
+        return f"Symbol({self.name!r}, {self.kind!r}, start={self.start}, level={self.level})"
+
+
+class SymbolTable:
+    """
+    A stack of scopes, each a dict from name to Symbol.
+
+    Besides the stack, every visible name maps to the list of its symbols,
+    innermost last, so a lookup is one dict access however deep the
+    nesting, and leaving a scope costs one pop per name it declared.
+    """
+
+    def __init__(self):
+        self.scopes: List[Dict[str, Symbol]] = []
+        self.kinds: List[str] = []
+        self._visible: Dict[str, List[Symbol]] = {}
+
+    @property
+    def level(self) -> int:
+        """Number of open scopes."""
+        return len(self.scopes)
+
+    def enter(self, kind: str) -> None:
+        """Open a scope of the given ScopeKind."""
+        self.scopes.append({})
+        self.kinds.append(kind)
+
+    def exit(self) -> None:
+        """Close the innermost scope."""
+        visible = self._visible
+        for name in self.scopes.pop():
+            shadowed = visible[name]
+            shadowed.pop()
+            if not shadowed:
+                del visible[name]
+        self.kinds.pop()
+
+    def declare(self, symbol: Symbol) -> Optional[Symbol]:
+        """
+        Add a symbol to the innermost scope.
+
+        Returns:
+            The symbol already declared under that name in the same scope,
+            in which case nothing is added; otherwise None
+        """
+        scope = self.scopes[-1]
+        previous = scope.get(symbol.name)
+        if previous is not None:
+            return previous
+        scope[symbol.name] = symbol
+        self._visible.setdefault(symbol.name, []).append(symbol)
+        return None
+
+    def lookup(self, name: str) -> Optional[Symbol]:
+        """Return the innermost visible symbol for a name, or None."""
+        symbols = self._visible.get(name)
+        return symbols[-1] if symbols else None
+
+
+class SemanticAnalyzer:
+    """
+    Checks names in a parsed program.
+
+    Reports variables used or assigned without a declaration, variables
+    declared twice in one scope, functions defined twice and numeric
+    literals that are not made of digits. Functions, blocks and for headers
+    each open a scope; a declaration's initializer is checked before the
+    new name comes into scope, as the backends evaluate it. The walk is
+    iterative over expressions and linear in the size of the tree.
+    """
+
+    def __init__(self, source: Optional[str] = None, max_errors: Optional[int] = None):
+        """
+        Create an analyzer.
+
+        Args:
+            source: The source the tree was parsed from, to give errors a
+                line and column
+            max_errors: Stop after this many errors; None for no limit
+        """
+        self.max_errors: Optional[int] = max_errors
+        self.errors: List[SemanticError] = []
+        self.symbols: List[Symbol] = []
+        self.functions: Dict[str, Symbol] = {}
+        self._lines: Optional[LineIndex] = LineIndex(source) if source is not None else None
+        self._table = SymbolTable()
+
+    def analyze(self, program: Program) -> List[SemanticError]:
+        """
+        Check a program.
+
+        Returns:
+            The errors found, in source order within each function
+        """
+        try:
+            for function in program.functions:
+                self._function(function)
+        except _StopAnalysis:
+            pass
+        return self.errors
+
+    def _error(self, message: str, offset: int) -> None:
+        if offset < 0:
+            self.errors.append(SemanticError(message))
+        else:
+            self.errors.append(SemanticError(message, offset=offset, lines=self._lines))
+        if self.max_errors is not None and len(self.errors) >= self.max_errors:
+            raise _StopAnalysis()
+
+    def _declare(self, name: str, kind: str, start: int) -> None:
+        symbol = Symbol(name, kind, start, self._table.level)
+        previous = self._table.declare(symbol)
+        if previous is not None:
+            self._error(f"Redeclared variable '{name}'", start)
+        else:
+            self.symbols.append(symbol)
+
+    def _use(self, name: str, start: int) -> None:
+        symbol = self._table.lookup(name)
+        if symbol is None:
+            self._error(f"Undeclared variable '{name}'", start)
+        else:
+            symbol.references += 1
+
+    def _function(self, node: Function) -> None:
+        if node.name in self.functions:
+            self._error(f"Redefined function '{node.name}'", node.start)
+        else:
+            symbol = Symbol(node.name, "function", node.start, 0)
+            self.functions[node.name] = symbol
+            self.symbols.append(symbol)
+        self._table.enter(ScopeKind.FUNCTION)
+        self._block(node.body)
+        self._table.exit()
+
+    def _block(self, block: Block) -> None:
+        self._table.enter(ScopeKind.BLOCK)
+        for statement in block.statements:
+            self._statement(statement)
+        if block.ret is not None:
+            self._expression(block.ret.value)
+        self._table.exit()
+
+    def _statement(self, node) -> None:
+        if isinstance(node, Declaration):
+            if node.value is not None:
+                self._expression(node.value)
+            self._declare(node.name, "variable", node.start)
+        elif isinstance(node, Assignment):
+            self._use(node.name, node.start)
+            if node.value is not None:
+                self._expression(node.value)
+        elif isinstance(node, If):
+            self._expression(node.condition)
+            self._block(node.then_block)
+            if node.else_block is not None:
+                self._block(node.else_block)
+        elif isinstance(node, For):
+            self._table.enter(ScopeKind.FOR)
+            self._statement(node.init)
+            self._expression(node.condition)
+            self._statement(node.update)
+            self._block(node.body)
+            self._table.exit()
+
+    def _expression(self, node) -> None:
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if isinstance(node, Identifier):
+                self._use(node.name, node.start)
+            elif isinstance(node, Number):
+                try:
+                    arith.number_value(node.value)
+                except ValueError:
+                    self._error(f"Invalid number '{node.value}'", node.start)
+            elif isinstance(node, UnaryOp):
+                pending.append(node.operand)
+            elif isinstance(node, (BinaryOp, Compare)):
+                pending.append(node.right)
+                pending.append(node.left)
+
+
+class _StopAnalysis(Exception):
+    """Raised internally once max_errors errors have been reported."""
+
+
+def analyze_source(source: str, max_errors: Optional[int] = None) -> List[SemanticError]:
+    """
+    Scan, parse and check a source.
+
+    Returns:
+        The semantic errors found
+
+    Raises:
+        LexicalError, SyntaxError: If the source does not parse
+    """
+    return SemanticAnalyzer(source, max_errors).analyze(Parser(Lexer(source)).parse())
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Check a source file and print its semantic errors.
+
+    Returns:
+        0 if the file is correct, 1 otherwise
+    """
+    arg_parser = argparse.ArgumentParser(description="Check the names used in a program.")
+    arg_parser.add_argument("path", nargs="?", default="input.txt")
+    arg_parser.add_argument("--max-errors", type=int, help="stop after this many errors")
+    args = arg_parser.parse_args(argv)
+
+    try:
+        try:
+            with open(args.path, 'r', encoding='utf-8') as file_reader:
+                source_code = file_reader.read()
+        except IOError as e:
+            raise FileError(f"Cannot open file: {args.path}", 0, 0) from e
+        errors = analyze_source(source_code, args.max_errors)
+    except CompilerError as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    for error in errors:
+        print(f"Semantic Error: {error}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
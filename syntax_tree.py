@@ -0,0 +1,238 @@
+"""Abstract syntax tree nodes built by the parser."""
+
+from typing import List, Optional
+
+
+class Node:
+    """
+    Base class for all syntax tree nodes.
+
+    Nodes use __slots__ so that a large program costs a few dozen bytes per
+    node. Every node records the source offsets of its first and last
+    character (start inclusive, end exclusive); both are -1 when the parser
+    was given tokens without offsets.
+    """
+
+    __slots__ = ("start", "end")
+    _fields = ()
+
+    def children(self) -> List["Node"]:
+        """Return the child nodes in source order."""
+        result = []
+        for name in self._fields:
+            value = getattr(self, name)
+            if isinstance(value, Node):
+                result.append(value)
+            elif isinstance(value, list):
+                result.extend(value)
+        return result
+
+    def __eq__(self, other) -> bool:
+        # Compared with an explicit stack so very deep trees do not hit the
+        # recursion limit.
+        pending = [(self, other)]
+        while pending:
+            left, right = pending.pop()
+            if type(left) is not type(right):
+                return False
+            if left.start != right.start or left.end != right.end:
+                return False
+            for name in left._fields:
+                a = getattr(left, name)
+                b = getattr(right, name)
+                if isinstance(a, Node):
+                    pending.append((a, b))
+                elif isinstance(a, list):
+                    if not isinstance(b, list) or len(a) != len(b):
+                        return False
+                    pending.extend(zip(a, b))
+                elif a != b:
+                    return False
+        return True
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Rebuild through the constructor: much faster to pickle than the
+        # default state of a __slots__ object, which matters when trees are
+        # sent back from worker processes.
+        return (type(self),
+                tuple(getattr(self, name) for name in self._fields) + (self.start, self.end))
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+class Program(Node):
+    """A whole source file: a sequence of functions."""
+    __slots__ = ("functions",)
+    _fields = ("functions",)
+
+    def __init__(self, functions: List["Function"], start: int, end: int):
+        self.functions = functions
+        self.start = start
+        self.end = end
+
+
+class Function(Node):
+    """Grammar: DataType ID ( ) Block"""
+    __slots__ = ("return_type", "name", "body")
+    _fields = ("return_type", "name", "body")
+
+    def __init__(self, return_type: str, name: str, body: "Block",
+                 start: int, end: int):
+        self.return_type = return_type
+        self.name = name
+        self.body = body
+        self.start = start
+        self.end = end
+
+
+class Block(Node):
+    """Grammar: { Statement* ReturnStatement? }"""
+    __slots__ = ("statements", "ret")
+    _fields = ("statements", "ret")
+
+    def __init__(self, statements: List[Node], ret: Optional["Return"],
+                 start: int, end: int):
+        self.statements = statements
+        self.ret = ret
+        self.start = start
+        self.end = end
+
+
+class If(Node):
+    """Grammar: if ( Expression ) Block [else Block]"""
+    __slots__ = ("condition", "then_block", "else_block")
+    _fields = ("condition", "then_block", "else_block")
+
+    def __init__(self, condition: Node, then_block: Block,
+                 else_block: Optional[Block], start: int, end: int):
+        self.condition = condition
+        self.then_block = then_block
+        self.else_block = else_block
+        self.start = start
+        self.end = end
+
+
+class For(Node):
+    """Grammar: for ( Declaration Expression ; Assignment ) Block"""
+    __slots__ = ("init", "condition", "update", "body")
+    _fields = ("init", "condition", "update", "body")
+
+    def __init__(self, init: "Declaration", condition: Node,
+                 update: "Assignment", body: Block, start: int, end: int):
+        self.init = init
+        self.condition = condition
+        self.update = update
+        self.body = body
+        self.start = start
+        self.end = end
+
+
+class Declaration(Node):
+    """Grammar: DataType ID [AssignOp Expression] ;"""
+    __slots__ = ("type_name", "name", "operator", "value")
+    _fields = ("type_name", "name", "operator", "value")
+
+    def __init__(self, type_name: str, name: str, operator: Optional[str],
+                 value: Optional[Node], start: int, end: int):
+        self.type_name = type_name
+        self.name = name
+        self.operator = operator
+        self.value = value
+        self.start = start
+        self.end = end
+
+
+class Assignment(Node):
+    """
+    Grammar: ID [++|--] | ID [= | += | -= | *= | /=] Expression ;
+
+    operator is '++' or '--' with no value for increments, and None with no
+    value for a bare identifier statement.
+    """
+    __slots__ = ("name", "operator", "value")
+    _fields = ("name", "operator", "value")
+
+    def __init__(self, name: str, operator: Optional[str],
+                 value: Optional[Node], start: int, end: int):
+        self.name = name
+        self.operator = operator
+        self.value = value
+        self.start = start
+        self.end = end
+
+
+class Return(Node):
+    """Grammar: return Number ;"""
+    __slots__ = ("value",)
+    _fields = ("value",)
+
+    def __init__(self, value: Node, start: int, end: int):
+        self.value = value
+        self.start = start
+        self.end = end
+
+
+class UnaryOp(Node):
+    """A prefix operation such as -a or !a."""
+    __slots__ = ("operator", "operand")
+    _fields = ("operator", "operand")
+
+    def __init__(self, operator: str, operand: Node, start: int, end: int):
+        self.operator = operator
+        self.operand = operand
+        self.start = start
+        self.end = end
+
+
+class BinaryOp(Node):
+    """An arithmetic or logical operation such as a + b or a && b."""
+    __slots__ = ("operator", "left", "right")
+    _fields = ("operator", "left", "right")
+
+    def __init__(self, operator: str, left: Node, right: Node,
+                 start: int, end: int):
+        self.operator = operator
+        self.left = left
+        self.right = right
+        self.start = start
+        self.end = end
+
+
+class Compare(Node):
+    """A comparison such as a < b."""
+    __slots__ = ("operator", "left", "right")
+    _fields = ("operator", "left", "right")
+
+    def __init__(self, operator: str, left: Node, right: Node,
+                 start: int, end: int):
+        self.operator = operator
+        self.left = left
+        self.right = right
+        self.start = start
+        self.end = end
+
+
+class Identifier(Node):
+    """A use of a variable name."""
+    __slots__ = ("name",)
+    _fields = ("name",)
+
+    def __init__(self, name: str, start: int, end: int):
+        self.name = name
+        self.start = start
+        self.end = end
+
+
+class Number(Node):
+    """A numeric literal, kept as its source text."""
+    __slots__ = ("value",)
+    _fields = ("value",)
+
+    def __init__(self, value: str, start: int, end: int):
+        self.value = value
+        self.start = start
+        self.end = end
@@ -0,0 +1,106 @@
+"""Compact array-backed token storage."""
+
+from array import array
+from itertools import islice, repeat
+from typing import Iterator, List, Optional, Tuple
+
+from tokens import TOKEN_NAMES
+
+
+def offset_typecode(size: int) -> str:
+    """
+    Return the array typecode for offsets into a source of size characters.
+
+    Offsets take four bytes each, or eight for a source of 4 GiB or more,
+    whose end offset four bytes cannot hold.
+    """
+    return 'I' if size < 2 ** 32 else 'Q'
+
+
+class TokenStream:
+    """
+    Stores tokens as integer type codes plus offsets into the source.
+
+    A token costs nine bytes here, or 17 for a source of 4 GiB or more,
+    instead of a tuple and a string object per token. Token text is sliced
+    out of the source only when it is asked for. Indexing and iterating
+    yield the same (token_type, token_value) tuples a token list holds, so
+    a TokenStream can stand in for one.
+    """
+
+    def __init__(self, source: str):
+        """
+        Initialize an empty stream over the given source.
+
+        Args:
+            source: The source code the token offsets point into, as str
+                or ASCII bytes
+        """
+        self.source = source
+        self._decode: bool = not isinstance(source, str)
+        typecode = offset_typecode(len(source))
+        self.codes: array = array('B')
+        self.starts: array = array(typecode)
+        self.ends: array = array(typecode)
+
+    def append(self, code: int, start: int, end: int) -> None:
+        """Add a token given its type code and source offsets."""
+        self.codes.append(code)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def type(self, index: int) -> str:
+        """Return the token type name of the token at index."""
+        return TOKEN_NAMES[self.codes[index]]
+
+    def text(self, index: int) -> str:
+        """Return the source text of the token at index."""
+        text = self.source[self.starts[index]:self.ends[index]]
+        return text.decode("ascii") if self._decode else text
+
+    def __getitem__(self, index: int) -> Tuple[str, str]:
+        return (TOKEN_NAMES[self.codes[index]], self.text(index))
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        source = self.source
+        if self._decode:
+            for code, start, end in zip(self.codes, self.starts, self.ends):
+                yield (TOKEN_NAMES[code], source[start:end].decode("ascii"))
+            return
+        for code, start, end in zip(self.codes, self.starts, self.ends):
+            yield (TOKEN_NAMES[code], source[start:end])
+
+    def to_list(self) -> List[Tuple[str, str]]:
+        """Return the tokens as a list of (token_type, token_value) tuples."""
+        return list(self)
+
+    def iter_coded(self, start: int = 0) -> Iterator[Tuple[int, Optional[str], int, int]]:
+        """
+        Yield (code, value, start, end) for each token, as Parser consumes them.
+
+        The value is always None; the text is left in the source until needed.
+
+        Args:
+            start: Index of the first token to yield
+        """
+        tokens = zip(self.codes, repeat(None), self.starts, self.ends)
+        return islice(tokens, start, None) if start else tokens
+
+    def nbytes(self) -> int:
+        """Return the number of bytes used by the token arrays."""
+        return sum(a.itemsize * len(a) for a in (self.codes, self.starts, self.ends))
+
+
+class TokenSuffix:
+    """The tokens of a TokenStream from a given index on, as a Parser input."""
+
+    def __init__(self, stream: TokenStream, start: int):
+        self.source = stream.source
+        self._stream = stream
+        self._start = start
+
+    def iter_coded(self) -> Iterator[Tuple[int, Optional[str], int, int]]:
+        return self._stream.iter_coded(self._start)
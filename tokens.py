@@ -1,6 +1,6 @@
 """Token type definitions and constants for the compiler."""
 
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 
 # Token type constants
@@ -43,6 +43,60 @@ class TokenType:
     OR = "Or"
 
 
+class TokenCode:
+    """
+    Small integer codes for the token types, used by compact token storage.
+
+    Code 0 is reserved for the end of input, so it never matches a real token.
+    """
+    EOF = 0
+    KEYWORD = 1
+    ID = 2
+    NUMBER = 3
+    LPAREN = 4
+    RPAREN = 5
+    LBRACKET = 6
+    RBRACKET = 7
+    SEMICOLON = 8
+    COMMA = 9
+    LBRACE = 10
+    RBRACE = 11
+    DOUBLE_QUOTES = 12
+    ASSIGN = 13
+    ADD_ASSIGN = 14
+    SUB_ASSIGN = 15
+    MUL_ASSIGN = 16
+    DIV_ASSIGN = 17
+    MOD_ASSIGN = 18
+    PLUS = 19
+    MINUS = 20
+    MUL = 21
+    DIV = 22
+    MOD = 23
+    INCREASE = 24
+    DECREASE = 25
+    LESS = 26
+    LESSER = 27
+    GREAT = 28
+    GREATER = 29
+    EQUAL = 30
+    NOT_EQU = 31
+    NOT = 32
+    AND = 33
+    OR = 34
+
+
+# Token type name -> integer code, and the reverse lookup indexed by code.
+TOKEN_CODES: Dict[str, int] = {
+    getattr(TokenType, name): getattr(TokenCode, name)
+    for name in vars(TokenType) if not name.startswith("_")
+}
+TOKEN_NAMES: List[Optional[str]] = [None] * (max(TOKEN_CODES.values()) + 1)
+for _name, _code in TOKEN_CODES.items():
+    TOKEN_NAMES[_code] = _name
+del _name, _code
+
+
 # Keyword definitions
 KEYWORDS: Dict[str, str] = {
     "const": "Const",
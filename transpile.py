@@ -0,0 +1,645 @@
+"""Transpiler from syntax trees to Python functions, and a reference evaluator."""
+
+import argparse
+import ast
+import hashlib
+import sys
+from collections import OrderedDict
+from types import CodeType
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import arith
+from bytecode import compile_program
+from vm import VM
+from lexer import Lexer
+from parser import Parser
+from syntax_tree import (Program, Function, Block, If, For, Declaration,
+                         Assignment, UnaryOp, Identifier, Number)
+from workload import SHAPES, generate_program
+from errors import CompilerError, ExecutionError, FileError, LexicalError
+
+# Expressions nested deeper than this are split into temporaries, which keeps
+# CPython's compiler well inside its own recursion limit.
+SPILL_DEPTH = 64
+# Transpiled sources kept in memory, least recently used first.
+CACHE_SIZE = 64
+
+_COMPARE = {"<": ast.Lt, "<=": ast.LtE, ">": ast.Gt, ">=": ast.GtE,
+            "==": ast.Eq, "!=": ast.NotEq}
+_ARITHMETIC = {"+": ast.Add, "-": ast.Sub, "*": ast.Mult}
+_HELPERS = {"/": "_divide", "%": "_remainder"}
+_COMPOUND = {"+=": "+", "-=": "-", "*=": "*", "/=": "/"}
+
+# Key of a variable in observed results: the offset of its declaration, or
+# its name for a variable used without one.
+VariableKey = Union[int, str]
+# A lowered expression: the node, whether its value is known to be in int
+# range, and its nesting depth.
+_Lowered = Tuple[ast.expr, bool, int]
+
+
+def _number(node: Number) -> int:
+    try:
+        return arith.number_value(node.value)
+    except ValueError:
+        raise LexicalError(f"Invalid number '{node.value}'") from None
+
+
+class _FunctionTranspiler:
+    """Builds the Python ast of one function."""
+
+    def __init__(self, node: Function, observe: bool):
+        self.node = node
+        self.observe = observe
+        self.scopes: List[Dict[str, str]] = [{}]
+        self.variables: Dict[str, VariableKey] = {}
+        self.statements: List[ast.stmt] = []
+        self._temp_count = 0
+
+    def run(self) -> ast.Module:
+        body = self.block(self.node.body)
+        if not isinstance(body[-1], ast.Return):
+            body.append(self.returning(0))
+        names = list(self.variables) + [f"t{index}" for index in range(self._temp_count)]
+        if names:
+            # Every local starts at 0, which also covers undeclared names.
+            body.insert(0, ast.Assign(targets=[self.store(name) for name in names],
+                                      value=ast.Constant(0)))
+        function = ast.FunctionDef(
+            name="function", args=ast.arguments(
+                posonlyargs=[], args=[], vararg=None, kwonlyargs=[],
+                kw_defaults=[], kwarg=None, defaults=[]),
+            body=body, decorator_list=[], returns=None, type_comment=None)
+        return ast.fix_missing_locations(ast.Module(body=[function], type_ignores=[]))
+
+    @staticmethod
+    def load(name: str) -> ast.Name:
+        return ast.Name(id=name, ctx=ast.Load())
+
+    @staticmethod
+    def store(name: str) -> ast.Name:
+        return ast.Name(id=name, ctx=ast.Store())
+
+    def declare(self, name: str, key: VariableKey) -> str:
+        variable = f"v{len(self.variables)}"
+        self.variables[variable] = key
+        return variable
+
+    def lookup(self, name: str) -> str:
+        for scope in reversed(self.scopes):
+            variable = scope.get(name)
+            if variable is not None:
+                return variable
+        variable = self.scopes[0][name] = self.declare(name, name)
+        return variable
+
+    def temp(self) -> str:
+        self._temp_count += 1
+        return f"t{self._temp_count - 1}"
+
+    def returning(self, value: int) -> ast.Return:
+        result: ast.expr = ast.Constant(value)
+        if self.observe:
+            snapshot = ast.Dict(keys=[ast.Constant(key) for key in self.variables.values()],
+                                values=[self.load(name) for name in self.variables])
+            result = ast.Tuple(elts=[result, snapshot], ctx=ast.Load())
+        return ast.Return(value=result)
+
+    def collect(self, lower: Callable[[Any], Any], node) -> Tuple[List[ast.stmt], Any]:
+        """Lower node with lower(), returning the statements it emitted and its result."""
+        saved = self.statements
+        self.statements = []
+        try:
+            result = lower(node)
+            return self.statements, result
+        finally:
+            self.statements = saved
+
+    def block(self, block: Block) -> List[ast.stmt]:
+        saved = self.statements
+        self.statements = []
+        self.scopes.append({})
+        for statement in block.statements:
+            self.statement(statement)
+        if block.ret is not None:
+            self.statements.append(self.returning(_number(block.ret.value)))
+        self.scopes.pop()
+        statements, self.statements = self.statements, saved
+        return statements or [ast.Pass()]
+
+    def statement(self, node) -> None:
+        if isinstance(node, Declaration):
+            variable = self.declare(node.name, node.start)
+            self.assign(variable, node.operator, node.value, declared=True)
+            self.scopes[-1][node.name] = variable
+        elif isinstance(node, Assignment):
+            if node.operator is None:
+                return
+            variable = self.lookup(node.name)
+            if node.operator in ("++", "--"):
+                value = self.arithmetic("+" if node.operator == "++" else "-",
+                                        (self.load(variable), True, 1),
+                                        (ast.Constant(1), True, 1))
+                self.statements.append(ast.Assign(targets=[self.store(variable)],
+                                                  value=self.wrapped(value)))
+            else:
+                self.assign(variable, node.operator, node.value, declared=False)
+        elif isinstance(node, If):
+            test = self.condition(node.condition)
+            body = self.block(node.then_block)
+            orelse = [] if node.else_block is None else self.block(node.else_block)
+            self.statements.append(ast.If(test=test, body=body, orelse=orelse))
+        elif isinstance(node, For):
+            self.scopes.append({})
+            self.statement(node.init)
+            prelude, test = self.collect(self.condition, node.condition)
+            body = [statement for statement in self.block(node.body)
+                    if not isinstance(statement, ast.Pass)]
+            body += self.collect(self.statement, node.update)[0]
+            if prelude:
+                # The condition needs statements of its own, run each time round.
+                exit_loop = ast.If(test=ast.UnaryOp(op=ast.Not(), operand=test),
+                                   body=[ast.Break()], orelse=[])
+                loop = ast.While(test=ast.Constant(True),
+                                 body=prelude + [exit_loop] + body, orelse=[])
+            else:
+                loop = ast.While(test=test, body=body or [ast.Pass()], orelse=[])
+            self.statements.append(loop)
+            self.scopes.pop()
+        else:
+            raise TypeError(f"Cannot transpile {type(node).__name__}")
+
+    def assign(self, variable: str, operator: Optional[str], value, declared: bool) -> None:
+        if operator is None:
+            result: ast.expr = ast.Constant(0)
+        elif operator == "=":
+            result = self.wrapped(self.expression(value))
+        else:
+            current = (ast.Constant(0), True, 1) if declared else (self.load(variable), True, 1)
+            result = self.wrapped(self.arithmetic(_COMPOUND[operator], current,
+                                                  self.expression(value)))
+        self.statements.append(ast.Assign(targets=[self.store(variable)], value=result))
+
+    def condition(self, node) -> ast.expr:
+        """Lower an expression used only for its truth value."""
+        return self.truth(self.wrapped(self.expression(node)))
+
+    @staticmethod
+    def truth(expression: ast.expr) -> ast.expr:
+        """Drop the int conversion of a test: 1 if a < b else 0 tests as a < b."""
+        if (isinstance(expression, ast.IfExp) and
+                isinstance(expression.body, ast.Constant) and expression.body.value == 1 and
+                isinstance(expression.orelse, ast.Constant) and expression.orelse.value == 0):
+            return expression.test
+        return expression
+
+    @staticmethod
+    def wrapped(lowered: _Lowered) -> ast.expr:
+        """Return the expression reduced to int range, unless it already is."""
+        expression, exact, _ = lowered
+        if exact:
+            return expression
+        # ((value + 2**31) & (2**32 - 1)) - 2**31, without a function call.
+        shifted = ast.BinOp(left=expression, op=ast.Add(), right=ast.Constant(-arith.INT_MIN))
+        masked = ast.BinOp(left=shifted, op=ast.BitAnd(),
+                           right=ast.Constant((1 << arith.INT_BITS) - 1))
+        return ast.BinOp(left=masked, op=ast.Sub(), right=ast.Constant(-arith.INT_MIN))
+
+    def arithmetic(self, operator: str, left: _Lowered, right: _Lowered) -> _Lowered:
+        depth = max(left[2], right[2]) + 1
+        if operator in _ARITHMETIC:
+            # + - * commute with wrapping, so operands need not be reduced.
+            return (ast.BinOp(left=left[0], op=_ARITHMETIC[operator](), right=right[0]),
+                    False, depth)
+        if operator in _HELPERS:
+            return (ast.Call(func=self.load(_HELPERS[operator]),
+                             args=[self.wrapped(left), self.wrapped(right)], keywords=[]),
+                    True, depth)
+        compare = ast.Compare(left=self.wrapped(left), ops=[_COMPARE[operator]()],
+                              comparators=[self.wrapped(right)])
+        return ast.IfExp(test=compare, body=ast.Constant(1), orelse=ast.Constant(0)), True, depth
+
+    def spill(self, lowered: _Lowered) -> _Lowered:
+        """Move a deep expression into a temporary."""
+        if lowered[2] <= SPILL_DEPTH:
+            return lowered
+        name = self.temp()
+        self.statements.append(ast.Assign(targets=[self.store(name)],
+                                          value=self.wrapped(lowered)))
+        return self.load(name), True, 1
+
+    def expression(self, node) -> _Lowered:
+        """
+        Lower an expression without recursion.
+
+        Statements the expression needs, such as spilled temporaries, are
+        appended to the current statement list.
+        """
+        results: List[_Lowered] = []
+        pending: List[Tuple[str, Any, Any, int]] = [("eval", node, None, 0)]
+        while pending:
+            stage, node, extra, mark = pending.pop()
+            if stage == "eval":
+                if isinstance(node, Number):
+                    results.append((ast.Constant(_number(node)), True, 1))
+                elif isinstance(node, Identifier):
+                    results.append((self.load(self.lookup(node.name)), True, 1))
+                elif isinstance(node, UnaryOp):
+                    pending.append(("unary", node, None, 0))
+                    pending.append(("eval", node.operand, None, 0))
+                elif node.operator in ("&&", "||"):
+                    pending.append(("logical", node, None, 0))
+                    pending.append(("eval", node.left, None, 0))
+                else:
+                    pending.append(("binary", node, None, 0))
+                    pending.append(("eval", node.right, None, 0))
+                    pending.append(("eval", node.left, None, 0))
+            elif stage == "unary":
+                operand = results.pop()
+                if node.operator == "-":
+                    lowered = (ast.UnaryOp(op=ast.USub(), operand=operand[0]), False,
+                               operand[2] + 1)
+                else:
+                    lowered = (ast.IfExp(test=self.wrapped(operand), body=ast.Constant(0),
+                                         orelse=ast.Constant(1)), True, operand[2] + 1)
+                results.append(self.spill(lowered))
+            elif stage == "binary":
+                right = results.pop()
+                left = results.pop()
+                results.append(self.spill(self.arithmetic(node.operator, left, right)))
+            elif stage == "logical":
+                left = self.spill(results.pop())
+                pending.append(("logical_end", node, left, len(self.statements)))
+                pending.append(("eval", node.right, None, 0))
+            else:
+                lowered = results.pop()
+                depth = max(extra[2], lowered[2]) + 1
+                left = self.truth(self.wrapped(extra))
+                right = self.truth(self.wrapped(lowered))
+                is_and = node.operator == "&&"
+                if len(self.statements) == mark:
+                    test = ast.BoolOp(op=ast.And() if is_and else ast.Or(), values=[left, right])
+                    results.append(self.spill((ast.IfExp(test=test, body=ast.Constant(1),
+                                                         orelse=ast.Constant(0)), True, depth)))
+                    continue
+                # The right side needed statements: they may only run when
+                # the left side does not decide the result.
+                needed = self.statements[mark:]
+                del self.statements[mark:]
+                name = self.temp()
+                self.statements.append(ast.Assign(targets=[self.store(name)],
+                                                  value=ast.Constant(0 if is_and else 1)))
+                self.statements.append(ast.If(
+                    test=left if is_and else ast.UnaryOp(op=ast.Not(), operand=left),
+                    body=needed + [ast.Assign(
+                        targets=[self.store(name)],
+                        value=ast.IfExp(test=right, body=ast.Constant(1),
+                                        orelse=ast.Constant(0)))],
+                    orelse=[]))
+                results.append((self.load(name), True, 1))
+        return results[0]
+
+
+def transpile_function(node: Function, observe: bool = False) -> ast.Module:
+    """
+    Lower a parsed function to a Python module defining 'function'.
+
+    Arithmetic follows arith.py: + - * results are reduced to 32 bits where
+    a value is compared, divided, tested or stored, and / % call
+    arith.divide and arith.remainder.
+
+    Args:
+        node: Function from the syntax tree
+        observe: Make the function return (result, variables), where
+            variables maps each VariableKey to its value at the return
+
+    Raises:
+        LexicalError: For a numeric literal that is not made of digits
+    """
+    return _FunctionTranspiler(node, observe).run()
+
+
+def transpile_program(program: Program, observe: bool = False) -> Dict[str, Optional[CodeType]]:
+    """
+    Compile each function of a program to a Python code object.
+
+    Returns:
+        Code objects by function name; None for a function CPython refuses,
+        e.g. one with more than 20 nested loops
+    """
+    compiled: Dict[str, Optional[CodeType]] = {}
+    for function in program.functions:
+        module = transpile_function(function, observe)
+        try:
+            compiled[function.name] = compile(module, f"<{function.name}>", "exec")
+        except (SyntaxError, RecursionError, MemoryError):
+            compiled[function.name] = None
+    return compiled
+
+
+_cache: "OrderedDict[str, Dict[str, Optional[CodeType]]]" = OrderedDict()
+
+
+def compile_source(source: str, observe: bool = False) -> Dict[str, Optional[CodeType]]:
+    """
+    Return the code objects for a source, cached by its hash.
+
+    Raises:
+        LexicalError: If the source contains an invalid token or number
+        SyntaxError: If the source does not parse
+    """
+    digest = hashlib.sha256(source.encode("utf-8", "surrogatepass"))
+    digest.update(b"observe" if observe else b"")
+    key = digest.hexdigest()
+    compiled = _cache.get(key)
+    if compiled is not None:
+        _cache.move_to_end(key)
+        return compiled
+    compiled = transpile_program(Parser(Lexer(source)).parse(), observe)
+    _cache[key] = compiled
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return compiled
+
+
+def load(source: str, observe: bool = False) -> Dict[str, Callable[[], Any]]:
+    """
+    Return a callable for each function of a source.
+
+    Each callable raises ExecutionError on division by zero. Functions
+    CPython cannot compile run on the VM instead; with observe set, they
+    are left out.
+    """
+    callables: Dict[str, Callable[[], Any]] = {}
+    fallback: Optional[Dict[str, Any]] = None
+    for name, code in compile_source(source, observe).items():
+        if code is None:
+            if observe:
+                continue
+            if fallback is None:
+                fallback = compile_program(Parser(Lexer(source)).parse())
+            callables[name] = _on_vm(fallback[name])
+            continue
+        namespace = {"_divide": arith.divide, "_remainder": arith.remainder}
+        exec(code, namespace)
+        callables[name] = _checked(name, namespace["function"])
+    return callables
+
+
+def _checked(name: str, function: Callable[[], Any]) -> Callable[[], Any]:
+    def run() -> Any:
+        try:
+            return function()
+        except ZeroDivisionError:
+            raise ExecutionError(f"Division by zero in '{name}'") from None
+    return run
+
+
+def _on_vm(code) -> Callable[[], int]:
+    return lambda: VM().execute(code)
+
+
+def run_source(source: str, entry: str = "main") -> int:
+    """
+    Transpile a source and run one of its functions.
+
+    Raises:
+        CompilerError: If the source does not compile or the program fails
+    """
+    functions = load(source)
+    if entry not in functions:
+        raise ExecutionError(f"No function named '{entry}'")
+    return functions[entry]()
+
+
+class _Return(Exception):
+    def __init__(self, value: int):
+        super().__init__(value)
+        self.value = value
+
+
+class Evaluator:
+    """
+    Reference semantics: runs a syntax tree by walking it.
+
+    Deliberately simple and slow; the transpiler and the VM are checked
+    against it.
+
+    Attributes:
+        variables: After run(), the last value of every variable that was
+            assigned, by VariableKey
+    """
+
+    def __init__(self, program: Program, max_steps: Optional[int] = None):
+        """
+        Args:
+            program: Syntax tree from Parser
+            max_steps: Stop after this many loop iterations
+        """
+        self.functions: Dict[str, Function] = {function.name: function
+                                               for function in program.functions}
+        self.max_steps: Optional[int] = max_steps
+        self.variables: Dict[VariableKey, int] = {}
+        self._scopes: List[Dict[str, VariableKey]] = []
+        self._steps = 0
+
+    def run(self, entry: str = "main") -> int:
+        """
+        Run a function.
+
+        Raises:
+            ExecutionError: If there is no such function, or it fails
+        """
+        function = self.functions.get(entry)
+        if function is None:
+            raise ExecutionError(f"No function named '{entry}'")
+        self.variables = {}
+        self._scopes = [{}]
+        self._steps = 0
+        try:
+            self._block(function.body)
+        except _Return as result:
+            return result.value
+        except ZeroDivisionError:
+            raise ExecutionError(f"Division by zero in '{entry}'") from None
+        return 0
+
+    def _key(self, name: str) -> VariableKey:
+        for scope in reversed(self._scopes):
+            if name in scope:
+                return scope[name]
+        self._scopes[0][name] = name
+        return name
+
+    def _block(self, block: Block) -> None:
+        self._scopes.append({})
+        for statement in block.statements:
+            self._statement(statement)
+        self._scopes.pop()
+        if block.ret is not None:
+            raise _Return(_number(block.ret.value))
+
+    def _statement(self, node) -> None:
+        if isinstance(node, Declaration):
+            if node.operator is None:
+                value = 0
+            elif node.operator == "=":
+                value = self._evaluate(node.value)
+            else:
+                value = arith.BINARY[_COMPOUND[node.operator]](0, self._evaluate(node.value))
+            self.variables[node.start] = value
+            self._scopes[-1][node.name] = node.start
+        elif isinstance(node, Assignment):
+            if node.operator is None:
+                return
+            key = self._key(node.name)
+            current = self.variables.get(key, 0)
+            if node.operator == "++":
+                value = arith.BINARY["+"](current, 1)
+            elif node.operator == "--":
+                value = arith.BINARY["-"](current, 1)
+            elif node.operator == "=":
+                value = self._evaluate(node.value)
+            else:
+                value = arith.BINARY[_COMPOUND[node.operator]](current,
+                                                               self._evaluate(node.value))
+            self.variables[key] = value
+        elif isinstance(node, If):
+            if self._evaluate(node.condition):
+                self._block(node.then_block)
+            elif node.else_block is not None:
+                self._block(node.else_block)
+        elif isinstance(node, For):
+            self._scopes.append({})
+            self._statement(node.init)
+            while self._evaluate(node.condition):
+                self._steps += 1
+                if self.max_steps is not None and self._steps > self.max_steps:
+                    raise ExecutionError(f"Step limit of {self.max_steps} exceeded")
+                self._block(node.body)
+                self._statement(node.update)
+            self._scopes.pop()
+        else:
+            raise TypeError(f"Cannot evaluate {type(node).__name__}")
+
+    def _evaluate(self, node) -> int:
+        if isinstance(node, Number):
+            return _number(node)
+        if isinstance(node, Identifier):
+            return self.variables.get(self._key(node.name), 0)
+        if isinstance(node, UnaryOp):
+            return arith.UNARY[node.operator](self._evaluate(node.operand))
+        if node.operator == "&&":
+            return int(self._evaluate(node.left) != 0 and self._evaluate(node.right) != 0)
+        if node.operator == "||":
+            return int(self._evaluate(node.left) != 0 or self._evaluate(node.right) != 0)
+        return arith.BINARY[node.operator](self._evaluate(node.left),
+                                           self._evaluate(node.right))
+
+
+def _outcome(run: Callable[[], Any]) -> Any:
+    try:
+        return run()
+    except ExecutionError as e:
+        return f"ExecutionError: {e}"
+
+
+def verify_source(source: str, max_steps: int = 1_000_000) -> List[str]:
+    """
+    Run every function of a source three ways and compare.
+
+    The transpiled function must agree with the Evaluator on the result and
+    on every variable the Evaluator assigned, and the VM must agree on the
+    result. Functions the Evaluator cannot finish within max_steps loop
+    iterations are skipped; where it runs out of stack, the transpiled
+    function and the VM are compared with each other only.
+
+    Returns:
+        One message per disagreement
+    """
+    program = Parser(Lexer(source)).parse()
+    transpiled = load(source, observe=True)
+    bytecode = compile_program(program)
+    mismatches = []
+    for function in program.functions:
+        name = function.name
+        evaluator = Evaluator(program, max_steps)
+        reference = "reference"
+        try:
+            expected = _outcome(lambda: evaluator.run(name))
+        except RecursionError:
+            reference = "VM"
+            expected = _outcome(lambda: VM().execute(bytecode[name]))
+        if isinstance(expected, str) and "Step limit" in expected:
+            continue
+        if name in transpiled:
+            outcome = _outcome(transpiled[name])
+            variables: Dict[VariableKey, int] = {}
+            if isinstance(outcome, tuple):
+                outcome, variables = outcome
+            if outcome != expected:
+                mismatches.append(f"{name}: transpiled {outcome!r}, {reference} {expected!r}")
+            for key, value in evaluator.variables.items():
+                if variables.get(key, value) != value:
+                    mismatches.append(f"{name}: variable {key!r} transpiled "
+                                      f"{variables[key]}, reference {value}")
+        if reference != "VM":
+            on_vm = _outcome(lambda: VM().execute(bytecode[name]))
+            if on_vm != expected:
+                mismatches.append(f"{name}: VM {on_vm!r}, reference {expected!r}")
+    return mismatches
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Run a program through the transpiler, or verify it on workloads.
+
+    Returns:
+        0 on success, 1 on a compile or run failure or a verification mismatch
+    """
+    arg_parser = argparse.ArgumentParser(description="Transpile a program to Python and run it.")
+    arg_parser.add_argument("path", nargs="?", default="input.txt")
+    arg_parser.add_argument("--entry", default="main", help="function to run")
+    arg_parser.add_argument("--dump", action="store_true",
+                            help="print the generated Python instead of running it")
+    arg_parser.add_argument("--verify", action="store_true",
+                            help="check transpiled results against the reference "
+                                 "evaluator on generated workloads")
+    arg_parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    arg_parser.add_argument("--size", type=int, default=5_000)
+    arg_parser.add_argument("--seeds", type=int, default=5,
+                            help="workloads per shape")
+    args = arg_parser.parse_args(argv)
+
+    if args.verify:
+        failures = 0
+        for shape in args.shapes:
+            for seed in range(args.seeds):
+                mismatches = verify_source(generate_program(shape, args.size, seed))
+                for message in mismatches:
+                    print(f"{shape} seed {seed}: {message}")
+                failures += len(mismatches)
+        print(f"{failures} mismatches in {len(args.shapes) * args.seeds} workloads",
+              file=sys.stderr)
+        return 1 if failures else 0
+
+    try:
+        try:
+            with open(args.path, 'r', encoding='utf-8') as file_reader:
+                source_code = file_reader.read()
+        except IOError as e:
+            raise FileError(f"Cannot open file: {args.path}", 0, 0) from e
+        if args.dump:
+            for function in Parser(Lexer(source_code)).parse().functions:
+                print(f"# {function.name}")
+                print(ast.unparse(transpile_function(function)))
+            return 0
+        print(run_source(source_code, args.entry))
+    except CompilerError as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""Virtual machine that runs compiled bytecode."""
+
+import argparse
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from arith import INT_MIN, INT_MAX, wrap, divide, remainder
+from bytecode import Bytecode, CodeObject, WIDTH, compile_program
+from lexer import Lexer
+from parser import Parser
+from workload import generate_program
+from errors import CompilerError, ExecutionError, FileError
+
+
+class VM:
+    """
+    Executes CodeObjects.
+
+    A function runs in a flat list of registers: its variables, its
+    temporaries and its constants, all addressed by index. The dispatch
+    loop tests the most frequent opcodes first.
+
+    Attributes:
+        steps: Instructions executed by the last call to execute()
+    """
+
+    def __init__(self, max_steps: Optional[int] = None):
+        """
+        Create a VM.
+
+        Args:
+            max_steps: Stop a program after about this many instructions;
+                checked on backward jumps, so straight-line code is never cut
+                short and the check stays out of the common path
+        """
+        self.max_steps: Optional[int] = max_steps
+        self.steps: int = 0
+
+    def run(self, functions: Dict[str, CodeObject], entry: str = "main") -> int:
+        """
+        Run one function of a compiled program.
+
+        Returns:
+            The function's return value; 0 if it ends without a return
+
+        Raises:
+            ExecutionError: If there is no such function, or it fails
+        """
+        code = functions.get(entry)
+        if code is None:
+            raise ExecutionError(f"No function named '{entry}'")
+        return self.execute(code)
+
+    def execute(self, code: CodeObject) -> int:
+        """
+        Run a code object.
+
+        Raises:
+            ExecutionError: On division by zero or when max_steps is exceeded
+        """
+        MOVE, ADD, SUB, MUL, DIV, MOD = (Bytecode.MOVE, Bytecode.ADD, Bytecode.SUB,
+                                         Bytecode.MUL, Bytecode.DIV, Bytecode.MOD)
+        LT, LE, GT, GE, EQ, NE = (Bytecode.LT, Bytecode.LE, Bytecode.GT,
+                                  Bytecode.GE, Bytecode.EQ, Bytecode.NE)
+        JUMP, JUMP_IF_ZERO, JUMP_IF_NONZERO = (Bytecode.JUMP, Bytecode.JUMP_IF_ZERO,
+                                               Bytecode.JUMP_IF_NONZERO)
+        JUMP_LT, JUMP_LE, JUMP_GT, JUMP_GE, JUMP_EQ, JUMP_NE = (
+            Bytecode.JUMP_LT, Bytecode.JUMP_LE, Bytecode.JUMP_GT,
+            Bytecode.JUMP_GE, Bytecode.JUMP_EQ, Bytecode.JUMP_NE)
+        NEG, NOT, RETURN = Bytecode.NEG, Bytecode.NOT, Bytecode.RETURN
+
+        ops = code.code.tolist()  # list indexing beats array indexing
+        r = code.registers()
+        limit = self.max_steps if self.max_steps is not None else sys.maxsize
+        pc = 0
+        steps = 0
+        try:
+            while True:
+                op = ops[pc]
+                steps += 1
+                if op == MOVE:
+                    r[ops[pc + 1]] = r[ops[pc + 2]]
+                    pc += WIDTH
+                elif op == ADD:
+                    value = r[ops[pc + 2]] + r[ops[pc + 3]]
+                    r[ops[pc + 1]] = value if INT_MIN <= value <= INT_MAX else wrap(value)
+                    pc += WIDTH
+                elif op == JUMP:
+                    target = ops[pc + 1]
+                    if target < pc and steps > limit:
+                        raise ExecutionError(
+                            f"Step limit of {self.max_steps} exceeded in '{code.name}'")
+                    pc = target
+                elif op == JUMP_GE:
+                    pc = ops[pc + 1] if r[ops[pc + 2]] >= r[ops[pc + 3]] else pc + WIDTH
+                elif op == JUMP_LT:
+                    pc = ops[pc + 1] if r[ops[pc + 2]] < r[ops[pc + 3]] else pc + WIDTH
+                elif op == JUMP_LE:
+                    pc = ops[pc + 1] if r[ops[pc + 2]] <= r[ops[pc + 3]] else pc + WIDTH
+                elif op == JUMP_GT:
+                    pc = ops[pc + 1] if r[ops[pc + 2]] > r[ops[pc + 3]] else pc + WIDTH
+                elif op == JUMP_NE:
+                    pc = ops[pc + 1] if r[ops[pc + 2]] != r[ops[pc + 3]] else pc + WIDTH
+                elif op == JUMP_EQ:
+                    pc = ops[pc + 1] if r[ops[pc + 2]] == r[ops[pc + 3]] else pc + WIDTH
+                elif op == SUB:
+                    value = r[ops[pc + 2]] - r[ops[pc + 3]]
+                    r[ops[pc + 1]] = value if INT_MIN <= value <= INT_MAX else wrap(value)
+                    pc += WIDTH
+                elif op == MUL:
+                    value = r[ops[pc + 2]] * r[ops[pc + 3]]
+                    r[ops[pc + 1]] = value if INT_MIN <= value <= INT_MAX else wrap(value)
+                    pc += WIDTH
+                elif op == JUMP_IF_ZERO:
+                    pc = ops[pc + 1] if r[ops[pc + 2]] == 0 else pc + WIDTH
+                elif op == JUMP_IF_NONZERO:
+                    pc = ops[pc + 1] if r[ops[pc + 2]] != 0 else pc + WIDTH
+                elif op == LT:
+                    r[ops[pc + 1]] = 1 if r[ops[pc + 2]] < r[ops[pc + 3]] else 0
+                    pc += WIDTH
+                elif op == LE:
+                    r[ops[pc + 1]] = 1 if r[ops[pc + 2]] <= r[ops[pc + 3]] else 0
+                    pc += WIDTH
+                elif op == GT:
+                    r[ops[pc + 1]] = 1 if r[ops[pc + 2]] > r[ops[pc + 3]] else 0
+                    pc += WIDTH
+                elif op == GE:
+                    r[ops[pc + 1]] = 1 if r[ops[pc + 2]] >= r[ops[pc + 3]] else 0
+                    pc += WIDTH
+                elif op == EQ:
+                    r[ops[pc + 1]] = 1 if r[ops[pc + 2]] == r[ops[pc + 3]] else 0
+                    pc += WIDTH
+                elif op == NE:
+                    r[ops[pc + 1]] = 1 if r[ops[pc + 2]] != r[ops[pc + 3]] else 0
+                    pc += WIDTH
+                elif op == DIV:
+                    r[ops[pc + 1]] = divide(r[ops[pc + 2]], r[ops[pc + 3]])
+                    pc += WIDTH
+                elif op == MOD:
+                    r[ops[pc + 1]] = remainder(r[ops[pc + 2]], r[ops[pc + 3]])
+                    pc += WIDTH
+                elif op == NEG:
+                    r[ops[pc + 1]] = wrap(-r[ops[pc + 2]])
+                    pc += WIDTH
+                elif op == NOT:
+                    r[ops[pc + 1]] = 1 if r[ops[pc + 2]] == 0 else 0
+                    pc += WIDTH
+                elif op == RETURN:
+                    return r[ops[pc + 2]]
+                else:
+                    raise ExecutionError(f"Bad opcode {op} at {pc} in '{code.name}'")
+        except ZeroDivisionError:
+            raise ExecutionError(f"Division by zero in '{code.name}'") from None
+        finally:
+            self.steps = steps
+
+
+def compile_source(source: str, optimize: bool = True) -> Dict[str, CodeObject]:
+    """
+    Scan, parse and compile a source to bytecode.
+
+    Raises:
+        LexicalError: If the source contains an invalid token or number
+        SyntaxError: If the source does not parse
+    """
+    return compile_program(Parser(Lexer(source)).parse(), optimize)
+
+
+def run_source(source: str, entry: str = "main", optimize: bool = True,
+               max_steps: Optional[int] = None) -> int:
+    """
+    Compile a source and run one of its functions.
+
+    Returns:
+        The function's return value
+
+    Raises:
+        CompilerError: If the source does not compile or the program fails
+    """
+    return VM(max_steps).run(compile_source(source, optimize), entry)
+
+
+# Loop-heavy programs for benchmark(); {n} is the iteration count.
+BENCHMARK_PROGRAMS: Dict[str, str] = {
+    # The loop of input.txt, scaled up.
+    "count": """int main() {
+    int x = 0;
+    for (int i = 0; i < {n}; i++) {
+        x++;
+    }
+    return 0;
+}""",
+    "nested": """int main() {
+    int total = 0;
+    for (int i = 0; i < {n} / 100; i++) {
+        for (int j = 0; j < 100; j++) {
+            if (j % 3 == 0 && i != j) {
+                total += i * j - total / 7;
+            } else {
+                total -= j;
+            }
+        }
+    }
+    return 0;
+}""",
+}
+
+
+def benchmark(iterations: int = 1_000_000, runs: int = 3,
+              optimize: bool = True) -> List[Dict[str, Any]]:
+    """
+    Measure VM throughput in executed instructions per second.
+
+    Runs each program of BENCHMARK_PROGRAMS with the given loop count,
+    and every function of a generated 'loops' workload whose loops run
+    iterations / 1000 times. The best of runs is kept.
+
+    Returns:
+        One dict per program with its instruction count, time and rate
+    """
+    sources = {name: template.replace("{n}", str(iterations))
+               for name, template in BENCHMARK_PROGRAMS.items()}
+    sources["workload"] = generate_program("loops", 20_000, 0,
+                                           loop_bound=max(1, iterations // 1000))
+    results = []
+    for name, source in sources.items():
+        functions = compile_source(source, optimize)
+        vm = VM()
+        best = float("inf")
+        steps = 0
+        for _ in range(runs):
+            steps = 0
+            started = time.perf_counter()
+            for code in functions.values():
+                try:
+                    vm.execute(code)
+                except ExecutionError:
+                    pass
+                steps += vm.steps
+            best = min(best, time.perf_counter() - started)
+        results.append({
+            "program": name,
+            "instructions": steps,
+            "seconds": best,
+            "instructions_per_sec": steps / best,
+        })
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Run a program, or benchmark the VM.
+
+    Returns:
+        0 on success, 1 if the program does not compile or fails
+    """
+    arg_parser = argparse.ArgumentParser(description="Compile a program to bytecode and run it.")
+    arg_parser.add_argument("path", nargs="?", default="input.txt")
+    arg_parser.add_argument("--entry", default="main", help="function to run")
+    arg_parser.add_argument("-O0", dest="optimize", action="store_false",
+                            help="skip the IR optimisation passes")
+    arg_parser.add_argument("--max-steps", type=int,
+                            help="stop programs after about this many instructions")
+    arg_parser.add_argument("--disassemble", action="store_true",
+                            help="print the bytecode instead of running it")
+    arg_parser.add_argument("--bench", action="store_true",
+                            help="measure instructions per second on loop-heavy programs")
+    arg_parser.add_argument("--iterations", type=int, default=1_000_000,
+                            help="loop count of the benchmark programs")
+    args = arg_parser.parse_args(argv)
+
+    if args.bench:
+        print(f"{'program':<10} {'instructions':>14} {'seconds':>9} {'instr/s':>12}")
+        for case in benchmark(args.iterations, optimize=args.optimize):
+            print(f"{case['program']:<10} {case['instructions']:>14,} "
+                  f"{case['seconds']:>9.3f} {case['instructions_per_sec']:>12,.0f}")
+        return 0
+
+    try:
+        try:
+            with open(args.path, 'r', encoding='utf-8') as file_reader:
+                source_code = file_reader.read()
+        except IOError as e:
+            raise FileError(f"Cannot open file: {args.path}", 0, 0) from e
+        functions = compile_source(source_code, args.optimize)
+        if args.disassemble:
+            print("\n\n".join(code.disassemble() for code in functions.values()))
+            return 0
+        print(VM(args.max_steps).run(functions, args.entry))
+    except CompilerError as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""Seeded generator of synthetic programs for benchmarks and tests."""
+
+import argparse
+import random
+from typing import List, Optional
+
+
+SHAPES = ("functions", "nested", "loops", "comments", "expressions", "mixed")
+INVALID_KINDS = ("syntax", "lexical", "comment")
+
+COMPARISONS = ("<", "<=", ">", ">=", "==", "!=")
+LOGICAL = ("&&", "||")
+ARITHMETIC = ("+", "-", "*")
+ASSIGNMENTS = ("=", "+=", "-=", "*=")
+
+
+class WorkloadGenerator:
+    """
+    Generates programs in the language the parser accepts.
+
+    Valid programs only use declared variables, only divide by non-zero
+    literals and only contain loops that terminate, so they can also be
+    executed. The same seed always produces the same program.
+    """
+
+    def __init__(self, seed: int = 0, depth: int = 24, terms: int = 200,
+                 loop_bound: int = 10):
+        """
+        Initialize the generator.
+
+        Args:
+            seed: Random seed
+            depth: Nesting depth of if/else chains in the "nested" shape
+            terms: Operand count of expressions in the "expressions" shape
+            loop_bound: Iteration count of generated for loops
+        """
+        self.random = random.Random(seed)
+        self.depth = depth
+        self.terms = terms
+        self.loop_bound = loop_bound
+        self._function_count = 0
+
+    def program(self, shape: str = "mixed", size: int = 100_000,
+                invalid: Optional[str] = None) -> str:
+        """
+        Generate a program of roughly size characters.
+
+        Args:
+            shape: One of SHAPES
+            size: Approximate length of the program in characters
+            invalid: None for a valid program, or one of INVALID_KINDS to
+                plant a syntax error or an invalid character in the middle,
+                or an unclosed comment at the end
+
+        Returns:
+            The program text
+        """
+        if shape not in SHAPES:
+            raise ValueError(f"Unknown shape '{shape}'")
+        parts: List[str] = []
+        length = 0
+        while length < size or not parts:
+            function_shape = shape
+            if shape == "mixed":
+                function_shape = self.random.choice(SHAPES[:-1])
+            function = self.function(function_shape)
+            parts.append(function)
+            length += len(function)
+
+        source = "".join(parts)
+        if invalid is not None:
+            source = self._break(source, invalid)
+        return source
+
+    def function(self, shape: str) -> str:
+        """Generate one function of the given shape."""
+        name = f"f{self._function_count}"
+        self._function_count += 1
+        lines = [f"int {name}() {{"]
+        variables = ["a", "b", "c"]
+        for variable in variables:
+            lines.append(f"    int {variable} = {self.random.randint(0, 99)};")
+
+        if shape == "functions":
+            for _ in range(self.random.randint(1, 4)):
+                lines.append("    " + self._simple_statement(variables))
+        elif shape == "nested":
+            self._nested(lines, variables)
+        elif shape == "loops":
+            for index in range(self.random.randint(2, 4)):
+                self._loop(lines, variables, f"i{index}", 20)
+        elif shape == "comments":
+            self._commented(lines, variables)
+        elif shape == "expressions":
+            for _ in range(self.random.randint(1, 3)):
+                target = self.random.choice(variables)
+                lines.append(f"    {target} = {self._expression(variables, self.terms)};")
+        else:
+            raise ValueError(f"Unknown shape '{shape}'")
+
+        lines.append(f"    return {self.random.randint(0, 9)};")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def _nested(self, lines: List[str], variables: List[str]) -> None:
+        """Append an if/else chain nested self.depth levels deep."""
+        # Indentation is capped so very deep nesting stays linear in size.
+        closings = []
+        for level in range(self.depth):
+            indent = "    " * (min(level, 16) + 1)
+            lines.append(f"{indent}if ({self._condition(variables)}) {{")
+            lines.append(f"{indent}    {self._simple_statement(variables)}")
+            closings.append(level)
+        for level in reversed(closings):
+            indent = "    " * (min(level, 16) + 1)
+            lines.append(f"{indent}}}")
+            if self.random.random() < 0.5:
+                lines.append(f"{indent}else {{")
+                lines.append(f"{indent}    {self._simple_statement(variables)}")
+                lines.append(f"{indent}}}")
+
+    def _loop(self, lines: List[str], variables: List[str], counter: str,
+              body_size: int) -> None:
+        """Append a counting for loop whose body never touches the counter."""
+        lines.append(f"    for (int {counter} = 0; {counter} < {self.loop_bound}; {counter}++) {{")
+        for _ in range(body_size):
+            lines.append("        " + self._simple_statement(variables + [counter],
+                                                             targets=variables))
+        lines.append("    }")
+
+    def _commented(self, lines: List[str], variables: List[str]) -> None:
+        """Append statements interleaved with both comment styles."""
+        for index in range(self.random.randint(3, 8)):
+            lines.append(f"    // line comment {index}: {self._words(8)}")
+            lines.append("    /* block comment")
+            lines.append(f"       {self._words(12)}")
+            lines.append(f"       {self._words(12)} */")
+            lines.append(f"    {self._simple_statement(variables)} /* trailing */")
+
+    def _simple_statement(self, variables: List[str],
+                          targets: Optional[List[str]] = None) -> str:
+        """Return an assignment, increment or decrement statement."""
+        target = self.random.choice(targets or variables)
+        choice = self.random.random()
+        if choice < 0.2:
+            return f"{target}{self.random.choice(('++', '--'))};"
+        operator = self.random.choice(ASSIGNMENTS)
+        return f"{target} {operator} {self._expression(variables, self.random.randint(1, 4))};"
+
+    def _condition(self, variables: List[str]) -> str:
+        """Return one to three comparisons joined by && and ||."""
+        parts = [self._comparison(variables)]
+        for _ in range(self.random.randint(0, 2)):
+            parts.append(self.random.choice(LOGICAL))
+            parts.append(self._comparison(variables))
+        return " ".join(parts)
+
+    def _comparison(self, variables: List[str]) -> str:
+        comparison = (f"{self._operand(variables)} {self.random.choice(COMPARISONS)} "
+                      f"{self._operand(variables)}")
+        if self.random.random() < 0.1:
+            return f"!({comparison})"
+        return comparison
+
+    def _expression(self, variables: List[str], terms: int) -> str:
+        """Return an arithmetic expression with the given number of operands."""
+        parts = [self._operand(variables)]
+        open_parens = 0
+        for _ in range(terms - 1):
+            choice = self.random.random()
+            if choice < 0.1:
+                # Division only by a non-zero literal, so programs can run.
+                parts.append(f"{self.random.choice(('/', '%'))} {self.random.randint(1, 9)}")
+            elif choice < 0.15:
+                parts.append(f"{self.random.choice(ARITHMETIC)} ({self._operand(variables)}")
+                open_parens += 1
+            elif choice < 0.2 and open_parens:
+                parts.append(f"{self.random.choice(ARITHMETIC)} {self._operand(variables)})")
+                open_parens -= 1
+            else:
+                parts.append(f"{self.random.choice(ARITHMETIC)} {self._operand(variables)}")
+        return " ".join(parts) + ")" * open_parens
+
+    def _operand(self, variables: List[str]) -> str:
+        if self.random.random() < 0.5:
+            return self.random.choice(variables)
+        return str(self.random.randint(0, 99))
+
+    def _words(self, count: int) -> str:
+        return " ".join(self.random.choice(("lorem", "ipsum", "dolor", "sit", "amet", "x", "42"))
+                        for _ in range(count))
+
+    def _break(self, source: str, kind: str) -> str:
+        """Plant an error of the given kind in the source."""
+        # Break the program at a statement boundary near its middle.
+        middle = source.find(";\n", len(source) // 2)
+        if middle < 0:
+            middle = source.rfind(";")
+        if kind == "syntax":
+            return source[:middle] + source[middle + 1:]
+        if kind == "lexical":
+            return source[:middle] + " @" + source[middle:]
+        if kind == "comment":
+            # Any later comment would close it, so it goes at the very end.
+            return source + "/* never closed\n"
+        raise ValueError(f"Unknown invalid kind '{kind}'")
+
+
+def generate_program(shape: str = "mixed", size: int = 100_000, seed: int = 0,
+                     invalid: Optional[str] = None, **options) -> str:
+    """
+    Generate a program; see WorkloadGenerator for the options.
+
+    Returns:
+        The program text
+    """
+    return WorkloadGenerator(seed, **options).program(shape, size, invalid)
+
+
+def main():
+    """Write a generated program to stdout or a file."""
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--shape", choices=SHAPES, default="mixed")
+    arg_parser.add_argument("--size", type=int, default=100_000,
+                            help="approximate size in characters")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--invalid", choices=INVALID_KINDS,
+                            help="plant an error of this kind")
+    arg_parser.add_argument("--depth", type=int, default=24,
+                            help="nesting depth for the nested shape")
+    arg_parser.add_argument("--terms", type=int, default=200,
+                            help="operands per expression for the expressions shape")
+    arg_parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = arg_parser.parse_args()
+
+    source = generate_program(args.shape, args.size, args.seed, args.invalid,
+                              depth=args.depth, terms=args.terms)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file_writer:
+            file_writer.write(source)
+    else:
+        print(source, end="")
+
+
+if __name__ == '__main__':
+    main()